@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Cold-start report and budget check
+
+Measures, in fresh interpreters:
+- `import main` time, with the slowest modules from `python -X importtime`
+- time from process start until uvicorn answers GET /health
+
+Fails (exit 1) when either exceeds its budget, or when an SDK that should
+only load on first use (openai, firebase_admin, google.cloud.*) is imported
+eagerly by `import main`.
+
+Examples (from backend/):
+    python -m benchmarks.coldstart
+    python -m benchmarks.coldstart --runs 5 --import-budget-ms 600 --ready-budget-ms 900
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stack import BACKEND_DIR, OFFLINE_ENV
+
+# Loaded lazily by the app (first use or lifespan warm-up), never by `import main`
+DEFERRED_MODULES = ("openai", "firebase_admin", "google.cloud.firestore", "google.cloud.storage", "opentelemetry.sdk")
+
+def _env() -> Dict[str, str]:
+    env = {**os.environ, **OFFLINE_ENV, "WARM_UP_ON_STARTUP": "false"}
+    env.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+    return env
+
+def measure_import() -> Tuple[float, List[Tuple[str, int, int]], List[str]]:
+    """
+    Import main in a fresh interpreter under -X importtime
+
+    Returns:
+        (total ms, [(module, self us, cumulative us)], eagerly loaded deferred modules)
+    """
+    probe = (
+        "import sys, json, main; "
+        f"print(json.dumps([m for m in {list(DEFERRED_MODULES)!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True
+    )
+
+    modules = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        modules.append((name, int(self_us), int(cumulative_us)))
+        if name == "main":
+            total_us = int(cumulative_us)
+
+    eager = json.loads(result.stdout.strip().splitlines()[-1])
+    return total_us / 1000, modules, eager
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_ready(timeout: float = 30) -> float:
+    """Milliseconds from spawning uvicorn until GET /health returns 200"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=1) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                        return (time.perf_counter() - start) * 1000
+                except httpx.HTTPError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                time.sleep(0.005)
+        raise TimeoutError(f"/health not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Nexsy cold-start report")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement (best is reported)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--import-budget-ms", type=float, default=800, help="Budget for `import main`")
+    parser.add_argument("--ready-budget-ms", type=float, default=1000, help="Budget for process start to first /health")
+    parser.add_argument("--skip-ready", action="store_true", help="Only measure imports")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    import_ms, modules, eager = min(imports, key=lambda run: run[0])
+
+    print(f"import main: {import_ms:.0f} ms (best of {args.runs}, budget {args.import_budget_ms:.0f} ms)")
+    print(f"\n{'module':<50} {'self ms':>9} {'cumulative ms':>14}")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+
+    report: Dict[str, Any] = {
+        "import_ms": round(import_ms, 1),
+        "import_budget_ms": args.import_budget_ms,
+        "eager_deferred_modules": eager,
+        "top_modules": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+            for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]
+        ]
+    }
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append(f"import main took {import_ms:.0f} ms (budget {args.import_budget_ms:.0f} ms)")
+    if eager:
+        failures.append(f"imported eagerly by main: {', '.join(eager)}")
+
+    if not args.skip_ready:
+        ready_ms = min(measure_ready() for _ in range(args.runs))
+        report.update({"ready_ms": round(ready_ms, 1), "ready_budget_ms": args.ready_budget_ms})
+        print(f"\nfirst /health: {ready_ms:.0f} ms after process start (best of {args.runs}, budget {args.ready_budget_ms:.0f} ms)")
+        if ready_ms > args.ready_budget_ms:
+            failures.append(f"first /health after {ready_ms:.0f} ms (budget {args.ready_budget_ms:.0f} ms)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**report, "failures": failures}, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
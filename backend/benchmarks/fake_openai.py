@@ -0,0 +1,130 @@
+"""
+Fake OpenAI-compatible server for load testing
+
+Implements the subset of the OpenAI REST API the backend uses and answers
+with canned JSON shaped like each AIService prompt expects, after a
+configurable delay:
+
+- FAKE_OPENAI_LATENCY_MS: base latency per completion (default 800)
+- FAKE_OPENAI_JITTER_MS: uniform random jitter added on top (default 200)
+- FAKE_OPENAI_MS_PER_TOKEN: extra latency per completion token (default 0)
+
+Run with: uvicorn benchmarks.fake_openai:app --port 8900
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="Fake OpenAI", docs_url=None, redoc_url=None)
+
+LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "800"))
+JITTER_MS = float(os.getenv("FAKE_OPENAI_JITTER_MS", "200"))
+MS_PER_TOKEN = float(os.getenv("FAKE_OPENAI_MS_PER_TOKEN", "0"))
+
+def _ad_copy(index: int) -> Dict[str, Any]:
+    return {
+        "variation_name": f"Variation {index + 1}",
+        "headline": f"Benchmark headline number {index + 1}",
+        "body_text": "A persuasive body text used for load testing the ad copy pipeline end to end.",
+        "call_to_action": "Shop Now",
+        "platform_optimized": "facebook",
+        "offer_value_proposition": "Fast, reliable and affordable"
+    }
+
+def _completion_payload(prompt: str) -> Dict[str, Any]:
+    """Pick a response shape from the fields the prompt asks for"""
+    if "ai_analysis_summary" in prompt:
+        return {
+            "ai_analysis_summary": "Strong value proposition in a growing category.",
+            "ai_target_audience_profile": "Busy professionals aged 25-45 who value convenience.",
+            "ai_key_selling_points": ["Convenient", "Affordable", "Durable", "Well designed"]
+        }
+    if "product_infopack" in prompt:
+        return {
+            "product_infopack": {
+                "customer_avatars": [
+                    {"label": "Busy Professional", "description": "Time-poor, values convenience."},
+                    {"label": "Budget Shopper", "description": "Compares prices, values durability."}
+                ]
+            },
+            "creative_brief": {
+                "creative_angle": "Make every day easier.",
+                "visual_style_art_direction": "Bright, clean, lifestyle photography."
+            }
+        }
+    if "ad_copies" in prompt:
+        match = re.search(r"create (\d+) different", prompt)
+        count = int(match.group(1)) if match else 3
+        return {
+            "creative_concept_title": "Everyday Upgrade",
+            "creative_concept_description": "Position the product as a small change with a big impact.",
+            "target_audience_summary": "Convenience-driven shoppers.",
+            "why_this_works": "Combines loss aversion with social proof.",
+            "ad_copies": [_ad_copy(i) for i in range(count)]
+        }
+    if "creative_concept_title" in prompt:
+        return {
+            "creative_concept_title": "Everyday Upgrade",
+            "creative_concept_description": "Position the product as a small change with a big impact.",
+            "target_audience_summary": "Convenience-driven shoppers.",
+            "why_this_works": "Combines loss aversion with social proof."
+        }
+    if "headline" in prompt and "body_text" in prompt:
+        return _ad_copy(0)
+    if "product_description" in prompt:
+        return {
+            "product_description": "A dependable product built for everyday use.",
+            "problem_it_solves": "Saves time on a repetitive daily task.",
+            "target_customers": "Urban professionals who value their time."
+        }
+    return {"result": "ok"}
+
+def _token_estimate(text: str) -> int:
+    return max(1, len(text) // 4)
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]}
+
+@app.get("/v1/models/{model}")
+async def retrieve_model(model: str):
+    return {"id": model, "object": "model", "owned_by": "fake"}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages: List[Dict[str, Any]] = body.get("messages", [])
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    n = int(body.get("n") or 1)
+
+    content = json.dumps(_completion_payload(prompt))
+    completion_tokens = _token_estimate(content) * n
+
+    delay_ms = LATENCY_MS + random.uniform(0, JITTER_MS) + MS_PER_TOKEN * completion_tokens
+    await asyncio.sleep(delay_ms / 1000)
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": i,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            } for i in range(n)
+        ],
+        "usage": {
+            "prompt_tokens": _token_estimate(prompt),
+            "completion_tokens": completion_tokens,
+            "total_tokens": _token_estimate(prompt) + completion_tokens
+        }
+    }
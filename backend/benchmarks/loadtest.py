@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Nexsy load-test runner
+
+Runs scripted scenarios with N concurrent virtual users for a fixed duration
+and reports RPS and p50/p95/p99 per scenario and per request.
+
+Examples (from backend/):
+    python -m benchmarks.loadtest --start-stack --scenario product_crud --concurrency 20 --duration 30
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --scenario all --output results.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.recorder import Recorder
+from benchmarks.scenarios import SCENARIOS, Scenario, Session
+from benchmarks.stack import LocalStack, mint_id_token
+
+logger = logging.getLogger("benchmarks.loadtest")
+
+async def _virtual_user(scenario: Scenario, session: Session, deadline: float) -> None:
+    while time.monotonic() < deadline:
+        try:
+            await scenario.iteration(session)
+        except httpx.HTTPError as e:
+            # Already recorded as a failed sample; keep the user looping
+            logger.debug(f"{scenario.name}: {e!r}")
+
+async def run_scenario(
+    scenario: Scenario,
+    base_url: str,
+    project_id: str,
+    concurrency: int,
+    duration: float,
+    users: int
+) -> Dict[str, Any]:
+    """
+    Run one scenario with `concurrency` virtual users for `duration` seconds
+
+    Args:
+        scenario: Scenario to run
+        base_url: API base URL
+        project_id: Firebase project id used to mint emulator tokens
+        concurrency: Number of concurrent virtual users
+        duration: Measured run time in seconds (setup is excluded)
+        users: Number of distinct user ids the virtual users are spread over
+
+    Returns:
+        Dict: Report with overall and per-request RPS and latency percentiles
+    """
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        sessions = [
+            Session(client, mint_id_token(f"bench-user-{i % users}", project_id), recorder)
+            for i in range(concurrency)
+        ]
+        await asyncio.gather(*(scenario.setup(session) for session in sessions))
+
+        recorder.recording = True
+        start = time.monotonic()
+        await asyncio.gather(*(
+            _virtual_user(scenario, session, start + duration) for session in sessions
+        ))
+        elapsed = time.monotonic() - start
+        recorder.recording = False
+
+    report = recorder.report(elapsed)
+    report.update({"scenario": scenario.name, "concurrency": concurrency, "duration_s": round(elapsed, 2)})
+    return report
+
+def print_report(report: Dict[str, Any]) -> None:
+    total = report["total"]
+    print(f"\n== {report['scenario']} (concurrency={report['concurrency']}, {report['duration_s']}s) ==")
+    header = f"{'request':<40} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["requests"].items()) + [("TOTAL", total)]
+    for name, stats in rows:
+        print(
+            f"{name:<40} {stats['requests']:>7} {stats['errors']:>5} {stats['rps']:>8.1f} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Nexsy API load test")
+    parser.add_argument("--scenario", default="all", help=f"Comma separated: {', '.join(SCENARIOS)} or all")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per scenario")
+    parser.add_argument("--users", type=int, default=10, help="Distinct user ids to spread load over")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API to test when not starting the stack")
+    parser.add_argument("--project-id", default="nexsy-bench", help="Firebase project id for emulator tokens")
+    parser.add_argument("--start-stack", action="store_true", help="Start emulators, fake OpenAI and the API locally")
+    parser.add_argument("--app-workers", type=int, default=1, help="Uvicorn workers when starting the stack")
+    parser.add_argument("--openai-latency-ms", type=float, default=800, help="Fake OpenAI base latency")
+    parser.add_argument("--openai-jitter-ms", type=float, default=200, help="Fake OpenAI latency jitter")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s %(message)s")
+
+    names = list(SCENARIOS) if args.scenario == "all" else [n.strip() for n in args.scenario.split(",")]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    stack = None
+    base_url = args.base_url
+    if args.start_stack:
+        stack = LocalStack(
+            project_id=args.project_id,
+            app_workers=args.app_workers,
+            openai_latency_ms=args.openai_latency_ms,
+            openai_jitter_ms=args.openai_jitter_ms
+        ).start()
+        base_url = stack.base_url
+
+    try:
+        reports = []
+        for name in names:
+            logger.info(f"Running {name} for {args.duration}s at concurrency {args.concurrency}")
+            report = asyncio.run(run_scenario(
+                SCENARIOS[name], base_url, args.project_id, args.concurrency, args.duration, args.users
+            ))
+            print_report(report)
+            reports.append(report)
+    finally:
+        if stack:
+            stack.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"base_url": base_url, "scenarios": reports}, f, indent=2)
+        logger.info(f"Report written to {args.output}")
+
+    return 1 if any(r["total"]["errors"] for r in reports) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
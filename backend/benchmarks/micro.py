@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for hot in-process code paths
+
+Times pure-Python work that runs on every request (prompt building, model
+hydration, response serialization, path parsing) and compares the results
+against a stored baseline, flagging anything slower than the threshold.
+
+Examples (from backend/):
+    python -m benchmarks.micro                    # run and compare with the baseline
+    python -m benchmarks.micro --save-baseline    # record a new baseline
+    python -m benchmarks.micro --filter ai. --threshold 0.05
+
+Timings are machine specific: record the baseline on the machine (or CI
+runner class) the comparison runs on.
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import statistics
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stack import OFFLINE_ENV
+
+# Imported app modules construct GCP clients; point them at unreachable
+# emulators so no credentials or network are needed
+for _key, _value in OFFLINE_ENV.items():
+    os.environ.setdefault(_key, _value)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+def benchmark(name: str):
+    """Register a benchmark; the decorated factory does setup and returns the timed callable"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+# Fixtures
+NOW = datetime(2025, 1, 15, 12, 30, 0)
+
+def _product_doc(index: int = 0) -> Dict[str, Any]:
+    return {
+        "id": f"product-{index}",
+        "user_id": "bench-user",
+        "product_name": f"Ergonomic Standing Desk {index}",
+        "what_is_it": "An electric height-adjustable desk with memory presets",
+        "price": 499.0,
+        "currency": "USD",
+        "target_country": "United States",
+        "target_country_code": "US",
+        "main_goal": "sales",
+        "product_image_url": "gs://nexsy-assets-bench/users/bench-user/products/p/images/a.png",
+        "product_description": "A sturdy dual-motor desk that moves from sitting to standing in seconds.",
+        "problem_it_solves": "Long hours of sitting cause back pain and low energy.",
+        "target_customers": "Remote workers and office professionals aged 25-50.",
+        "setup_completed": True,
+        "ai_analysis_summary": "Well positioned in a growing home-office category.",
+        "ai_target_audience_profile": "Health-conscious knowledge workers.",
+        "ai_key_selling_points": ["Dual motors", "Memory presets", "Quiet", "10-year warranty"],
+        "created_at": NOW,
+        "updated_at": NOW
+    }
+
+def _creative_output_doc(num_copies: int = 5) -> Dict[str, Any]:
+    return {
+        "id": "output-1",
+        "product_id": "product-0",
+        "user_id": "bench-user",
+        "creative_concept_title": "Stand Up For Yourself",
+        "creative_concept_description": "Frame the desk as an investment in daily energy.",
+        "target_audience_summary": "Remote professionals with back pain.",
+        "why_this_works": "Pairs pain-point agitation with an aspirational outcome.",
+        "ad_copies": [
+            {
+                "variation_name": f"Variation {i}",
+                "headline": "Your back will thank you",
+                "body_text": "Switch from sitting to standing in 3 seconds with whisper-quiet dual motors.",
+                "call_to_action": "Shop Now",
+                "platform_optimized": "facebook",
+                "offer_value_proposition": "Free shipping and a 10-year warranty"
+            } for i in range(num_copies)
+        ],
+        "generation_timestamp": NOW,
+        "tone": "professional"
+    }
+
+# AIService prompt building
+@benchmark("ai.build_autofill_prompt")
+def bench_autofill_prompt():
+    from services.ai_service import AIService
+    return lambda: AIService._build_autofill_prompt("Standing Desk", "An electric desk", 499.0, "United States")
+
+@benchmark("ai.build_strategy_prompt")
+def bench_strategy_prompt():
+    from services.ai_service import AIService
+    from models.product import Product
+    product = Product(**_product_doc())
+    return lambda: AIService._build_strategy_prompt(product)
+
+@benchmark("ai.build_ad_copies_prompt")
+def bench_ad_copies_prompt():
+    from services.ai_service import AIService
+    from models.product import Product
+    from models.marketing_strategy import MarketingStrategy, ProductInfoPack, CustomerAvatar, CreativeBrief
+    product = Product(**_product_doc())
+    strategy = MarketingStrategy(
+        product_id="product-0",
+        user_id="bench-user",
+        product_infopack=ProductInfoPack(customer_avatars=[
+            CustomerAvatar(label=f"Segment {i}", description="Remote workers who sit 8+ hours a day.") for i in range(3)
+        ]),
+        creative_brief=CreativeBrief(creative_angle="Energy all day", visual_style_art_direction="Bright and airy")
+    )
+    return lambda: AIService._build_ad_copies_prompt(product, strategy, "professional", 3)
+
+@benchmark("ai.build_analysis_prompt")
+def bench_analysis_prompt():
+    from services.ai_service import AIService
+    from models.product import Product
+    product = Product(**_product_doc())
+    return lambda: AIService._build_analysis_prompt(product)
+
+# Model hydration from Firestore documents
+@benchmark("models.product_hydrate")
+def bench_product_hydrate():
+    from models.product import Product
+    doc = _product_doc()
+    return lambda: Product(**doc)
+
+@benchmark("models.creative_output_hydrate")
+def bench_creative_output_hydrate():
+    from models.creative_output import CreativeOutput
+    doc = _creative_output_doc()
+    return lambda: CreativeOutput(**doc)
+
+# Route serialization
+@benchmark("routes.product_to_response")
+def bench_product_to_response():
+    from models.product import Product
+    from routes.products import _product_to_response
+    product = Product(**_product_doc())
+    return lambda: _product_to_response(product)
+
+@benchmark("routes.product_list_50_encode")
+def bench_product_list_encode():
+    from fastapi.encoders import jsonable_encoder
+    from models.product import Product
+    from routes.products import _product_to_response, ProductListResponse
+    products = [Product(**_product_doc(i)) for i in range(50)]
+    return lambda: jsonable_encoder(ProductListResponse(products=[_product_to_response(p) for p in products]))
+
+# Read-through cache
+@benchmark("cache.lookup_hit")
+def bench_cache_hit():
+    from utils.cache import TTLCache
+    cache = TTLCache("bench", maxsize=10000, ttl=3600)
+    for i in range(10000):
+        cache.set(("bench-user", f"product-{i}"), i)
+    key = ("bench-user", "product-5000")
+    return lambda: cache.get(key)
+
+# Storage path handling
+@benchmark("storage.extract_file_path_gs")
+def bench_extract_gs():
+    from services.storage_service import StorageService
+    url = "gs://nexsy-assets-bench/users/bench-user/products/p1/images/20250115_123000_abc.png"
+    return lambda: StorageService.extract_file_path(url, "bench-user")
+
+@benchmark("storage.extract_file_path_signed_url")
+def bench_extract_signed():
+    from services.storage_service import StorageService
+    url = (
+        "https://storage.googleapis.com/nexsy-assets-bench/users/bench-user/products/p1/images/"
+        "20250115_123000_abc.png?X-Goog-Algorithm=GOOG4-RSA-SHA256&X-Goog-Expires=3600&X-Goog-Signature=deadbeef"
+    )
+    return lambda: StorageService.extract_file_path(url, "bench-user")
+
+@benchmark("storage.generate_file_path")
+def bench_generate_file_path():
+    from services.storage_service import StorageService
+    service = StorageService()
+    return lambda: service._generate_file_path("bench-user", "image", "product-1", "photo.png")
+
+@benchmark("upload.parse_range_header")
+def bench_parse_range():
+    from routes.upload import _parse_range_header
+    return lambda: _parse_range_header("bytes=1048576-2097151", 50 * 1024 * 1024)
+
+# Measurement
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """
+    Time a callable with timeit, calibrating the loop count to roughly min_time per repeat
+
+    Returns:
+        Dict: best, median and stdev in nanoseconds per call, plus loops per repeat
+    """
+    timer = timeit.Timer(func)
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+
+    # Warm-up repeat is discarded
+    timer.timeit(loops)
+    per_call = [t / loops * 1e9 for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "best_ns": round(min(per_call), 1),
+        "median_ns": round(statistics.median(per_call), 1),
+        "stdev_ns": round(statistics.stdev(per_call), 1) if len(per_call) > 1 else 0.0,
+        "loops": loops
+    }
+
+def run(names: List[str], repeat: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name in names:
+        results[name] = measure(BENCHMARKS[name](), repeat, min_time)
+        print(f"  {name:<40} {results[name]['best_ns']:>12.1f} ns/op", file=sys.stderr)
+    return results
+
+def environment() -> Dict[str, str]:
+    import pydantic
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "pydantic": pydantic.VERSION
+    }
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare timings against the baseline
+
+    A benchmark only counts as a regression (or improvement) when both its
+    best and median times moved past the threshold, which filters out most
+    scheduler noise on shared machines.
+
+    Returns:
+        List of rows with baseline/current ns per op, relative change of the
+        best time and status (ok, regression, improved, new)
+    """
+    baseline_results = (baseline or {}).get("results", {})
+    rows = []
+    for name, current in results.items():
+        previous = baseline_results.get(name)
+        row = {"name": name, "current_ns": current["best_ns"], "baseline_ns": None, "change": None, "status": "new"}
+        if previous:
+            change = current["best_ns"] / previous["best_ns"] - 1
+            median_change = current["median_ns"] / previous["median_ns"] - 1
+            if min(change, median_change) > threshold:
+                status = "regression"
+            elif max(change, median_change) < -threshold:
+                status = "improved"
+            else:
+                status = "ok"
+            row.update({
+                "baseline_ns": previous["best_ns"],
+                "change": round(change, 4),
+                "status": status
+            })
+        rows.append(row)
+    return rows
+
+def print_comparison(rows: List[Dict[str, Any]], threshold: float) -> None:
+    header = f"{'benchmark':<40} {'baseline ns':>12} {'current ns':>12} {'change':>9}  status"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        baseline = f"{row['baseline_ns']:.1f}" if row["baseline_ns"] is not None else "-"
+        change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "-"
+        status = row["status"].upper() if row["status"] == "regression" else row["status"]
+        print(f"{row['name']:<40} {baseline:>12} {row['current_ns']:>12.1f} {change:>9}  {status}")
+
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {threshold * 100:.0f}%")
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Nexsy micro-benchmarks")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this substring")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed repeats per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds per repeat")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--output", help="Write the comparison report as JSON")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    print(f"Running {len(names)} benchmark(s)", file=sys.stderr)
+    results = run(names, args.repeat, args.min_time)
+    env = environment()
+
+    if args.save_baseline:
+        existing = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                existing = json.load(f).get("results", {})
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "environment": env,
+                "results": {**existing, **results}
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != env:
+            print(f"Warning: baseline was recorded on {baseline.get('environment')}, now running on {env}", file=sys.stderr)
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one", file=sys.stderr)
+
+    rows = compare(results, baseline, args.threshold)
+    print_comparison(rows, args.threshold)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"environment": env, "threshold": args.threshold, "benchmarks": rows}, f, indent=2)
+
+    return 1 if any(row["status"] == "regression" for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
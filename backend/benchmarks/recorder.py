@@ -0,0 +1,84 @@
+"""
+Latency recording and percentile reporting for load tests
+"""
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class Sample:
+    name: str
+    latency: float = 0.0
+    ok: bool = False
+    status: Optional[int] = None
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+    }
+
+class Recorder:
+    """Collects request samples; only samples taken while `recording` is set are kept"""
+
+    def __init__(self):
+        self.samples: List[Sample] = []
+        self.recording = False
+
+    @asynccontextmanager
+    async def measure(self, name: str):
+        sample = Sample(name=name)
+        start = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            sample.latency = time.perf_counter() - start
+            if self.recording:
+                self.samples.append(sample)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        """
+        Summarize recorded samples overall and per request name
+
+        Returns:
+            Dict with "total" and "requests" keys holding RPS and p50/p95/p99
+        """
+        by_name: Dict[str, List[Sample]] = {}
+        for sample in self.samples:
+            by_name.setdefault(sample.name, []).append(sample)
+
+        return {
+            "total": summarize(
+                [s.latency for s in self.samples],
+                sum(1 for s in self.samples if not s.ok),
+                elapsed
+            ),
+            "requests": {
+                name: {
+                    **summarize([s.latency for s in samples], sum(1 for s in samples if not s.ok), elapsed),
+                    "statuses": _status_counts(samples)
+                } for name, samples in sorted(by_name.items())
+            }
+        }
+
+def _status_counts(samples: List[Sample]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for sample in samples:
+        key = str(sample.status) if sample.status is not None else "exception"
+        counts[key] = counts.get(key, 0) + 1
+    return counts
@@ -0,0 +1,132 @@
+"""
+Scripted load-test scenarios
+
+Each scenario is a pair of coroutines taking a Session:
+- setup: run once per virtual user before the clock starts (seed data)
+- iteration: run repeatedly for the duration of the test
+"""
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from benchmarks.recorder import Recorder
+
+class Session:
+    """Authenticated client for one virtual user that records every request"""
+
+    def __init__(self, client: httpx.AsyncClient, token: str, recorder: Recorder):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.recorder = recorder
+        self.state: Dict[str, Any] = {}
+
+    async def request(self, name: str, method: str, url: str, expected: tuple = (200,), **kwargs) -> httpx.Response:
+        """
+        Send a request and record its latency under `name`
+
+        Args:
+            name: Label the request is reported under
+            method: HTTP method
+            url: Path relative to the API base URL
+            expected: Status codes counted as success
+        """
+        headers = {**self.headers, **kwargs.pop("headers", {})}
+        async with self.recorder.measure(name) as sample:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            sample.ok = response.status_code in expected
+            sample.status = response.status_code
+        return response
+
+PNG_PAYLOAD = b"\x89PNG\r\n\x1a\n" + os.urandom(200 * 1024)
+
+def _product_payload() -> Dict[str, Any]:
+    return {
+        "product_name": f"Bench Product {uuid.uuid4().hex[:8]}",
+        "what_is_it": "A compact device used for benchmarking",
+        "price": 49.99,
+        "currency": "USD",
+        "target_country": "United States",
+        "target_country_code": "US",
+        "main_goal": "sales",
+        "product_description": "Benchmark product description",
+        "problem_it_solves": "Measures throughput",
+        "target_customers": "Performance engineers"
+    }
+
+async def _create_product(session: Session) -> Optional[str]:
+    response = await session.request("POST /api/products", "POST", "/api/products", expected=(201,), json=_product_payload())
+    return response.json().get("id") if response.status_code == 201 else None
+
+async def _upload_visual(session: Session, product_id: str) -> None:
+    await session.request(
+        "POST /api/products/{id}/visuals", "POST", f"/api/products/{product_id}/visuals",
+        expected=(201,),
+        files={"file": (f"{uuid.uuid4().hex}.png", PNG_PAYLOAD, "image/png")}
+    )
+
+# product_crud: full lifecycle per iteration
+async def product_crud(session: Session) -> None:
+    product_id = await _create_product(session)
+    if not product_id:
+        return
+    await session.request("GET /api/products/{id}", "GET", f"/api/products/{product_id}")
+    await session.request("PUT /api/products/{id}", "PUT", f"/api/products/{product_id}", json={"price": 59.99})
+    await session.request("GET /api/products", "GET", "/api/products", params={"limit": 20})
+    await session.request("DELETE /api/products/{id}", "DELETE", f"/api/products/{product_id}", expected=(204,))
+
+# gallery_listing: read-heavy listing over a seeded gallery
+async def gallery_setup(session: Session) -> None:
+    product_id = await _create_product(session)
+    session.state["product_id"] = product_id
+    if product_id:
+        for _ in range(5):
+            await _upload_visual(session, product_id)
+
+async def gallery_listing(session: Session) -> None:
+    product_id = session.state.get("product_id")
+    await session.request("GET /api/visuals", "GET", "/api/visuals", params={"limit": 100})
+    if product_id:
+        await session.request("GET /api/products/{id}/visuals", "GET", f"/api/products/{product_id}/visuals")
+    await session.request("GET /api/files", "GET", "/api/files", params={"limit": 50})
+
+# uploads: one 200 KiB image per iteration
+async def uploads_setup(session: Session) -> None:
+    session.state["product_id"] = await _create_product(session)
+
+async def uploads(session: Session) -> None:
+    product_id = session.state.get("product_id")
+    if product_id:
+        await _upload_visual(session, product_id)
+
+# ad_copy_generation: AI path against the fake OpenAI server
+async def ad_copy_setup(session: Session) -> None:
+    session.state["product_id"] = await _create_product(session)
+
+async def ad_copy_generation(session: Session) -> None:
+    product_id = session.state.get("product_id")
+    if product_id:
+        await session.request(
+            "POST /api/ai/generate-ad-copies", "POST", "/api/ai/generate-ad-copies",
+            json={"product_id": product_id, "num_variations": 3}
+        )
+
+async def _no_setup(session: Session) -> None:
+    return None
+
+@dataclass
+class Scenario:
+    name: str
+    iteration: Callable[[Session], Awaitable[None]]
+    setup: Callable[[Session], Awaitable[None]] = field(default=_no_setup)
+
+SCENARIOS: Dict[str, Scenario] = {
+    scenario.name: scenario for scenario in [
+        Scenario("product_crud", product_crud),
+        Scenario("gallery_listing", gallery_listing, gallery_setup),
+        Scenario("uploads", uploads, uploads_setup),
+        Scenario("ad_copy_generation", ad_copy_generation, ad_copy_setup)
+    ]
+}
@@ -0,0 +1,244 @@
+"""
+Local benchmark stack
+
+Starts the API against local stand-ins so load tests never touch production
+GCP or OpenAI:
+
+- Firestore emulator (`gcloud emulators firestore start`)
+- fake-gcs-server container as the GCS stand-in (`docker run fsouza/fake-gcs-server`)
+- Firebase Auth emulator mode, in which firebase_admin accepts unsigned ID tokens
+- benchmarks.fake_openai as the OpenAI-compatible server
+
+Any emulator whose *_EMULATOR_HOST variable is already set is reused instead
+of being started.
+"""
+import os
+import sys
+import time
+import base64
+import json
+import socket
+import logging
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_BUCKETS = {
+    "ASSETS_BUCKET": "nexsy-assets-bench",
+    "GENERATED_BUCKET": "nexsy-generated-bench",
+    "TEMPLATES_BUCKET": "nexsy-templates-bench",
+    "REPORTS_BUCKET": "nexsy-reports-bench"
+}
+
+# Environment that lets the app import and construct its GCP clients without
+# credentials or network access (emulator hosts nothing listens on)
+OFFLINE_ENV = {
+    "FIRESTORE_EMULATOR_HOST": "127.0.0.1:1",
+    "STORAGE_EMULATOR_HOST": "http://127.0.0.1:1",
+    "FIREBASE_AUTH_EMULATOR_HOST": "127.0.0.1:1",
+    "GOOGLE_CLOUD_PROJECT": "nexsy-bench",
+    "GCP_PROJECT_ID": "nexsy-bench",
+    **BENCH_BUCKETS
+}
+
+def mint_id_token(user_id: str, project_id: str, lifetime_seconds: int = 3600) -> str:
+    """
+    Build an unsigned Firebase ID token for use against the Auth emulator
+
+    Args:
+        user_id: UID to put in the sub/user_id claims
+        project_id: Firebase project id the app verifies the audience against
+        lifetime_seconds: Token validity
+
+    Returns:
+        str: JWT with alg "none" that firebase_admin accepts in emulator mode
+    """
+    def encode(segment: Dict) -> str:
+        raw = json.dumps(segment, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "aud": project_id,
+        "auth_time": now,
+        "user_id": user_id,
+        "sub": user_id,
+        "iat": now,
+        "exp": now + lifetime_seconds,
+        "email": f"{user_id}@bench.local",
+        "email_verified": True,
+        "firebase": {"identities": {}, "sign_in_provider": "custom"}
+    }
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(claims)}."
+
+def _wait_for_port(host: str, port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise TimeoutError(f"Nothing listening on {host}:{port} after {timeout}s")
+
+def _wait_for_http(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+class LocalStack:
+    """Starts and stops the emulators, fake OpenAI server and API process"""
+
+    def __init__(
+        self,
+        project_id: str = "nexsy-bench",
+        app_port: int = 8000,
+        app_workers: int = 1,
+        openai_port: int = 8900,
+        openai_latency_ms: float = 800,
+        openai_jitter_ms: float = 200,
+        firestore_port: int = 8081,
+        gcs_port: int = 4443,
+        auth_host: str = "127.0.0.1:9099",
+        startup_timeout: float = 60
+    ):
+        self.project_id = project_id
+        self.app_port = app_port
+        self.app_workers = app_workers
+        self.openai_port = openai_port
+        self.openai_latency_ms = openai_latency_ms
+        self.openai_jitter_ms = openai_jitter_ms
+        self.firestore_host = os.getenv("FIRESTORE_EMULATOR_HOST") or f"127.0.0.1:{firestore_port}"
+        self.gcs_host = os.getenv("STORAGE_EMULATOR_HOST") or f"http://127.0.0.1:{gcs_port}"
+        self.auth_host = os.getenv("FIREBASE_AUTH_EMULATOR_HOST") or auth_host
+        self.startup_timeout = startup_timeout
+        self._processes: List[subprocess.Popen] = []
+        self._gcs_container: Optional[str] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.app_port}"
+
+    def app_env(self) -> Dict[str, str]:
+        """Environment the API process runs with"""
+        env = dict(os.environ)
+        env.update(BENCH_BUCKETS)
+        env.update({
+            "FIRESTORE_EMULATOR_HOST": self.firestore_host,
+            "STORAGE_EMULATOR_HOST": self.gcs_host,
+            "FIREBASE_AUTH_EMULATOR_HOST": self.auth_host,
+            "GOOGLE_CLOUD_PROJECT": self.project_id,
+            "GCP_PROJECT_ID": self.project_id,
+            "VITE_FIREBASE_PROJECT_ID": self.project_id,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{self.openai_port}/v1",
+            "ENVIRONMENT": "development",
+            "LOG_LEVEL": "WARNING"
+        })
+        # Load tests drive many requests per user; measure the app, not the limiter
+        env.setdefault("RATE_LIMIT_ENABLED", "false")
+        env.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+        return env
+
+    def start(self) -> "LocalStack":
+        try:
+            self._start_firestore()
+            self._start_gcs()
+            self._start_fake_openai()
+            self._start_app()
+        except Exception:
+            self.stop()
+            raise
+        return self
+
+    def stop(self) -> None:
+        for process in reversed(self._processes):
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        self._processes.clear()
+
+        if self._gcs_container:
+            subprocess.run(["docker", "rm", "-f", self._gcs_container], capture_output=True)
+            self._gcs_container = None
+
+    def __enter__(self) -> "LocalStack":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _spawn(self, args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+        logger.info(f"Starting: {' '.join(args)}")
+        process = subprocess.Popen(
+            args,
+            cwd=BACKEND_DIR,
+            env=env or dict(os.environ),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.STDOUT if logger.isEnabledFor(logging.DEBUG) else subprocess.DEVNULL
+        )
+        self._processes.append(process)
+        return process
+
+    def _start_firestore(self) -> None:
+        host, port = self.firestore_host.rsplit(":", 1)
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            self._spawn([
+                "gcloud", "emulators", "firestore", "start",
+                f"--host-port={self.firestore_host}", "--quiet"
+            ])
+        _wait_for_port(host, int(port), self.startup_timeout)
+
+    def _start_gcs(self) -> None:
+        if not os.getenv("STORAGE_EMULATOR_HOST"):
+            port = self.gcs_host.rsplit(":", 1)[1]
+            result = subprocess.run([
+                "docker", "run", "-d", "--rm", "-p", f"{port}:{port}",
+                "fsouza/fake-gcs-server", "-scheme", "http", "-port", port,
+                "-public-host", f"127.0.0.1:{port}"
+            ], capture_output=True, text=True, check=True)
+            self._gcs_container = result.stdout.strip()
+        _wait_for_http(f"{self.gcs_host}/storage/v1/b", self.startup_timeout)
+
+        # Buckets the API resolves through the *_BUCKET overrides
+        for bucket_name in BENCH_BUCKETS.values():
+            response = httpx.post(
+                f"{self.gcs_host}/storage/v1/b",
+                params={"project": self.project_id},
+                json={"name": bucket_name}
+            )
+            if response.status_code not in (200, 409):
+                response.raise_for_status()
+
+    def _start_fake_openai(self) -> None:
+        env = dict(os.environ)
+        env["FAKE_OPENAI_LATENCY_MS"] = str(self.openai_latency_ms)
+        env["FAKE_OPENAI_JITTER_MS"] = str(self.openai_jitter_ms)
+        self._spawn([
+            sys.executable, "-m", "uvicorn", "benchmarks.fake_openai:app",
+            "--host", "127.0.0.1", "--port", str(self.openai_port), "--log-level", "warning"
+        ], env=env)
+        _wait_for_http(f"http://127.0.0.1:{self.openai_port}/v1/models", self.startup_timeout)
+
+    def _start_app(self) -> None:
+        self._spawn([
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(self.app_port),
+            "--workers", str(self.app_workers), "--log-level", "warning"
+        ], env=self.app_env())
+        _wait_for_http(f"{self.base_url}/health", self.startup_timeout)
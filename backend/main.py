@@ -1,5 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 from typing import Optional
@@ -14,20 +16,58 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from middleware.auth import get_current_user, get_current_user_id
+from middleware.auth import get_current_user, get_current_user_id, initialize_firebase
+from middleware.metrics import MetricsMiddleware, require_metrics_token
+from middleware.tracing import TracingMiddleware
+from middleware.rate_limit import close_rate_limiter
+from middleware.compression import CompressionMiddleware, compression_enabled
 from routes import products, upload, visuals, ai
+from services.providers import warm_services, close_services
+from services.cache_coherence import start_cache_coherence, stop_cache_coherence
+from services.pregeneration import close_pregenerator
+from utils.metrics import metrics_payload, METRICS_CONTENT_TYPE
+from utils.tracing import configure_tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tracing exporter is selected by TRACING_EXPORTER (off by default)
+configure_tracing()
+
+async def warm_up():
+    """Initialize Firebase Admin and construct service clients ahead of the first requests"""
+    try:
+        await asyncio.to_thread(initialize_firebase)
+        await warm_services()
+        logger.info("Service warm-up complete")
+    except Exception as e:
+        logger.warning(f"Service warm-up failed, services will initialize on first use: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the instance reports ready (e.g. /health) immediately
+    warm_up_task = None
+    if os.getenv("WARM_UP_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes"):
+        warm_up_task = asyncio.create_task(warm_up())
+    # Cross-instance cache invalidation, if CACHE_COHERENCE=listeners (off by default)
+    await start_cache_coherence()
+    yield
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+    await stop_cache_coherence()
+    await close_pregenerator()
+    await close_services()
+    await close_rate_limiter()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Nexsy API", 
     version="2.0.0",
     description="Nexsy V2 - Product Marketing and Campaign Management API",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -44,6 +84,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli/gzip for large JSON bodies (COMPRESSION_ENABLED, on by default)
+if compression_enabled():
+    app.add_middleware(CompressionMiddleware)
+
+# Request tracing and metrics (outermost, so they include CORS handling)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(products.router)
 app.include_router(upload.router)
@@ -84,6 +132,11 @@ async def health_check():
         "environment": os.getenv("ENVIRONMENT", "development")
     }
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def metrics():
+    """Prometheus metrics endpoint (METRICS_TOKEN bearer token outside development)"""
+    return Response(content=metrics_payload(), media_type=METRICS_CONTENT_TYPE)
+
 # Authentication routes (legacy compatibility)
 @app.get("/api/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
@@ -6,36 +6,52 @@ from functools import wraps
 from typing import Optional
 from fastapi import HTTPException, status, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import firebase_admin
-from firebase_admin import auth, credentials
 import os
+import threading
 
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase Admin SDK
-if not firebase_admin._apps:
-    try:
-        # Check if we have a service account key file
-        service_account_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-        if service_account_path and os.path.exists(service_account_path):
-            logger.info(f"Using service account from {service_account_path}")
-            cred = credentials.Certificate(service_account_path)
-        else:
-            # Try to use Application Default Credentials
-            logger.info("Using Application Default Credentials")
-            cred = credentials.ApplicationDefault()
-        
-        firebase_admin.initialize_app(cred, {
-            'projectId': os.getenv('VITE_FIREBASE_PROJECT_ID', 'nexsy-authv1')
-        })
-        logger.info("Firebase Admin SDK initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
-        # Initialize with minimal config for development
-        firebase_admin.initialize_app(options={
-            'projectId': os.getenv('VITE_FIREBASE_PROJECT_ID', 'nexsy-authv1')
-        })
-        logger.warning("Firebase Admin SDK initialized with minimal config")
+_firebase_lock = threading.Lock()
+
+def initialize_firebase():
+    """
+    Initialize the Firebase Admin SDK on first use and return its auth module
+    
+    Importing firebase_admin and resolving credentials is deferred to the first
+    token verification (or the app lifespan) so it is not paid at import time.
+    """
+    import firebase_admin
+    from firebase_admin import auth, credentials
+    
+    if firebase_admin._apps:
+        return auth
+    
+    with _firebase_lock:
+        if firebase_admin._apps:
+            return auth
+        try:
+            # Check if we have a service account key file
+            service_account_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+            if service_account_path and os.path.exists(service_account_path):
+                logger.info(f"Using service account from {service_account_path}")
+                cred = credentials.Certificate(service_account_path)
+            else:
+                # Try to use Application Default Credentials
+                logger.info("Using Application Default Credentials")
+                cred = credentials.ApplicationDefault()
+            
+            firebase_admin.initialize_app(cred, {
+                'projectId': os.getenv('VITE_FIREBASE_PROJECT_ID', 'nexsy-authv1')
+            })
+            logger.info("Firebase Admin SDK initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
+            # Initialize with minimal config for development
+            firebase_admin.initialize_app(options={
+                'projectId': os.getenv('VITE_FIREBASE_PROJECT_ID', 'nexsy-authv1')
+            })
+            logger.warning("Firebase Admin SDK initialized with minimal config")
+    return auth
 
 # Security scheme for FastAPI
 security = HTTPBearer()
@@ -57,6 +73,7 @@ class AuthMiddleware:
         Raises:
             HTTPException: If token is invalid or verification fails
         """
+        auth = initialize_firebase()
         try:
             if not credentials or not credentials.credentials:
                 raise HTTPException(
@@ -0,0 +1,223 @@
+"""
+Response compression middleware (Brotli or gzip, per Accept-Encoding)
+
+Compresses text-like responses (JSON, HTML, CSV, ...) of at least
+COMPRESSION_MIN_SIZE bytes, including streaming responses, which are
+compressed and flushed chunk by chunk. Media, already-encoded and partial
+(206) responses pass through untouched. Brotli is used when the brotli
+package is installed and the client prefers it; otherwise gzip.
+
+A compressed body is a different representation: its ETag is made weak and
+Accept-Ranges is dropped, since byte ranges and strong validators refer to
+the identity body.
+"""
+import os
+import zlib
+import logging
+from typing import List, Optional
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import HTTP_COMPRESSION_BYTES
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content types worth compressing; everything else (images, video, archives) is already compact
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/xml",
+    "application/x-ndjson", "image/svg+xml"
+)
+COMPRESSIBLE_SUFFIXES = ("+json", "+xml")
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _is_compressible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith(COMPRESSIBLE_SUFFIXES)
+
+def choose_encoding(accept_encoding: str, brotli_available: bool = True) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None for identity"""
+    supported = ("br", "gzip") if brotli_available else ("gzip",)
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in supported:
+        quality = weights.get(coding, weights.get("*", 0.0))
+        # Ties keep the earlier (smaller output) coding
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+class _Compressor:
+    """Incremental gzip or Brotli stream"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits 16+: gzip container rather than raw zlib
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress data; flush makes everything so far decodable by the client"""
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses with Brotli or gzip"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None
+    ):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else _env_int("COMPRESSION_MIN_SIZE", 1024)
+        self.gzip_level = gzip_level if gzip_level is not None else _env_int("COMPRESSION_GZIP_LEVEL", 6)
+        # Brotli's default quality (11) is meant for static assets and far too slow per request
+        self.brotli_quality = brotli_quality if brotli_quality is not None else _env_int("COMPRESSION_BROTLI_QUALITY", 4)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding, brotli is not None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+class _CompressionResponder:
+    """Per-response state: holds the start message until the first body chunk decides"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.compressor: Optional[_Compressor] = None
+        # None: undecided, False: pass through, True: compressing
+        self.compressing: Optional[bool] = None
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            if not self._eligible(message):
+                self.compressing = False
+                await self._send(message)
+            return
+        if message_type != "http.response.body" or self.compressing is False:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressing is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                # Small complete body: not worth the CPU or the extra headers
+                self.compressing = False
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+            self.compressing = True
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers = self._compressed_headers(self.start_message["headers"])
+            if not more_body:
+                compressed = self.compressor.finish(body)
+                headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                await self._send({**self.start_message, "headers": headers})
+                self._record(len(body), len(compressed))
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            # Streaming: length unknown up front, sent chunked
+            await self._send({**self.start_message, "headers": headers})
+
+        if more_body:
+            compressed = self.compressor.compress(body, flush=True)
+        else:
+            compressed = self.compressor.finish(body)
+        self._record(len(body), len(compressed))
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _eligible(self, message) -> bool:
+        status = message["status"]
+        # 206: byte ranges refer to the identity body; 204/304 and 1xx have no body
+        if status < 200 or status in (204, 206, 304):
+            return False
+        content_type = ""
+        for name, value in message.get("headers", []):
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.decode("latin-1")
+            elif name == b"cache-control" and b"no-transform" in value.lower():
+                return False
+        return _is_compressible(content_type)
+
+    def _compressed_headers(self, headers) -> List:
+        result = []
+        vary = None
+        for name, value in headers:
+            lower = name.lower()
+            if lower in (b"content-length", b"accept-ranges"):
+                continue
+            if lower == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            if lower == b"vary":
+                vary = value
+                continue
+            result.append((name, value))
+        result.append((b"content-encoding", self.encoding.encode("latin-1")))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower() and vary.strip() != b"*":
+            vary = vary + b", Accept-Encoding"
+        result.append((b"vary", vary))
+        return result
+
+    def _record(self, raw: int, compressed: int) -> None:
+        HTTP_COMPRESSION_BYTES.labels(encoding=self.encoding, stage="raw").inc(raw)
+        HTTP_COMPRESSION_BYTES.labels(encoding=self.encoding, stage="compressed").inc(compressed)
+
+def compression_enabled() -> bool:
+    return os.getenv("COMPRESSION_ENABLED", "true").strip().lower() in ("1", "true", "yes")
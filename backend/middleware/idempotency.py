@@ -0,0 +1,107 @@
+"""
+Idempotency-Key handling for expensive POST endpoints
+
+Clients send an Idempotency-Key header (any string up to 255 characters,
+e.g. a UUID per user action). Retries with the same key and payload get the
+first response back, marked with Idempotent-Replayed: true, instead of
+running the generation or upload again. Requests without the header behave
+as before.
+"""
+import os
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Header, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.idempotency import (
+    Idempotency, IdempotencyInProgress, IdempotencyKeyMismatch,
+    create_idempotency_store, request_fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+_idempotency: Optional[Idempotency] = None
+_idempotency_lock = threading.Lock()
+
+def get_idempotency() -> Idempotency:
+    """Process-wide idempotency runner, configured from the environment on first use"""
+    global _idempotency
+    if _idempotency is None:
+        with _idempotency_lock:
+            if _idempotency is None:
+                _idempotency = Idempotency(
+                    store=create_idempotency_store(),
+                    ttl=_env_float("IDEMPOTENCY_TTL_SECONDS", 86400),
+                    lease_seconds=_env_float("IDEMPOTENCY_LEASE_SECONDS", 300)
+                )
+    return _idempotency
+
+async def idempotency_key(key: Optional[str] = Header(None, alias="Idempotency-Key")) -> Optional[str]:
+    """FastAPI dependency: the request's Idempotency-Key header, if any"""
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+        )
+    return key
+
+async def run_idempotent(
+    response: Response,
+    user_id: str,
+    scope: str,
+    key: Optional[str],
+    payload: Any,
+    operation: Callable[[], Awaitable[Any]]
+) -> Any:
+    """
+    Run an endpoint's work at most once per (user, scope, key)
+
+    Args:
+        response: The endpoint's Response, to mark replays
+        scope: Endpoint name; keys are only reused within a scope
+        key: Idempotency-Key header value, or None to just run the operation
+        payload: Request parameters; reusing a key with different ones is a 422
+        operation: Produces the response body (must be JSON-encodable)
+
+    Raises:
+        HTTPException: 422 for a key reused with another payload, 409 if the
+            request holding the key is still running
+    """
+    if key is None:
+        return await operation()
+
+    async def encoded():
+        return jsonable_encoder(await operation())
+
+    try:
+        body, replayed = await get_idempotency().run(
+            f"{user_id}:{scope}:{key}", scope, request_fingerprint(payload), encoded
+        )
+    except IdempotencyKeyMismatch:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    except IdempotencyInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress"
+        )
+
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return body
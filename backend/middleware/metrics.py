@@ -0,0 +1,80 @@
+"""
+Request metrics middleware, and access control for the /metrics endpoint
+"""
+import time
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import (
+    HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_PROGRESS,
+    FIRESTORE_READS_PER_REQUEST, start_request_read_count
+)
+
+logger = logging.getLogger(__name__)
+
+async def require_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    """
+    FastAPI dependency guarding /metrics
+
+    With METRICS_TOKEN set, scrapers must send "Authorization: Bearer <token>".
+    Without it the endpoint is only served when ENVIRONMENT is development,
+    and is a 404 elsewhere.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        if os.getenv("ENVIRONMENT", "development") == "development":
+            return
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status codes and Firestore reads"""
+
+    def __init__(self, app, excluded_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        read_counter = start_request_read_count()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method=method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            HTTP_REQUESTS_IN_PROGRESS.labels(method=method).dec()
+
+            # Label by route template (e.g. /api/products/{product_id}) to bound cardinality
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+
+            HTTP_REQUESTS.labels(method=method, route=route_path, status=str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method=method, route=route_path).observe(duration)
+            FIRESTORE_READS_PER_REQUEST.labels(route=route_path).observe(read_counter[0])
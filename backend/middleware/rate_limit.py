@@ -0,0 +1,159 @@
+"""
+Per-user rate limiting and concurrency caps for AI generation endpoints
+
+Each user gets a token bucket (AI_RATE_LIMIT_PER_MINUTE, bursting to
+AI_RATE_LIMIT_BURST) and at most AI_MAX_CONCURRENT_PER_USER generations in
+flight. Requests over either limit get 429 with Retry-After.
+"""
+import os
+import math
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, status, Depends
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.auth import get_current_user_id
+from services.providers import get_ai_service
+from utils.metrics import RATE_LIMIT_DECISIONS, AI_GENERATIONS_IN_PROGRESS
+from utils.rate_limit import RateLimitBackend, create_rate_limit_backend
+
+logger = logging.getLogger(__name__)
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+class RateLimiter:
+    """Token bucket plus concurrency cap per key, stored in a RateLimitBackend"""
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        scope: str,
+        per_minute: float,
+        burst: float,
+        max_concurrent: int,
+        lease_seconds: float = 300,
+        concurrency_retry_after: float = 5
+    ):
+        self.backend = backend
+        self.scope = scope
+        self.rate = per_minute / 60
+        self.burst = max(1.0, burst)
+        self.max_concurrent = max_concurrent
+        self.lease_seconds = lease_seconds
+        self.concurrency_retry_after = concurrency_retry_after
+
+    def _reject(self, outcome: str, detail: str, retry_after: float) -> HTTPException:
+        RATE_LIMIT_DECISIONS.labels(scope=self.scope, outcome=outcome).inc()
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def acquire(self, key: str) -> Optional[str]:
+        """
+        Admit a request for `key` or raise 429
+
+        Returns:
+            str: Concurrency lease to pass to release(), or None if none was taken
+
+        Raises:
+            HTTPException: 429 when the key is over its rate or concurrency limit
+        """
+        lease = None
+        try:
+            if self.max_concurrent > 0:
+                lease = await self.backend.acquire_slot(f"{self.scope}:{key}", self.max_concurrent, self.lease_seconds)
+                if lease is None:
+                    raise self._reject(
+                        "concurrency_limited",
+                        f"Too many generations in progress (limit {self.max_concurrent}), try again shortly",
+                        self.concurrency_retry_after
+                    )
+
+            if self.rate > 0:
+                wait = await self.backend.consume(f"{self.scope}:{key}", self.rate, self.burst)
+                if wait > 0:
+                    if lease is not None:
+                        await self.release(key, lease)
+                    raise self._reject("rate_limited", "Rate limit exceeded, try again later", wait)
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Fail open: a backend outage must not take the AI endpoints down with it
+            logger.error(f"Rate limit backend error, allowing request: {str(e)}")
+            RATE_LIMIT_DECISIONS.labels(scope=self.scope, outcome="backend_error").inc()
+            return lease
+
+        RATE_LIMIT_DECISIONS.labels(scope=self.scope, outcome="allowed").inc()
+        return lease
+
+    async def release(self, key: str, lease: str) -> None:
+        try:
+            await self.backend.release_slot(f"{self.scope}:{key}", lease)
+        except Exception as e:
+            # The lease expires on its own after lease_seconds
+            logger.warning(f"Failed to release rate limit lease: {str(e)}")
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def rate_limiting_enabled() -> bool:
+    return os.getenv("RATE_LIMIT_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+
+def get_ai_rate_limiter() -> RateLimiter:
+    """Process-wide limiter for the AI endpoints, configured from the environment on first use"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    backend=create_rate_limit_backend(),
+                    scope="ai",
+                    per_minute=_env_float("AI_RATE_LIMIT_PER_MINUTE", 20),
+                    burst=_env_float("AI_RATE_LIMIT_BURST", 10),
+                    max_concurrent=int(_env_float("AI_MAX_CONCURRENT_PER_USER", 2)),
+                    lease_seconds=_env_float("AI_GENERATION_LEASE_SECONDS", 300)
+                )
+    return _limiter
+
+async def close_rate_limiter() -> None:
+    """Close the limiter's backend connection (on shutdown)"""
+    global _limiter
+    limiter, _limiter = _limiter, None
+    if limiter is not None:
+        await limiter.backend.close()
+
+async def ai_rate_limited_user_id(user_id: str = Depends(get_current_user_id)) -> AsyncIterator[str]:
+    """
+    FastAPI dependency for AI generation endpoints
+
+    Authenticates like get_current_user_id, then admits the request against the
+    user's AI limits and holds a concurrency slot until the response is done.
+    The user's queued background AI work is promoted to interactive, since
+    this request may be waiting on it (e.g. joining a pre-generation); a
+    request rejected by the limits promotes nothing.
+    """
+    if not rate_limiting_enabled():
+        get_ai_service().scheduler.promote(user_id)
+        yield user_id
+        return
+
+    limiter = get_ai_rate_limiter()
+    lease = await limiter.acquire(user_id)
+    AI_GENERATIONS_IN_PROGRESS.inc()
+    try:
+        get_ai_service().scheduler.promote(user_id)
+        yield user_id
+    finally:
+        AI_GENERATIONS_IN_PROGRESS.dec()
+        if lease is not None:
+            # Shielded so a cancelled request still returns its slot
+            await asyncio.shield(limiter.release(user_id, lease))
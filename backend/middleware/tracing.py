@@ -0,0 +1,63 @@
+"""
+Request tracing middleware
+"""
+import logging
+
+from opentelemetry import context, propagate
+from opentelemetry.trace import SpanKind
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tracing import tracer, set_span_error
+
+logger = logging.getLogger(__name__)
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request and continuing incoming W3C trace context"""
+
+    def __init__(self, app, excluded_paths: tuple = ("/metrics", "/health")):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Continue a trace started by the caller (traceparent / tracestate headers)
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        parent_context = propagate.extract(carrier)
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = context.attach(parent_context)
+        try:
+            with tracer.start_as_current_span(
+                f"{method} {scope['path']}",
+                kind=SpanKind.SERVER,
+                record_exception=True,
+                set_status_on_exception=True
+            ) as span:
+                span.set_attribute("http.request.method", method)
+                span.set_attribute("url.path", scope["path"])
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    # Rename to the route template once routing has matched
+                    route = getattr(scope.get("route"), "path", None)
+                    if route:
+                        span.update_name(f"{method} {route}")
+                        span.set_attribute("http.route", route)
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        set_span_error(span, f"HTTP {status_code}")
+        finally:
+            context.detach(token)
@@ -4,9 +4,19 @@ Creative Output model for Firestore operations
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from google.cloud import firestore
 import logging
 
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.product import get_product_ref, summary_updates_for_create, commit_with_summary, delete_with_summary, LATEST_OUTPUT_CACHE
+from utils.cache import get_cache
+from utils.firestore import get_firestore_client, get_document, stream_documents, DESCENDING
+from utils.metrics import instrument_firestore, record_firestore_reads
+from utils.tracing import traced
+from utils.singleflight import single_flight
+
 logger = logging.getLogger(__name__)
 
 class AdCopy(BaseModel):
@@ -32,6 +42,7 @@ class CreativeOutput(BaseModel):
     
     generation_timestamp: Optional[datetime] = None
     tone: Optional[str] = None
+    ai_model: Optional[str] = None
 
     class Config:
         json_encoders = {
@@ -42,13 +53,22 @@ class CreativeOutputService:
     """Service for Creative Output Firestore operations"""
     
     def __init__(self):
-        self.db = firestore.Client()
+        self.db = get_firestore_client()
         self.collection_name = "users"
+        # Latest output by (user_id, product_id); None is cached for products without one
+        self.latest_output_cache = get_cache(LATEST_OUTPUT_CACHE)
+    
+    def invalidate_latest_output(self, user_id: str, product_id: str) -> None:
+        """Drop the cached latest output of a product (after a write that may change it)"""
+        self.latest_output_cache.invalidate((user_id, product_id))
+        self._query_latest_output.forget(user_id, product_id)
     
     def _get_user_outputs_ref(self, user_id: str):
         """Get reference to user's creative outputs subcollection"""
         return self.db.collection(self.collection_name).document(user_id).collection("creativeOutputs")
     
+    @traced()
+    @instrument_firestore("creativeOutputs", "create_creative_output")
     async def create_creative_output(self, user_id: str, output_data: Dict[str, Any]) -> CreativeOutput:
         """Create a new creative output"""
         try:
@@ -66,12 +86,19 @@ class CreativeOutputService:
             outputs_ref = self._get_user_outputs_ref(user_id)
             doc_ref = outputs_ref.document()
             
-            # Convert to dict and store
+            # Store with the product summary update in one atomic batch
             output_dict = creative_output.dict(exclude={"id"})
-            doc_ref.set(output_dict)
+            batch = self.db.batch()
+            batch.set(doc_ref, output_dict)
+            batch.update(
+                get_product_ref(self.db, user_id, creative_output.product_id),
+                summary_updates_for_create("creativeOutputs", doc_ref.id, output_dict)
+            )
+            commit_with_summary(batch, creative_output.product_id)
             
             # Return output with ID
             creative_output.id = doc_ref.id
+            self.invalidate_latest_output(user_id, creative_output.product_id)
             
             logger.info(f"Created creative output {doc_ref.id} for user {user_id}")
             return creative_output
@@ -80,11 +107,15 @@ class CreativeOutputService:
             logger.error(f"Error creating creative output for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("creativeOutputs", "get_creative_output")
     async def get_creative_output(self, user_id: str, output_id: str) -> Optional[CreativeOutput]:
         """Get a specific creative output by ID"""
         try:
             doc_ref = self._get_user_outputs_ref(user_id).document(output_id)
-            doc = doc_ref.get()
+            doc = await get_document(doc_ref)
+            record_firestore_reads("creativeOutputs")
             
             if not doc.exists:
                 return None
@@ -98,21 +129,25 @@ class CreativeOutputService:
             logger.error(f"Error getting creative output {output_id} for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("creativeOutputs", "list_product_outputs")
     async def list_product_outputs(self, user_id: str, product_id: str, limit: int = 50) -> List[CreativeOutput]:
         """List all creative outputs for a specific product"""
         try:
             outputs_ref = self._get_user_outputs_ref(user_id)
-            docs = (outputs_ref
-                   .where("product_id", "==", product_id)
-                   .order_by("generation_timestamp", direction=firestore.Query.DESCENDING)
-                   .limit(limit)
-                   .stream())
+            query = (outputs_ref
+                    .where("product_id", "==", product_id)
+                    .order_by("generation_timestamp", direction=DESCENDING)
+                    .limit(limit))
+            docs = await stream_documents(query)
             
             outputs = []
             for doc in docs:
                 output_data = doc.to_dict()
                 output_data["id"] = doc.id
                 outputs.append(CreativeOutput(**output_data))
+            record_firestore_reads("creativeOutputs", max(len(outputs), 1))
             
             logger.info(f"Retrieved {len(outputs)} creative outputs for product {product_id}")
             return outputs
@@ -122,56 +157,80 @@ class CreativeOutputService:
             raise
     
     async def get_latest_output(self, user_id: str, product_id: str) -> Optional[CreativeOutput]:
-        """Get the most recent creative output for a product"""
+        """Get the most recent creative output for a product (read through the cache)"""
+        return await self.latest_output_cache.get_or_load(
+            (user_id, product_id),
+            lambda: self._query_latest_output(user_id, product_id)
+        )
+    
+    @single_flight("CreativeOutputService.get_latest_output")
+    @traced("CreativeOutputService.get_latest_output")
+    @instrument_firestore("creativeOutputs", "get_latest_output")
+    async def _query_latest_output(self, user_id: str, product_id: str) -> Optional[CreativeOutput]:
+        """Query the most recent creative output of a product"""
         try:
             outputs_ref = self._get_user_outputs_ref(user_id)
-            docs = (outputs_ref
-                   .where("product_id", "==", product_id)
-                   .order_by("generation_timestamp", direction=firestore.Query.DESCENDING)
-                   .limit(1)
-                   .stream())
+            query = (outputs_ref
+                    .where("product_id", "==", product_id)
+                    .order_by("generation_timestamp", direction=DESCENDING)
+                    .limit(1))
+            docs = await stream_documents(query)
             
             for doc in docs:
                 output_data = doc.to_dict()
                 output_data["id"] = doc.id
+                record_firestore_reads("creativeOutputs")
                 return CreativeOutput(**output_data)
             
+            record_firestore_reads("creativeOutputs")
             return None
             
         except Exception as e:
             logger.error(f"Error getting latest output for product {product_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("creativeOutputs", "update_creative_output")
     async def update_creative_output(self, user_id: str, output_id: str, updates: Dict[str, Any]) -> Optional[CreativeOutput]:
         """Update a creative output"""
         try:
             doc_ref = self._get_user_outputs_ref(user_id).document(output_id)
             
             # Check if output exists
-            if not doc_ref.get().exists:
+            doc = doc_ref.get()
+            record_firestore_reads("creativeOutputs")
+            if not doc.exists:
                 return None
             
             # Update document
             doc_ref.update(updates)
+            self.invalidate_latest_output(user_id, doc.to_dict()["product_id"])
             
-            # Return updated output
+            # Return updated output (not a read that started before the update)
+            self.get_creative_output.forget(user_id, output_id)
             return await self.get_creative_output(user_id, output_id)
             
         except Exception as e:
             logger.error(f"Error updating creative output {output_id} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("creativeOutputs", "delete_creative_output")
     async def delete_creative_output(self, user_id: str, output_id: str) -> bool:
         """Delete a creative output"""
         try:
             doc_ref = self._get_user_outputs_ref(user_id).document(output_id)
             
             # Check if output exists
-            if not doc_ref.get().exists:
+            doc = doc_ref.get()
+            record_firestore_reads("creativeOutputs")
+            if not doc.exists:
                 return False
             
-            # Delete document
-            doc_ref.delete()
+            # Delete document and update the product summary
+            product_id = doc.to_dict()["product_id"]
+            delete_with_summary(self.db, user_id, product_id, "creativeOutputs", [doc_ref])
+            self.invalidate_latest_output(user_id, product_id)
             
             logger.info(f"Deleted creative output {output_id} for user {user_id}")
             return True
@@ -180,6 +239,8 @@ class CreativeOutputService:
             logger.error(f"Error deleting creative output {output_id} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("creativeOutputs", "update_ad_copies")
     async def update_ad_copies(self, user_id: str, output_id: str, ad_copies: List[Dict[str, Any]]) -> Optional[CreativeOutput]:
         """Update the ad copies in a creative output"""
         try:
@@ -196,3 +257,45 @@ class CreativeOutputService:
         except Exception as e:
             logger.error(f"Error updating ad copies for output {output_id}: {str(e)}")
             raise
+    
+    @traced()
+    @instrument_firestore("creativeOutputs", "replace_ad_copy")
+    async def replace_ad_copy(self, user_id: str, output_id: str, index: int, ad_copy: Dict[str, Any]) -> Optional[CreativeOutput]:
+        """
+        Replace the ad copy at index, keeping the others as they are at write time
+        
+        Reads and writes ad_copies in one transaction, so concurrent
+        replacements of other indexes aren't lost. Returns None if the output
+        doesn't exist; raises IndexError for an index outside its ad copies.
+        """
+        from google.cloud.firestore import transactional
+        try:
+            validated_copy = AdCopy(**ad_copy).dict()
+            doc_ref = self._get_user_outputs_ref(user_id).document(output_id)
+            
+            @transactional
+            def replace_in_transaction(transaction):
+                doc = doc_ref.get(transaction=transaction)
+                record_firestore_reads("creativeOutputs")
+                if not doc.exists:
+                    return None
+                data = doc.to_dict()
+                ad_copies = list(data.get("ad_copies") or [])
+                if not 0 <= index < len(ad_copies):
+                    raise IndexError(f"Ad copy {index} not found in creative output {output_id}")
+                ad_copies[index] = validated_copy
+                transaction.update(doc_ref, {"ad_copies": ad_copies})
+                return data["product_id"]
+            
+            product_id = replace_in_transaction(self.db.transaction())
+            if product_id is None:
+                return None
+            self.invalidate_latest_output(user_id, product_id)
+            
+            # Return updated output (not a read that started before the update)
+            self.get_creative_output.forget(user_id, output_id)
+            return await self.get_creative_output(user_id, output_id)
+            
+        except Exception as e:
+            logger.error(f"Error replacing ad copy {index} of output {output_id}: {str(e)}")
+            raise
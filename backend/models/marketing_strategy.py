@@ -4,9 +4,19 @@ Marketing Strategy model for Firestore operations
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from google.cloud import firestore
 import logging
 
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.product import get_product_ref, summary_updates_for_create, commit_with_summary, delete_with_summary, PRODUCT_STRATEGY_CACHE
+from utils.cache import get_cache
+from utils.firestore import get_firestore_client, get_document, stream_documents, DESCENDING
+from utils.metrics import instrument_firestore, record_firestore_reads
+from utils.tracing import traced
+from utils.singleflight import single_flight
+
 logger = logging.getLogger(__name__)
 
 class CustomerAvatar(BaseModel):
@@ -34,6 +44,9 @@ class MarketingStrategy(BaseModel):
     
     # AI generation metadata
     openai_response_id: Optional[str] = None
+    ai_model: Optional[str] = None
+    # Prompt version and inputs it was generated from (see services.ai_service.input_fingerprint)
+    input_fingerprint: Optional[str] = None
     
     # Metadata
     created_at: Optional[datetime] = None
@@ -47,13 +60,22 @@ class MarketingStrategyService:
     """Service for Marketing Strategy Firestore operations"""
     
     def __init__(self):
-        self.db = firestore.Client()
+        self.db = get_firestore_client()
         self.collection_name = "users"
+        # Latest strategy by (user_id, product_id); None is cached for products without one
+        self.product_strategy_cache = get_cache(PRODUCT_STRATEGY_CACHE)
+    
+    def invalidate_product_strategy(self, user_id: str, product_id: str) -> None:
+        """Drop the cached latest strategy of a product (after a write that may change it)"""
+        self.product_strategy_cache.invalidate((user_id, product_id))
+        self._query_product_strategy.forget(user_id, product_id)
     
     def _get_user_strategies_ref(self, user_id: str):
         """Get reference to user's marketing strategies subcollection"""
         return self.db.collection(self.collection_name).document(user_id).collection("marketingStrategies")
     
+    @traced()
+    @instrument_firestore("marketingStrategies", "create_marketing_strategy")
     async def create_marketing_strategy(self, user_id: str, strategy_data: Dict[str, Any]) -> MarketingStrategy:
         """Create a new marketing strategy"""
         try:
@@ -71,12 +93,19 @@ class MarketingStrategyService:
             strategies_ref = self._get_user_strategies_ref(user_id)
             doc_ref = strategies_ref.document()
             
-            # Convert to dict and store
+            # Store with the product summary update in one atomic batch
             strategy_dict = strategy.dict(exclude={"id"})
-            doc_ref.set(strategy_dict)
+            batch = self.db.batch()
+            batch.set(doc_ref, strategy_dict)
+            batch.update(
+                get_product_ref(self.db, user_id, strategy.product_id),
+                summary_updates_for_create("marketingStrategies", doc_ref.id, strategy_dict)
+            )
+            commit_with_summary(batch, strategy.product_id)
             
             # Return strategy with ID
             strategy.id = doc_ref.id
+            self.invalidate_product_strategy(user_id, strategy.product_id)
             
             logger.info(f"Created marketing strategy {doc_ref.id} for user {user_id}")
             return strategy
@@ -85,11 +114,15 @@ class MarketingStrategyService:
             logger.error(f"Error creating marketing strategy for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("marketingStrategies", "get_marketing_strategy")
     async def get_marketing_strategy(self, user_id: str, strategy_id: str) -> Optional[MarketingStrategy]:
         """Get a specific marketing strategy by ID"""
         try:
             doc_ref = self._get_user_strategies_ref(user_id).document(strategy_id)
-            doc = doc_ref.get()
+            doc = await get_document(doc_ref)
+            record_firestore_reads("marketingStrategies")
             
             if not doc.exists:
                 return None
@@ -104,40 +137,56 @@ class MarketingStrategyService:
             raise
     
     async def get_product_strategy(self, user_id: str, product_id: str) -> Optional[MarketingStrategy]:
-        """Get the marketing strategy for a specific product"""
+        """Get the marketing strategy for a specific product (read through the cache)"""
+        return await self.product_strategy_cache.get_or_load(
+            (user_id, product_id),
+            lambda: self._query_product_strategy(user_id, product_id)
+        )
+    
+    @single_flight("MarketingStrategyService.get_product_strategy")
+    @traced("MarketingStrategyService.get_product_strategy")
+    @instrument_firestore("marketingStrategies", "get_product_strategy")
+    async def _query_product_strategy(self, user_id: str, product_id: str) -> Optional[MarketingStrategy]:
+        """Query the newest marketing strategy of a product"""
         try:
             strategies_ref = self._get_user_strategies_ref(user_id)
-            docs = (strategies_ref
-                   .where("product_id", "==", product_id)
-                   .order_by("created_at", direction=firestore.Query.DESCENDING)
-                   .limit(1)
-                   .stream())
+            query = (strategies_ref
+                    .where("product_id", "==", product_id)
+                    .order_by("created_at", direction=DESCENDING)
+                    .limit(1))
+            docs = await stream_documents(query)
             
             for doc in docs:
                 strategy_data = doc.to_dict()
                 strategy_data["id"] = doc.id
+                record_firestore_reads("marketingStrategies")
                 return MarketingStrategy(**strategy_data)
             
+            record_firestore_reads("marketingStrategies")
             return None
             
         except Exception as e:
             logger.error(f"Error getting strategy for product {product_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("marketingStrategies", "list_user_strategies")
     async def list_user_strategies(self, user_id: str, limit: int = 50) -> List[MarketingStrategy]:
         """List all marketing strategies for a user"""
         try:
             strategies_ref = self._get_user_strategies_ref(user_id)
-            docs = (strategies_ref
-                   .order_by("created_at", direction=firestore.Query.DESCENDING)
-                   .limit(limit)
-                   .stream())
+            query = (strategies_ref
+                    .order_by("created_at", direction=DESCENDING)
+                    .limit(limit))
+            docs = await stream_documents(query)
             
             strategies = []
             for doc in docs:
                 strategy_data = doc.to_dict()
                 strategy_data["id"] = doc.id
                 strategies.append(MarketingStrategy(**strategy_data))
+            record_firestore_reads("marketingStrategies", max(len(strategies), 1))
             
             logger.info(f"Retrieved {len(strategies)} marketing strategies for user {user_id}")
             return strategies
@@ -146,36 +195,48 @@ class MarketingStrategyService:
             logger.error(f"Error listing marketing strategies for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("marketingStrategies", "update_marketing_strategy")
     async def update_marketing_strategy(self, user_id: str, strategy_id: str, updates: Dict[str, Any]) -> Optional[MarketingStrategy]:
         """Update a marketing strategy"""
         try:
             doc_ref = self._get_user_strategies_ref(user_id).document(strategy_id)
             
             # Check if strategy exists
-            if not doc_ref.get().exists:
+            doc = doc_ref.get()
+            record_firestore_reads("marketingStrategies")
+            if not doc.exists:
                 return None
             
             # Update document
             doc_ref.update(updates)
+            self.invalidate_product_strategy(user_id, doc.to_dict()["product_id"])
             
-            # Return updated strategy
+            # Return updated strategy (not a read that started before the update)
+            self.get_marketing_strategy.forget(user_id, strategy_id)
             return await self.get_marketing_strategy(user_id, strategy_id)
             
         except Exception as e:
             logger.error(f"Error updating marketing strategy {strategy_id} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("marketingStrategies", "delete_marketing_strategy")
     async def delete_marketing_strategy(self, user_id: str, strategy_id: str) -> bool:
         """Delete a marketing strategy"""
         try:
             doc_ref = self._get_user_strategies_ref(user_id).document(strategy_id)
             
             # Check if strategy exists
-            if not doc_ref.get().exists:
+            doc = doc_ref.get()
+            record_firestore_reads("marketingStrategies")
+            if not doc.exists:
                 return False
             
-            # Delete document
-            doc_ref.delete()
+            # Delete document and update the product summary
+            product_id = doc.to_dict()["product_id"]
+            delete_with_summary(self.db, user_id, product_id, "marketingStrategies", [doc_ref])
+            self.invalidate_product_strategy(user_id, product_id)
             
             logger.info(f"Deleted marketing strategy {strategy_id} for user {user_id}")
             return True
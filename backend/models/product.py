@@ -1,12 +1,22 @@
 """
 Product model for Firestore operations
 """
+import asyncio
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from google.cloud import firestore
 import logging
 
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.firestore import get_firestore_client, get_document, stream_documents, DESCENDING
+from utils.metrics import instrument_firestore, record_firestore_reads
+from utils.tracing import traced
+from utils.singleflight import single_flight
+from utils.cache import get_cache
+
 logger = logging.getLogger(__name__)
 
 class Product(BaseModel):
@@ -31,6 +41,18 @@ class Product(BaseModel):
     ai_analysis_summary: Optional[str] = None
     ai_target_audience_profile: Optional[str] = None
     ai_key_selling_points: Optional[List[str]] = None
+    ai_analysis_model: Optional[str] = None
+    ai_analysis_fingerprint: Optional[str] = None
+    
+    # Denormalized summary of related documents (maintained by their services)
+    visual_count: int = 0
+    creative_output_count: int = 0
+    strategy_count: int = 0
+    latest_strategy_id: Optional[str] = None
+    latest_output_id: Optional[str] = None
+    latest_output_title: Optional[str] = None
+    thumbnail_visual_id: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     
     # Metadata
     created_at: Optional[datetime] = None
@@ -41,17 +63,120 @@ class Product(BaseModel):
             datetime: lambda v: v.isoformat()
         }
 
+# Product summary maintenance
+#
+# The services owning visuals, creative outputs and marketing strategies update
+# the parent product's counters and "latest" pointers in the same batch or
+# transaction as their own writes, so list_products alone can render the
+# dashboard. Each related collection has a counter field, a pointer to its
+# newest document and the field that orders it.
+SUMMARY_COLLECTIONS = {
+    "visuals": ("visual_count", "thumbnail_visual_id", "created_at"),
+    "creativeOutputs": ("creative_output_count", "latest_output_id", "generation_timestamp"),
+    "marketingStrategies": ("strategy_count", "latest_strategy_id", "created_at")
+}
+
+# Read-through caches (utils.cache) of per-product lookups, keyed by (user_id, product_id)
+PRODUCT_STRATEGY_CACHE = "product_strategy"
+LATEST_OUTPUT_CACHE = "latest_output"
+
+def get_product_ref(db, user_id: str, product_id: str):
+    """Reference to a product document"""
+    return db.collection("users").document(user_id).collection("products").document(product_id)
+
+def summary_pointer_fields(collection: str, doc_id: Optional[str], data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Product fields pointing at the newest document of a related collection (None clears them)"""
+    data = data or {}
+    if collection == "visuals":
+        return {
+            "thumbnail_visual_id": doc_id,
+            # Videos show their preview frame when they have one
+            "thumbnail_url": (data.get("preview_image_url") or data.get("asset_url")) if doc_id else None
+        }
+    if collection == "creativeOutputs":
+        return {"latest_output_id": doc_id, "latest_output_title": data.get("creative_concept_title")}
+    return {"latest_strategy_id": doc_id}
+
+class ProductNotFoundError(LookupError):
+    """The product a related document was written for doesn't exist"""
+
+def commit_with_summary(batch, product_id: str) -> None:
+    """
+    Commit a batch that creates related documents and updates their product's summary
+    
+    The summary update fails for a missing (e.g. just deleted) product, which
+    rejects the whole batch: no orphaned document is written.
+    
+    Raises:
+        ProductNotFoundError: the product doesn't exist
+    """
+    from google.api_core.exceptions import NotFound
+    try:
+        batch.commit()
+    except NotFound:
+        raise ProductNotFoundError(f"Product {product_id} not found")
+
+def summary_updates_for_create(collection: str, doc_id: str, data: Dict[str, Any], count: int = 1) -> Dict[str, Any]:
+    """Product updates for `count` new documents in a collection, the newest being doc_id/data"""
+    from google.cloud.firestore import Increment
+    counter_field = SUMMARY_COLLECTIONS[collection][0]
+    return {counter_field: Increment(count), **summary_pointer_fields(collection, doc_id, data)}
+
+def delete_with_summary(db, user_id: str, product_id: str, collection: str, doc_refs: List[Any]) -> None:
+    """
+    Delete documents of one product's related collection and update its summary in one transaction
+    
+    Decrements the counter and, if the pointed-at document is among those
+    deleted, points at the newest remaining one instead. A product that no
+    longer exists is left alone.
+    """
+    from google.cloud.firestore import Increment, transactional
+    counter_field, pointer_field, order_field = SUMMARY_COLLECTIONS[collection]
+    product_ref = get_product_ref(db, user_id, product_id)
+    deleted_ids = {ref.id for ref in doc_refs}
+    
+    @transactional
+    def delete_in_transaction(transaction):
+        # Transactions must do all reads before any writes
+        product_doc = product_ref.get(transaction=transaction)
+        record_firestore_reads("products")
+        updates = {counter_field: Increment(-len(doc_refs))}
+        
+        if product_doc.exists and product_doc.to_dict().get(pointer_field) in deleted_ids:
+            query = (db.collection("users").document(user_id).collection(collection)
+                     .where("product_id", "==", product_id)
+                     .order_by(order_field, direction=DESCENDING)
+                     .limit(len(deleted_ids) + 1))
+            newest = None
+            for doc in query.stream(transaction=transaction):
+                record_firestore_reads(collection)
+                if doc.id not in deleted_ids:
+                    newest = doc
+                    break
+            updates.update(summary_pointer_fields(
+                collection, newest.id if newest else None, newest.to_dict() if newest else None
+            ))
+        
+        for ref in doc_refs:
+            transaction.delete(ref)
+        if product_doc.exists:
+            transaction.update(product_ref, updates)
+    
+    delete_in_transaction(db.transaction())
+
 class ProductService:
     """Service for Product Firestore operations"""
     
     def __init__(self):
-        self.db = firestore.Client()
+        self.db = get_firestore_client()
         self.collection_name = "users"
     
     def _get_user_products_ref(self, user_id: str):
         """Get reference to user's products subcollection"""
         return self.db.collection(self.collection_name).document(user_id).collection("products")
     
+    @traced()
+    @instrument_firestore("products", "create_product")
     async def create_product(self, user_id: str, product_data: Dict[str, Any]) -> Product:
         """Create a new product for user"""
         try:
@@ -84,11 +209,15 @@ class ProductService:
             logger.error(f"Error creating product for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("products", "get_product")
     async def get_product(self, user_id: str, product_id: str) -> Optional[Product]:
         """Get a specific product by ID"""
         try:
             doc_ref = self._get_user_products_ref(user_id).document(product_id)
-            doc = doc_ref.get()
+            doc = await get_document(doc_ref)
+            record_firestore_reads("products")
             
             if not doc.exists:
                 return None
@@ -102,17 +231,21 @@ class ProductService:
             logger.error(f"Error getting product {product_id} for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("products", "list_products")
     async def list_products(self, user_id: str, limit: int = 50) -> List[Product]:
         """List all products for a user"""
         try:
             products_ref = self._get_user_products_ref(user_id)
-            docs = products_ref.order_by("updated_at", direction=firestore.Query.DESCENDING).limit(limit).stream()
+            docs = await stream_documents(products_ref.order_by("updated_at", direction=DESCENDING).limit(limit))
             
             products = []
             for doc in docs:
                 product_data = doc.to_dict()
                 product_data["id"] = doc.id
                 products.append(Product(**product_data))
+            record_firestore_reads("products", max(len(products), 1))
             
             logger.info(f"Retrieved {len(products)} products for user {user_id}")
             return products
@@ -121,12 +254,15 @@ class ProductService:
             logger.error(f"Error listing products for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("products", "update_product")
     async def update_product(self, user_id: str, product_id: str, updates: Dict[str, Any]) -> Optional[Product]:
         """Update a product"""
         try:
             doc_ref = self._get_user_products_ref(user_id).document(product_id)
             
             # Check if product exists
+            record_firestore_reads("products")
             if not doc_ref.get().exists:
                 return None
             
@@ -136,13 +272,16 @@ class ProductService:
             # Update document
             doc_ref.update(updates)
             
-            # Return updated product
+            # Return updated product (not a read that started before the update)
+            self.get_product.forget(user_id, product_id)
             return await self.get_product(user_id, product_id)
             
         except Exception as e:
             logger.error(f"Error updating product {product_id} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("products", "delete_product")
     async def delete_product(self, user_id: str, product_id: str) -> bool:
         """Delete a product and all related data"""
         try:
@@ -159,29 +298,43 @@ class ProductService:
             # Delete visuals
             visuals_ref = user_ref.collection("visuals")
             visual_docs = visuals_ref.where("product_id", "==", product_id).stream()
+            visual_count = 0
             for doc in visual_docs:
                 batch.delete(doc.reference)
+                visual_count += 1
+            record_firestore_reads("visuals", max(visual_count, 1))
             
             # Delete creative outputs
             outputs_ref = user_ref.collection("creativeOutputs")
             output_docs = outputs_ref.where("product_id", "==", product_id).stream()
+            output_count = 0
             for doc in output_docs:
                 batch.delete(doc.reference)
+                output_count += 1
+            record_firestore_reads("creativeOutputs", max(output_count, 1))
             
             # Delete marketing strategies
             strategies_ref = user_ref.collection("marketingStrategies")
             strategy_docs = strategies_ref.where("product_id", "==", product_id).stream()
+            strategy_count = 0
             for doc in strategy_docs:
                 batch.delete(doc.reference)
+                strategy_count += 1
+            record_firestore_reads("marketingStrategies", max(strategy_count, 1))
             
             # Delete campaigns
             campaigns_ref = user_ref.collection("campaigns")
             campaign_docs = campaigns_ref.where("product_id", "==", product_id).stream()
+            campaign_count = 0
             for doc in campaign_docs:
                 batch.delete(doc.reference)
+                campaign_count += 1
+            record_firestore_reads("campaigns", max(campaign_count, 1))
             
             # Commit batch
             batch.commit()
+            for cache_name in (PRODUCT_STRATEGY_CACHE, LATEST_OUTPUT_CACHE):
+                get_cache(cache_name).invalidate((user_id, product_id))
             
             logger.info(f"Deleted product {product_id} and related data for user {user_id}")
             return True
@@ -190,6 +343,9 @@ class ProductService:
             logger.error(f"Error deleting product {product_id} for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("products", "search_products")
     async def search_products(self, user_id: str, search_term: str, limit: int = 20) -> List[Product]:
         """Search products by name or description"""
         try:
@@ -213,3 +369,40 @@ class ProductService:
         except Exception as e:
             logger.error(f"Error searching products for user {user_id}: {str(e)}")
             raise
+    
+    @traced()
+    @instrument_firestore("products", "rebuild_summary")
+    async def rebuild_summary(self, user_id: str, product_id: str) -> Optional[Product]:
+        """
+        Recompute a product's summary fields from its related collections
+        
+        For products created before the summary existed, or to repair drift.
+        Uses count aggregations, so it reads one document per collection.
+        """
+        try:
+            product_ref = get_product_ref(self.db, user_id, product_id)
+            if not (await get_document(product_ref)).exists:
+                return None
+            record_firestore_reads("products")
+            
+            user_ref = self.db.collection(self.collection_name).document(user_id)
+            updates: Dict[str, Any] = {}
+            for collection, (counter_field, _, order_field) in SUMMARY_COLLECTIONS.items():
+                related = user_ref.collection(collection).where("product_id", "==", product_id)
+                count_result = await asyncio.to_thread(lambda: related.count().get())
+                updates[counter_field] = int(count_result[0][0].value)
+                
+                newest = await stream_documents(related.order_by(order_field, direction=DESCENDING).limit(1))
+                record_firestore_reads(collection, 2)
+                updates.update(summary_pointer_fields(
+                    collection, newest[0].id if newest else None, newest[0].to_dict() if newest else None
+                ))
+            
+            await asyncio.to_thread(product_ref.update, updates)
+            
+            self.get_product.forget(user_id, product_id)
+            return await self.get_product(user_id, product_id)
+            
+        except Exception as e:
+            logger.error(f"Error rebuilding summary for product {product_id}: {str(e)}")
+            raise
@@ -4,9 +4,18 @@ Visual Library model for Firestore operations
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from google.cloud import firestore
 import logging
 
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.product import get_product_ref, summary_updates_for_create, commit_with_summary, delete_with_summary
+from utils.firestore import get_firestore_client, get_document, stream_documents, DESCENDING
+from utils.metrics import instrument_firestore, record_firestore_reads
+from utils.tracing import traced
+from utils.singleflight import single_flight
+
 logger = logging.getLogger(__name__)
 
 class VisualLibrary(BaseModel):
@@ -38,14 +47,19 @@ class VisualLibrary(BaseModel):
 class VisualLibraryService:
     """Service for Visual Library Firestore operations"""
     
+    # Firestore limit on writes per batch / transaction
+    max_batch_writes = 500
+    
     def __init__(self):
-        self.db = firestore.Client()
+        self.db = get_firestore_client()
         self.collection_name = "users"
     
     def _get_user_visuals_ref(self, user_id: str):
         """Get reference to user's visuals subcollection"""
         return self.db.collection(self.collection_name).document(user_id).collection("visuals")
     
+    @traced()
+    @instrument_firestore("visuals", "create_visual")
     async def create_visual(self, user_id: str, visual_data: Dict[str, Any]) -> VisualLibrary:
         """Create a new visual entry"""
         try:
@@ -63,9 +77,15 @@ class VisualLibraryService:
             visuals_ref = self._get_user_visuals_ref(user_id)
             doc_ref = visuals_ref.document()
             
-            # Convert to dict and store
+            # Store with the product summary update in one atomic batch
             visual_dict = visual.dict(exclude={"id"})
-            doc_ref.set(visual_dict)
+            batch = self.db.batch()
+            batch.set(doc_ref, visual_dict)
+            batch.update(
+                get_product_ref(self.db, user_id, visual.product_id),
+                summary_updates_for_create("visuals", doc_ref.id, visual_dict)
+            )
+            commit_with_summary(batch, visual.product_id)
             
             # Return visual with ID
             visual.id = doc_ref.id
@@ -77,11 +97,60 @@ class VisualLibraryService:
             logger.error(f"Error creating visual for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("visuals", "create_visuals")
+    async def create_visuals(self, user_id: str, visuals_data: List[Dict[str, Any]]) -> List[VisualLibrary]:
+        """Create many visual entries with batched writes"""
+        try:
+            now = datetime.utcnow()
+            visuals_ref = self._get_user_visuals_ref(user_id)
+            
+            # Validate everything before writing anything
+            visuals = []
+            for visual_data in visuals_data:
+                visual_data.update({
+                    "user_id": user_id,
+                    "created_at": now
+                })
+                visuals.append(VisualLibrary(**visual_data))
+            
+            # Firestore allows at most 500 writes per batch: each batch holds
+            # visuals of one product plus that product's summary update
+            by_product: Dict[str, List[VisualLibrary]] = {}
+            for visual in visuals:
+                by_product.setdefault(visual.product_id, []).append(visual)
+            
+            for product_id, product_visuals in by_product.items():
+                product_ref = get_product_ref(self.db, user_id, product_id)
+                for i in range(0, len(product_visuals), self.max_batch_writes - 1):
+                    chunk = product_visuals[i:i + self.max_batch_writes - 1]
+                    batch = self.db.batch()
+                    for visual in chunk:
+                        doc_ref = visuals_ref.document()
+                        batch.set(doc_ref, visual.dict(exclude={"id"}))
+                        visual.id = doc_ref.id
+                    newest = chunk[-1]
+                    batch.update(product_ref, summary_updates_for_create(
+                        "visuals", newest.id, newest.dict(exclude={"id"}), count=len(chunk)
+                    ))
+                    commit_with_summary(batch, product_id)
+            
+            logger.info(f"Created {len(visuals)} visuals for user {user_id}")
+            return visuals
+            
+        except Exception as e:
+            logger.error(f"Error creating visuals for user {user_id}: {str(e)}")
+            raise
+    
+    @single_flight()
+    @traced()
+    @instrument_firestore("visuals", "get_visual")
     async def get_visual(self, user_id: str, visual_id: str) -> Optional[VisualLibrary]:
         """Get a specific visual by ID"""
         try:
             doc_ref = self._get_user_visuals_ref(user_id).document(visual_id)
-            doc = doc_ref.get()
+            doc = await get_document(doc_ref)
+            record_firestore_reads("visuals")
             
             if not doc.exists:
                 return None
@@ -95,21 +164,25 @@ class VisualLibraryService:
             logger.error(f"Error getting visual {visual_id} for user {user_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("visuals", "list_product_visuals")
     async def list_product_visuals(self, user_id: str, product_id: str, limit: int = 50) -> List[VisualLibrary]:
         """List all visuals for a specific product"""
         try:
             visuals_ref = self._get_user_visuals_ref(user_id)
-            docs = (visuals_ref
-                   .where("product_id", "==", product_id)
-                   .order_by("created_at", direction=firestore.Query.DESCENDING)
-                   .limit(limit)
-                   .stream())
+            query = (visuals_ref
+                    .where("product_id", "==", product_id)
+                    .order_by("created_at", direction=DESCENDING)
+                    .limit(limit))
+            docs = await stream_documents(query)
             
             visuals = []
             for doc in docs:
                 visual_data = doc.to_dict()
                 visual_data["id"] = doc.id
                 visuals.append(VisualLibrary(**visual_data))
+            record_firestore_reads("visuals", max(len(visuals), 1))
             
             logger.info(f"Retrieved {len(visuals)} visuals for product {product_id}")
             return visuals
@@ -118,22 +191,26 @@ class VisualLibraryService:
             logger.error(f"Error listing visuals for product {product_id}: {str(e)}")
             raise
     
+    @single_flight()
+    @traced()
+    @instrument_firestore("visuals", "list_user_visuals")
     async def list_user_visuals(self, user_id: str, media_type: Optional[str] = None, limit: int = 100) -> List[VisualLibrary]:
         """List all visuals for a user, optionally filtered by media type"""
         try:
             visuals_ref = self._get_user_visuals_ref(user_id)
-            query = visuals_ref.order_by("created_at", direction=firestore.Query.DESCENDING)
+            query = visuals_ref.order_by("created_at", direction=DESCENDING)
             
             if media_type:
                 query = query.where("media_type", "==", media_type)
             
-            docs = query.limit(limit).stream()
+            docs = await stream_documents(query.limit(limit))
             
             visuals = []
             for doc in docs:
                 visual_data = doc.to_dict()
                 visual_data["id"] = doc.id
                 visuals.append(VisualLibrary(**visual_data))
+            record_firestore_reads("visuals", max(len(visuals), 1))
             
             logger.info(f"Retrieved {len(visuals)} visuals for user {user_id}")
             return visuals
@@ -142,36 +219,44 @@ class VisualLibraryService:
             logger.error(f"Error listing visuals for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("visuals", "update_visual")
     async def update_visual(self, user_id: str, visual_id: str, updates: Dict[str, Any]) -> Optional[VisualLibrary]:
         """Update a visual entry"""
         try:
             doc_ref = self._get_user_visuals_ref(user_id).document(visual_id)
             
             # Check if visual exists
+            record_firestore_reads("visuals")
             if not doc_ref.get().exists:
                 return None
             
             # Update document
             doc_ref.update(updates)
             
-            # Return updated visual
+            # Return updated visual (not a read that started before the update)
+            self.get_visual.forget(user_id, visual_id)
             return await self.get_visual(user_id, visual_id)
             
         except Exception as e:
             logger.error(f"Error updating visual {visual_id} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("visuals", "delete_visual")
     async def delete_visual(self, user_id: str, visual_id: str) -> bool:
         """Delete a visual entry"""
         try:
             doc_ref = self._get_user_visuals_ref(user_id).document(visual_id)
             
             # Check if visual exists
-            if not doc_ref.get().exists:
+            doc = doc_ref.get()
+            record_firestore_reads("visuals")
+            if not doc.exists:
                 return False
             
-            # Delete document
-            doc_ref.delete()
+            # Delete document and update the product summary
+            delete_with_summary(self.db, user_id, doc.to_dict()["product_id"], "visuals", [doc_ref])
             
             logger.info(f"Deleted visual {visual_id} for user {user_id}")
             return True
@@ -180,6 +265,52 @@ class VisualLibraryService:
             logger.error(f"Error deleting visual {visual_id} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    @instrument_firestore("visuals", "delete_visuals")
+    async def delete_visuals(self, user_id: str, visual_ids: List[str]) -> Dict[str, Optional[VisualLibrary]]:
+        """
+        Delete many visual entries with one batched read and batched writes
+        
+        Returns:
+            dict: visual_id -> deleted VisualLibrary, or None if it did not exist
+        """
+        try:
+            visuals_ref = self._get_user_visuals_ref(user_id)
+            unique_ids = list(dict.fromkeys(visual_ids))
+            results: Dict[str, Optional[VisualLibrary]] = {visual_id: None for visual_id in unique_ids}
+            
+            # Fetch all documents in a single BatchGetDocuments round trip
+            refs = [visuals_ref.document(visual_id) for visual_id in unique_ids]
+            existing = []
+            for doc in self.db.get_all(refs):
+                if not doc.exists:
+                    continue
+                visual_data = doc.to_dict()
+                visual_data["id"] = doc.id
+                results[doc.id] = VisualLibrary(**visual_data)
+                existing.append(doc.reference)
+            record_firestore_reads("visuals", len(refs))
+            
+            # One transaction per product (and per 499 deletes, Firestore's
+            # 500-write limit) so each product summary stays consistent
+            by_product: Dict[str, List[Any]] = {}
+            for ref in existing:
+                by_product.setdefault(results[ref.id].product_id, []).append(ref)
+            
+            for product_id, refs in by_product.items():
+                for i in range(0, len(refs), self.max_batch_writes - 1):
+                    delete_with_summary(self.db, user_id, product_id, "visuals", refs[i:i + self.max_batch_writes - 1])
+            
+            logger.info(f"Deleted {len(existing)} of {len(unique_ids)} visuals for user {user_id}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error bulk deleting visuals for user {user_id}: {str(e)}")
+            raise
+    
+    @single_flight()
+    @traced()
+    @instrument_firestore("visuals", "get_visuals_by_creative_output")
     async def get_visuals_by_creative_output(self, user_id: str, creative_output_id: str, ad_copy_index: Optional[int] = None) -> List[VisualLibrary]:
         """Get visuals associated with a specific creative output and optionally ad copy index"""
         try:
@@ -189,13 +320,14 @@ class VisualLibraryService:
             if ad_copy_index is not None:
                 query = query.where("associated_ad_copy_index", "==", ad_copy_index)
             
-            docs = query.order_by("created_at", direction=firestore.Query.DESCENDING).stream()
+            docs = await stream_documents(query.order_by("created_at", direction=DESCENDING))
             
             visuals = []
             for doc in docs:
                 visual_data = doc.to_dict()
                 visual_data["id"] = doc.id
                 visuals.append(VisualLibrary(**visual_data))
+            record_firestore_reads("visuals", max(len(visuals), 1))
             
             return visuals
             
@@ -2,15 +2,17 @@
 AI content generation API routes
 """
 from typing import Optional
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Response
 from pydantic import BaseModel, Field
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.ai_service import AIService
-from middleware.auth import get_current_user_id
+from services.providers import get_ai_service
+from models.product import ProductNotFoundError
+from middleware.rate_limit import ai_rate_limited_user_id
+from middleware.idempotency import idempotency_key, run_idempotent
 
 import logging
 
@@ -18,16 +20,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
 
-# Initialize AI service
-# Lazy-init to avoid import-time failures
-ai_service: AIService | None = None
-
-def get_ai_service() -> AIService:
-    global ai_service
-    if ai_service is None:
-        ai_service = AIService()
-    return ai_service
-
 # Request/Response models
 class AutofillRequest(BaseModel):
     product_name: str = Field(..., min_length=1, max_length=200)
@@ -55,7 +47,7 @@ class EnhanceProductRequest(BaseModel):
 @router.post("/autofill-product", response_model=AutofillResponse)
 async def autofill_product_details(
     request: AutofillRequest,
-    user_id: str = Depends(get_current_user_id)
+    user_id: str = Depends(ai_rate_limited_user_id)
 ):
     """
     Generate product description, problem it solves, and target customers
@@ -87,17 +79,23 @@ async def autofill_product_details(
 @router.post("/generate-marketing-strategy/{product_id}")
 async def generate_marketing_strategy(
     product_id: str,
-    user_id: str = Depends(get_current_user_id)
+    response: Response,
+    force: bool = False,
+    user_id: str = Depends(ai_rate_limited_user_id),
+    key: Optional[str] = Depends(idempotency_key)
 ):
     """
     Generate a comprehensive marketing strategy for a product including
-    customer avatars and creative brief
+    customer avatars and creative brief. Returns the latest strategy if the
+    product is unchanged since it was generated, unless force=true.
+    Retries with the same Idempotency-Key replay the first response.
     """
-    try:
+    async def generate():
         service = get_ai_service()
         strategy = await service.generate_marketing_strategy(
             user_id=user_id,
-            product_id=product_id
+            product_id=product_id,
+            force=force
         )
         
         return {
@@ -116,9 +114,24 @@ async def generate_marketing_strategy(
                 "visual_style_art_direction": strategy.creative_brief.visual_style_art_direction
             } if strategy.creative_brief else None,
             "openai_response_id": strategy.openai_response_id,
+            "ai_model": strategy.ai_model,
             "created_at": strategy.created_at.isoformat()
         }
+    
+    try:
+        return await run_idempotent(
+            response, user_id, "generate_marketing_strategy", key,
+            {"product_id": product_id, "force": force},
+            generate
+        )
         
+    except HTTPException:
+        raise
+    except ProductNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
     except Exception as e:
         logger.error(f"Error generating marketing strategy: {str(e)}")
         raise HTTPException(
@@ -126,15 +139,44 @@ async def generate_marketing_strategy(
             detail=f"Failed to generate marketing strategy: {str(e)}"
         )
 
+def _creative_output_response(creative_output) -> dict:
+    """Response body for a creative output"""
+    return {
+        "id": creative_output.id,
+        "product_id": creative_output.product_id,
+        "creative_concept_title": creative_output.creative_concept_title,
+        "creative_concept_description": creative_output.creative_concept_description,
+        "target_audience_summary": creative_output.target_audience_summary,
+        "why_this_works": creative_output.why_this_works,
+        "ad_copies": [
+            {
+                "variation_name": copy.variation_name,
+                "headline": copy.headline,
+                "body_text": copy.body_text,
+                "call_to_action": copy.call_to_action,
+                "platform_optimized": copy.platform_optimized,
+                "offer_value_proposition": copy.offer_value_proposition
+            } for copy in creative_output.ad_copies
+        ],
+        "generation_timestamp": creative_output.generation_timestamp.isoformat(),
+        "tone": creative_output.tone,
+        "ai_model": creative_output.ai_model
+    }
+
 @router.post("/generate-ad-copies")
 async def generate_ad_copies(
     request: GenerateAdCopiesRequest,
-    user_id: str = Depends(get_current_user_id)
+    response: Response,
+    user_id: str = Depends(ai_rate_limited_user_id),
+    key: Optional[str] = Depends(idempotency_key)
 ):
     """
     Generate ad copies and creative concepts for a product
+    
+    Retries with the same Idempotency-Key replay the first response instead
+    of creating another creative output.
     """
-    try:
+    async def generate():
         service = get_ai_service()
         creative_output = await service.generate_ad_copies(
             user_id=user_id,
@@ -143,27 +185,20 @@ async def generate_ad_copies(
             num_variations=request.num_variations
         )
         
-        return {
-            "id": creative_output.id,
-            "product_id": creative_output.product_id,
-            "creative_concept_title": creative_output.creative_concept_title,
-            "creative_concept_description": creative_output.creative_concept_description,
-            "target_audience_summary": creative_output.target_audience_summary,
-            "why_this_works": creative_output.why_this_works,
-            "ad_copies": [
-                {
-                    "variation_name": copy.variation_name,
-                    "headline": copy.headline,
-                    "body_text": copy.body_text,
-                    "call_to_action": copy.call_to_action,
-                    "platform_optimized": copy.platform_optimized,
-                    "offer_value_proposition": copy.offer_value_proposition
-                } for copy in creative_output.ad_copies
-            ],
-            "generation_timestamp": creative_output.generation_timestamp.isoformat(),
-            "tone": creative_output.tone
-        }
+        return _creative_output_response(creative_output)
+    
+    try:
+        return await run_idempotent(
+            response, user_id, "generate_ad_copies", key, request.dict(), generate
+        )
         
+    except HTTPException:
+        raise
+    except ProductNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
     except Exception as e:
         logger.error(f"Error generating ad copies: {str(e)}")
         raise HTTPException(
@@ -171,20 +206,61 @@ async def generate_ad_copies(
             detail=f"Failed to generate ad copies: {str(e)}"
         )
 
+@router.post("/creative-outputs/{output_id}/ad-copies/{index}/regenerate")
+async def regenerate_ad_copy(
+    output_id: str,
+    index: int,
+    user_id: str = Depends(ai_rate_limited_user_id)
+):
+    """
+    Regenerate one ad copy variation of an existing creative output in place
+    """
+    try:
+        service = get_ai_service()
+        creative_output = await service.regenerate_ad_copy(
+            user_id=user_id,
+            output_id=output_id,
+            index=index
+        )
+        if not creative_output:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Creative output not found"
+            )
+        
+        return _creative_output_response(creative_output)
+        
+    except HTTPException:
+        raise
+    except IndexError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ad copy not found"
+        )
+    except Exception as e:
+        logger.error(f"Error regenerating ad copy: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to regenerate ad copy: {str(e)}"
+        )
+
 @router.post("/enhance-product/{product_id}")
 async def enhance_product_analysis(
     product_id: str,
-    user_id: str = Depends(get_current_user_id)
+    force: bool = False,
+    user_id: str = Depends(ai_rate_limited_user_id)
 ):
     """
     Generate enhanced AI analysis for a product including key selling points
-    and detailed target audience insights
+    and detailed target audience insights. Returns the existing analysis if
+    the product is unchanged since it was generated, unless force=true.
     """
     try:
         service = get_ai_service()
         product = await service.enhance_product_analysis(
             user_id=user_id,
-            product_id=product_id
+            product_id=product_id,
+            force=force
         )
         
         return {
@@ -192,9 +268,15 @@ async def enhance_product_analysis(
             "ai_analysis_summary": product.ai_analysis_summary,
             "ai_target_audience_profile": product.ai_target_audience_profile,
             "ai_key_selling_points": product.ai_key_selling_points,
+            "ai_analysis_model": product.ai_analysis_model,
             "updated_at": product.updated_at.isoformat()
         }
         
+    except ProductNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
     except Exception as e:
         logger.error(f"Error enhancing product analysis: {str(e)}")
         raise HTTPException(
@@ -218,7 +300,9 @@ async def ai_health_check():
             "status": "healthy",
             "message": "AI service is ready",
             "ai_enabled": True,
-            "model": service.model
+            "model": service.model,
+            "routes": service.router.describe(),
+            "scheduler": service.scheduler.describe()
         }
         
     except Exception as e:
@@ -2,19 +2,24 @@
 Product API routes
 """
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Response
 from pydantic import BaseModel, Field
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.product import Product, ProductService
-from models.visual_library import VisualLibrary, VisualLibraryService
-from models.creative_output import CreativeOutput, CreativeOutputService
-from models.marketing_strategy import MarketingStrategy, MarketingStrategyService
+from models.product import Product, ProductNotFoundError
+from models.visual_library import VisualLibrary
+from models.creative_output import CreativeOutput
+from models.marketing_strategy import MarketingStrategy
 from middleware.auth import get_current_user_id
-from services.storage_service import StorageService
+from middleware.idempotency import idempotency_key, run_idempotent
+from services.providers import (
+    get_product_service, get_visual_service, get_creative_service,
+    get_strategy_service, get_storage_service
+)
+from services.pregeneration import get_pregenerator
 
 import logging
 
@@ -22,13 +27,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
-# Initialize services
-product_service = ProductService()
-visual_service = VisualLibraryService()
-creative_service = CreativeOutputService()
-strategy_service = MarketingStrategyService()
-storage_service = StorageService()
-
 # Request/Response models
 class ProductCreateRequest(BaseModel):
     product_name: str = Field(..., min_length=1, max_length=200)
@@ -81,6 +79,14 @@ class ProductResponse(BaseModel):
     ai_analysis_summary: Optional[str] = None
     ai_target_audience_profile: Optional[str] = None
     ai_key_selling_points: Optional[List[str]] = None
+    visual_count: int = 0
+    creative_output_count: int = 0
+    strategy_count: int = 0
+    latest_strategy_id: Optional[str] = None
+    latest_output_id: Optional[str] = None
+    latest_output_title: Optional[str] = None
+    thumbnail_visual_id: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     created_at: str
     updated_at: str
 
@@ -106,6 +112,39 @@ class AutofillResponse(BaseModel):
     problem_it_solves: str
     target_customers: str
 
+def _product_to_response(product: Product) -> ProductResponse:
+    """Convert a stored product to its API response"""
+    return ProductResponse(
+        id=product.id,
+        user_id=product.user_id,
+        product_name=product.product_name,
+        what_is_it=product.what_is_it,
+        price=product.price,
+        currency=product.currency,
+        target_country=product.target_country,
+        target_country_code=product.target_country_code,
+        main_goal=product.main_goal,
+        product_image_url=product.product_image_url,
+        product_link=product.product_link,
+        product_description=product.product_description,
+        problem_it_solves=product.problem_it_solves,
+        target_customers=product.target_customers,
+        setup_completed=product.setup_completed,
+        ai_analysis_summary=product.ai_analysis_summary,
+        ai_target_audience_profile=product.ai_target_audience_profile,
+        ai_key_selling_points=product.ai_key_selling_points,
+        visual_count=product.visual_count,
+        creative_output_count=product.creative_output_count,
+        strategy_count=product.strategy_count,
+        latest_strategy_id=product.latest_strategy_id,
+        latest_output_id=product.latest_output_id,
+        latest_output_title=product.latest_output_title,
+        thumbnail_visual_id=product.thumbnail_visual_id,
+        thumbnail_url=product.thumbnail_url,
+        created_at=product.created_at.isoformat(),
+        updated_at=product.updated_at.isoformat()
+    )
+
 # Routes
 @router.post("", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
@@ -115,33 +154,20 @@ async def create_product(
     """Create a new product"""
     try:
         logger.info(f"Creating product for user {user_id} with data: {product_data.dict()}")
-        product = await product_service.create_product(
+        product = await get_product_service().create_product(
             user_id=user_id,
             product_data=product_data.dict()
         )
         
-        return ProductResponse(
-            id=product.id,
-            user_id=product.user_id,
-            product_name=product.product_name,
-            what_is_it=product.what_is_it,
-            price=product.price,
-            currency=product.currency,
-            target_country=product.target_country,
-            target_country_code=product.target_country_code,
-            main_goal=product.main_goal,
-            product_image_url=product.product_image_url,
-            product_link=product.product_link,
-            product_description=product.product_description,
-            problem_it_solves=product.problem_it_solves,
-            target_customers=product.target_customers,
-            setup_completed=product.setup_completed,
-            ai_analysis_summary=product.ai_analysis_summary,
-            ai_target_audience_profile=product.ai_target_audience_profile,
-            ai_key_selling_points=product.ai_key_selling_points,
-            created_at=product.created_at.isoformat(),
-            updated_at=product.updated_at.isoformat()
-        )
+        # Start analysis and strategy in the background (PREGENERATION_ENABLED)
+        pregenerator = get_pregenerator()
+        if pregenerator is not None:
+            try:
+                pregenerator.schedule(user_id, product)
+            except Exception as e:
+                logger.warning(f"Failed to schedule pre-generation for product {product.id}: {str(e)}")
+        
+        return _product_to_response(product)
         
     except Exception as e:
         logger.error(f"Error creating product: {str(e)}")
@@ -162,34 +188,9 @@ async def list_products(
 ):
     """List all products for the authenticated user"""
     try:
-        products = await product_service.list_products(user_id=user_id, limit=limit)
-        
-        product_responses = []
-        for product in products:
-            product_responses.append(ProductResponse(
-                id=product.id,
-                user_id=product.user_id,
-                product_name=product.product_name,
-                what_is_it=product.what_is_it,
-                price=product.price,
-                currency=product.currency,
-                target_country=product.target_country,
-                target_country_code=product.target_country_code,
-                main_goal=product.main_goal,
-                product_image_url=product.product_image_url,
-                product_link=product.product_link,
-                product_description=product.product_description,
-                problem_it_solves=product.problem_it_solves,
-                target_customers=product.target_customers,
-                setup_completed=product.setup_completed,
-                ai_analysis_summary=product.ai_analysis_summary,
-                ai_target_audience_profile=product.ai_target_audience_profile,
-                ai_key_selling_points=product.ai_key_selling_points,
-                created_at=product.created_at.isoformat(),
-                updated_at=product.updated_at.isoformat()
-            ))
-        
-        return ProductListResponse(products=product_responses)
+        products = await get_product_service().list_products(user_id=user_id, limit=limit)
+        
+        return ProductListResponse(products=[_product_to_response(product) for product in products])
         
     except Exception as e:
         logger.error(f"Error listing products: {str(e)}")
@@ -205,7 +206,7 @@ async def get_product(
 ):
     """Get a specific product by ID"""
     try:
-        product = await product_service.get_product(user_id=user_id, product_id=product_id)
+        product = await get_product_service().get_product(user_id=user_id, product_id=product_id)
         
         if not product:
             raise HTTPException(
@@ -213,28 +214,7 @@ async def get_product(
                 detail="Product not found"
             )
         
-        return ProductResponse(
-            id=product.id,
-            user_id=product.user_id,
-            product_name=product.product_name,
-            what_is_it=product.what_is_it,
-            price=product.price,
-            currency=product.currency,
-            target_country=product.target_country,
-            target_country_code=product.target_country_code,
-            main_goal=product.main_goal,
-            product_image_url=product.product_image_url,
-            product_link=product.product_link,
-            product_description=product.product_description,
-            problem_it_solves=product.problem_it_solves,
-            target_customers=product.target_customers,
-            setup_completed=product.setup_completed,
-            ai_analysis_summary=product.ai_analysis_summary,
-            ai_target_audience_profile=product.ai_target_audience_profile,
-            ai_key_selling_points=product.ai_key_selling_points,
-            created_at=product.created_at.isoformat(),
-            updated_at=product.updated_at.isoformat()
-        )
+        return _product_to_response(product)
         
     except HTTPException:
         raise
@@ -262,7 +242,7 @@ async def update_product(
                 detail="No valid update data provided"
             )
         
-        product = await product_service.update_product(
+        product = await get_product_service().update_product(
             user_id=user_id,
             product_id=product_id,
             updates=update_data
@@ -274,28 +254,7 @@ async def update_product(
                 detail="Product not found"
             )
         
-        return ProductResponse(
-            id=product.id,
-            user_id=product.user_id,
-            product_name=product.product_name,
-            what_is_it=product.what_is_it,
-            price=product.price,
-            currency=product.currency,
-            target_country=product.target_country,
-            target_country_code=product.target_country_code,
-            main_goal=product.main_goal,
-            product_image_url=product.product_image_url,
-            product_link=product.product_link,
-            product_description=product.product_description,
-            problem_it_solves=product.problem_it_solves,
-            target_customers=product.target_customers,
-            setup_completed=product.setup_completed,
-            ai_analysis_summary=product.ai_analysis_summary,
-            ai_target_audience_profile=product.ai_target_audience_profile,
-            ai_key_selling_points=product.ai_key_selling_points,
-            created_at=product.created_at.isoformat(),
-            updated_at=product.updated_at.isoformat()
-        )
+        return _product_to_response(product)
         
     except HTTPException:
         raise
@@ -313,7 +272,11 @@ async def delete_product(
 ):
     """Delete a product and all related data"""
     try:
-        success = await product_service.delete_product(user_id=user_id, product_id=product_id)
+        pregenerator = get_pregenerator()
+        if pregenerator is not None:
+            pregenerator.cancel(user_id, product_id)
+        
+        success = await get_product_service().delete_product(user_id=user_id, product_id=product_id)
         
         if not success:
             raise HTTPException(
@@ -333,14 +296,16 @@ async def delete_product(
 @router.post("/{product_id}/visuals", response_model=VisualUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_visual(
     product_id: str,
+    response: Response,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
-    user_id: str = Depends(get_current_user_id)
+    user_id: str = Depends(get_current_user_id),
+    key: Optional[str] = Depends(idempotency_key)
 ):
-    """Upload a visual (image or video) for a product"""
-    try:
+    """Upload a visual (image or video) for a product; retries with the same Idempotency-Key don't upload again"""
+    async def upload():
         # Verify product exists and belongs to user
-        product = await product_service.get_product(user_id=user_id, product_id=product_id)
+        product = await get_product_service().get_product(user_id=user_id, product_id=product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -361,7 +326,7 @@ async def upload_visual(
             )
         
         # Upload file to Cloud Storage
-        file_info = await storage_service.upload_file(
+        file_info = await get_storage_service().upload_file(
             file=file,
             user_id=user_id,
             file_type=file_type,
@@ -379,7 +344,7 @@ async def upload_visual(
             "source_type": "uploaded"
         }
         
-        visual = await visual_service.create_visual(user_id=user_id, visual_data=visual_data)
+        visual = await get_visual_service().create_visual(user_id=user_id, visual_data=visual_data)
         
         return VisualUploadResponse(
             id=visual.id,
@@ -389,9 +354,27 @@ async def upload_visual(
             media_type=visual.media_type,
             source_type=visual.source_type
         )
+    
+    try:
+        return await run_idempotent(
+            response, user_id, "upload_visual", key,
+            {
+                "product_id": product_id,
+                "filename": file.filename,
+                "content_type": file.content_type,
+                "size": file.size,
+                "title": title
+            },
+            upload
+        )
         
     except HTTPException:
         raise
+    except ProductNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
     except Exception as e:
         logger.error(f"Error uploading visual for product {product_id}: {str(e)}")
         raise HTTPException(
@@ -407,14 +390,14 @@ async def list_product_visuals(
     """List all visuals for a product"""
     try:
         # Verify product exists and belongs to user
-        product = await product_service.get_product(user_id=user_id, product_id=product_id)
+        product = await get_product_service().get_product(user_id=user_id, product_id=product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
         
-        visuals = await visual_service.list_product_visuals(user_id=user_id, product_id=product_id)
+        visuals = await get_visual_service().list_product_visuals(user_id=user_id, product_id=product_id)
         
         visual_responses = []
         for visual in visuals:
@@ -451,14 +434,14 @@ async def list_product_creative_outputs(
     """List all creative outputs for a product"""
     try:
         # Verify product exists and belongs to user
-        product = await product_service.get_product(user_id=user_id, product_id=product_id)
+        product = await get_product_service().get_product(user_id=user_id, product_id=product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
         
-        outputs = await creative_service.list_product_outputs(user_id=user_id, product_id=product_id)
+        outputs = await get_creative_service().list_product_outputs(user_id=user_id, product_id=product_id)
         
         output_responses = []
         for output in outputs:
@@ -471,7 +454,8 @@ async def list_product_creative_outputs(
                 "why_this_works": output.why_this_works,
                 "ad_copies": [copy.dict() for copy in output.ad_copies],
                 "generation_timestamp": output.generation_timestamp.isoformat(),
-                "tone": output.tone
+                "tone": output.tone,
+                "ai_model": output.ai_model
             })
         
         return {"creative_outputs": output_responses}
@@ -493,14 +477,14 @@ async def get_product_marketing_strategy(
     """Get the marketing strategy for a product"""
     try:
         # Verify product exists and belongs to user
-        product = await product_service.get_product(user_id=user_id, product_id=product_id)
+        product = await get_product_service().get_product(user_id=user_id, product_id=product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
         
-        strategy = await strategy_service.get_product_strategy(user_id=user_id, product_id=product_id)
+        strategy = await get_strategy_service().get_product_strategy(user_id=user_id, product_id=product_id)
         
         if not strategy:
             raise HTTPException(
@@ -1,16 +1,21 @@
 """
 File upload API routes
 """
-from typing import Optional
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
-from pydantic import BaseModel
+from typing import Optional, Tuple, List, Dict, AsyncIterator
+from datetime import datetime
+import io
+import json
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from middleware.auth import get_current_user_id
-from services.storage_service import StorageService
+from services.providers import get_product_service, get_visual_service, get_storage_service
 
 import logging
 
@@ -18,8 +23,7 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["upload"])
 
-# Initialize services
-storage_service = StorageService()
+MAX_BATCH_UPLOAD_FILES = 50
 
 # Response models
 class FileUploadResponse(BaseModel):
@@ -33,6 +37,111 @@ class FileUploadResponse(BaseModel):
 class SignedUrlResponse(BaseModel):
     signed_url: str
 
+class BulkDeleteFilesRequest(BaseModel):
+    file_paths: List[str] = Field(..., min_length=1, max_length=1000)
+
+class BulkDeleteFilesResponse(BaseModel):
+    deleted: int
+    results: Dict[str, str]
+
+# Helpers
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def _parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=" header into an inclusive (start, end) pair
+    
+    Returns None for headers we serve as a full response (multiple ranges,
+    other units, malformed values). Raises 416 for unsatisfiable ranges.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+        elif end_str:
+            # Suffix range: last N bytes
+            suffix_length = int(end_str)
+            if suffix_length == 0:
+                start = file_size
+            else:
+                start = max(file_size - suffix_length, 0)
+            end = file_size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    
+    if start > end and start < file_size:
+        return None
+    
+    if start >= file_size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    
+    return start, min(end, file_size - 1)
+
+def _validate_upload_options(file_type: str, bucket_type: str) -> None:
+    """Validate the file_type / bucket_type form fields shared by the upload routes"""
+    valid_file_types = ["image", "video", "document"]
+    if file_type not in valid_file_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file_type. Must be one of: {', '.join(valid_file_types)}"
+        )
+    
+    valid_bucket_types = ["assets", "generated", "templates", "reports"]
+    if bucket_type not in valid_bucket_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid bucket_type. Must be one of: {', '.join(valid_bucket_types)}"
+        )
+
+def _detach_upload(upload: UploadFile) -> UploadFile:
+    """
+    Take ownership of an UploadFile's spooled file
+    
+    FastAPI closes form files as soon as the endpoint returns, which is before a
+    StreamingResponse body runs. The returned UploadFile keeps the original file
+    open; the caller must close it.
+    """
+    detached = UploadFile(
+        file=upload.file,
+        size=upload.size,
+        filename=upload.filename,
+        headers=upload.headers
+    )
+    upload.file = io.BytesIO()
+    return detached
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if header_value.strip() == "*":
+        return True
+    candidates = [value.strip().removeprefix("W/") for value in header_value.split(",")]
+    return etag in candidates
+
+def _not_modified_since(header_value: str, last_modified: datetime) -> bool:
+    """Whether the object is unchanged since an If-Modified-Since date"""
+    try:
+        since = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
 # Routes
 @router.post("/upload", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_file(
@@ -51,24 +160,10 @@ async def upload_file(
     - **bucket_type**: Type of bucket (assets, generated, templates, reports)
     """
     try:
-        # Validate file_type
-        valid_file_types = ["image", "video", "document"]
-        if file_type not in valid_file_types:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid file_type. Must be one of: {', '.join(valid_file_types)}"
-            )
-        
-        # Validate bucket_type
-        valid_bucket_types = ["assets", "generated", "templates", "reports"]
-        if bucket_type not in valid_bucket_types:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid bucket_type. Must be one of: {', '.join(valid_bucket_types)}"
-            )
+        _validate_upload_options(file_type, bucket_type)
         
         # Upload file
-        file_info = await storage_service.upload_file(
+        file_info = await get_storage_service().upload_file(
             file=file,
             user_id=user_id,
             file_type=file_type,
@@ -95,6 +190,118 @@ async def upload_file(
             detail="Failed to upload file"
         )
 
+@router.post("/upload/batch", status_code=status.HTTP_201_CREATED)
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    product_id: Optional[str] = Form(None),
+    file_type: str = Form("image", description="Type of file: image, video, document"),
+    bucket_type: str = Form("assets", description="Bucket type: assets, generated, templates, reports"),
+    create_visuals: bool = Form(True, description="Create visual library entries (requires product_id)"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Upload many files in one multipart request
+    
+    - **files**: The files to upload (max: 50)
+    - **product_id**: Optional product ID for organizing files
+    - **file_type**: Type of file (image, video, document)
+    - **bucket_type**: Type of bucket (assets, generated, templates, reports)
+    - **create_visuals**: Add image/video uploads to the product's visual library
+    
+    Files are uploaded concurrently. The response is newline-delimited JSON:
+    a `started` event, one `file` event per file as it finishes, a `visuals`
+    event when library entries were created, then a `complete` summary.
+    """
+    _validate_upload_options(file_type, bucket_type)
+    
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_UPLOAD_FILES} files can be uploaded per request"
+        )
+    
+    add_to_library = bool(product_id) and create_visuals and file_type in ("image", "video")
+    if product_id:
+        # Verify product exists and belongs to user
+        product = await get_product_service().get_product(user_id=user_id, product_id=product_id)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+    
+    uploads = [_detach_upload(file) for file in files]
+    
+    async def upload_events() -> AsyncIterator[str]:
+        try:
+            yield json.dumps({"event": "started", "total": len(uploads)}) + "\n"
+            
+            uploaded = {}
+            failed = 0
+            async for index, file_info, error in get_storage_service().upload_files(
+                files=uploads,
+                user_id=user_id,
+                file_type=file_type,
+                product_id=product_id,
+                bucket_type=bucket_type
+            ):
+                event = {
+                    "event": "file",
+                    "index": index,
+                    "file_name": uploads[index].filename,
+                    "status": "uploaded" if file_info else "error"
+                }
+                if file_info:
+                    uploaded[index] = file_info
+                    event.update({
+                        "file_url": file_info["public_url"],
+                        "file_path": file_info["file_path"],
+                        "file_size": file_info["file_size"],
+                        "content_type": file_info["content_type"],
+                        "uploaded_at": file_info["uploaded_at"]
+                    })
+                else:
+                    failed += 1
+                    event["error"] = error
+                event["completed"] = len(uploaded) + failed
+                yield json.dumps(event) + "\n"
+            
+            # Create all visual library entries in one batched write
+            if add_to_library and uploaded:
+                indexes = sorted(uploaded)
+                try:
+                    visuals = await get_visual_service().create_visuals(
+                        user_id=user_id,
+                        visuals_data=[{
+                            "product_id": product_id,
+                            "title": uploads[index].filename or "Uploaded visual",
+                            "asset_url": uploaded[index]["public_url"],
+                            "media_type": file_type,
+                            "source_type": "uploaded"
+                        } for index in indexes]
+                    )
+                    yield json.dumps({
+                        "event": "visuals",
+                        "visuals": [
+                            {"index": index, "visual_id": visual.id}
+                            for index, visual in zip(indexes, visuals)
+                        ]
+                    }) + "\n"
+                except Exception as e:
+                    logger.error(f"Error creating visuals for batch upload: {str(e)}")
+                    yield json.dumps({"event": "visuals", "error": "Failed to create visual entries"}) + "\n"
+            
+            yield json.dumps({"event": "complete", "uploaded": len(uploaded), "failed": failed}) + "\n"
+        finally:
+            for upload in uploads:
+                await upload.close()
+    
+    return StreamingResponse(
+        upload_events(),
+        status_code=status.HTTP_201_CREATED,
+        media_type="application/x-ndjson"
+    )
+
 @router.post("/files/signed-url", response_model=SignedUrlResponse)
 async def generate_signed_url(
     file_path: str,
@@ -114,7 +321,7 @@ async def generate_signed_url(
                 detail="Expiration hours must be between 1 and 168 (1 week)"
             )
         
-        signed_url = await storage_service.generate_signed_url(
+        signed_url = await get_storage_service().generate_signed_url(
             file_path=file_path,
             user_id=user_id,
             expiration_hours=expiration_hours
@@ -131,6 +338,81 @@ async def generate_signed_url(
             detail="Failed to generate signed URL"
         )
 
+@router.get("/files/content")
+async def get_file_content(
+    request: Request,
+    file_path: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Stream a stored file through the API
+    
+    - **file_path**: Path to the file in Cloud Storage, or its gs:// URL
+    
+    Supports single byte ranges (`Range: bytes=start-end`) for media seeking and
+    conditional requests via `If-None-Match` / `If-Modified-Since`.
+    """
+    try:
+        storage_service = get_storage_service()
+        blob = await storage_service.get_file_for_download(file_ref=file_path, user_id=user_id)
+        
+        file_size = blob.size or 0
+        etag = f'"{blob.etag}"' if blob.etag else None
+        
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Cache-Control": (IMMUTABLE_CACHE_CONTROL if storage_service.is_immutable_path(blob.name)
+                              else REVALIDATE_CACHE_CONTROL)
+        }
+        if etag:
+            headers["ETag"] = etag
+        if blob.updated:
+            headers["Last-Modified"] = format_datetime(blob.updated, usegmt=True)
+        
+        # Conditional GET: If-None-Match takes precedence over If-Modified-Since
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            if etag and _etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        elif if_modified_since and blob.updated and _not_modified_since(if_modified_since, blob.updated):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        # Range request (ignored when If-Range no longer matches the current object)
+        byte_range = None
+        range_header = request.headers.get("range")
+        if range_header and file_size > 0:
+            if_range = request.headers.get("if-range")
+            # If-Range needs a strong match: a weak (e.g. compressed) ETag names other bytes
+            if not if_range or if_range.strip() in (etag, headers.get("Last-Modified")):
+                byte_range = _parse_range_header(range_header, file_size)
+        
+        if byte_range:
+            start, end = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        else:
+            start, end = 0, file_size - 1
+            status_code = status.HTTP_200_OK
+        headers["Content-Length"] = str(end - start + 1 if file_size else 0)
+        
+        # Sync generator: Starlette iterates it in the threadpool, one chunk in memory at a time
+        return StreamingResponse(
+            storage_service.iter_file_chunks(blob, start, end),
+            status_code=status_code,
+            media_type=blob.content_type or "application/octet-stream",
+            headers=headers
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming file: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to stream file"
+        )
+
 @router.delete("/files")
 async def delete_file(
     file_path: str,
@@ -142,7 +424,7 @@ async def delete_file(
     - **file_path**: Path to the file in Cloud Storage
     """
     try:
-        success = await storage_service.delete_file(
+        success = await get_storage_service().delete_file(
             file_path=file_path,
             user_id=user_id
         )
@@ -164,19 +446,59 @@ async def delete_file(
             detail="Failed to delete file"
         )
 
+@router.post("/files/bulk-delete", response_model=BulkDeleteFilesResponse)
+async def bulk_delete_files(
+    request: BulkDeleteFilesRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Delete many files from Cloud Storage concurrently
+    
+    - **file_paths**: Paths to the files in Cloud Storage (max: 1000)
+    
+    Returns a per-path status: deleted, not_found, forbidden or error.
+    """
+    try:
+        results = await get_storage_service().delete_files(
+            file_paths=request.file_paths,
+            user_id=user_id
+        )
+        
+        return BulkDeleteFilesResponse(
+            deleted=sum(1 for result in results.values() if result == "deleted"),
+            results=results
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk deleting files: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete files"
+        )
+
 @router.get("/files")
 async def list_user_files(
     bucket_type: str = "assets",
     prefix: str = "",
     limit: int = 100,
+    product_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    folders: bool = False,
+    page_token: Optional[str] = None,
     user_id: str = Depends(get_current_user_id)
 ):
     """
-    List files for the authenticated user
+    List files for the authenticated user, one page at a time
     
     - **bucket_type**: Type of bucket to search (assets, generated, templates, reports)
     - **prefix**: Additional prefix to filter files
-    - **limit**: Maximum number of files to return (max: 1000)
+    - **limit**: Maximum number of files to return per page (max: 1000)
+    - **product_id**: Only list files for this product
+    - **file_type**: Only list files of this type (image, video, document, generated)
+    - **folders**: Return immediate sub-folders instead of a flat recursive listing
+    - **page_token**: `next_page_token` from the previous page
     """
     try:
         # Validate bucket_type
@@ -187,6 +509,19 @@ async def list_user_files(
                 detail=f"Invalid bucket_type. Must be one of: {', '.join(valid_bucket_types)}"
             )
         
+        # Validate file_type
+        valid_file_types = ["image", "video", "document", "generated"]
+        if file_type and file_type not in valid_file_types:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid file_type. Must be one of: {', '.join(valid_file_types)}"
+            )
+        if file_type == "generated" and not product_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="file_type 'generated' requires a product_id"
+            )
+        
         # Validate limit
         if limit < 1 or limit > 1000:
             raise HTTPException(
@@ -194,14 +529,22 @@ async def list_user_files(
                 detail="Limit must be between 1 and 1000"
             )
         
-        files = await storage_service.list_user_files(
+        result = await get_storage_service().list_user_files(
             user_id=user_id,
             bucket_type=bucket_type,
             prefix=prefix,
-            limit=limit
+            limit=limit,
+            product_id=product_id,
+            file_type=file_type,
+            folders=folders,
+            page_token=page_token
         )
         
-        return {"files": files}
+        return {
+            "files": result["files"],
+            "folders": result["folders"],
+            "next_page_token": result["next_page_token"]
+        }
         
     except HTTPException:
         raise
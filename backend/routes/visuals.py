@@ -1,17 +1,18 @@
 """
 Visual Library API routes
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from fastapi import APIRouter, HTTPException, status, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.visual_library import VisualLibrary, VisualLibraryService
+from models.visual_library import VisualLibrary
 from middleware.auth import get_current_user_id
 from services.storage_service import StorageService
+from services.providers import get_visual_service, get_storage_service
 
 import logging
 
@@ -19,9 +20,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/visuals", tags=["visuals"])
 
-# Initialize services
-visual_service = VisualLibraryService()
-storage_service = StorageService()
 
 # Request/Response models
 class VisualUpdateRequest(BaseModel):
@@ -45,7 +43,79 @@ class VisualResponse(BaseModel):
     preview_image_url: Optional[str] = None
     created_at: str
 
+class BulkDeleteVisualsRequest(BaseModel):
+    visual_ids: List[str] = Field(..., min_length=1, max_length=500)
+    delete_files: bool = Field(default=True, description="Also delete the stored asset files")
+
+class BulkDeleteResult(BaseModel):
+    visual_id: str
+    status: str
+    file_path: Optional[str] = None
+    file_status: Optional[str] = None
+
+class BulkDeleteVisualsResponse(BaseModel):
+    deleted: int
+    not_found: int
+    results: List[BulkDeleteResult]
+
 # Routes
+@router.post("/bulk-delete", response_model=BulkDeleteVisualsResponse)
+async def bulk_delete_visuals(
+    request: BulkDeleteVisualsRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Delete many visual entries and their associated files in one request
+    
+    - **visual_ids**: IDs of the visuals to delete (max: 500)
+    - **delete_files**: Also delete the stored asset files (default: true)
+    """
+    try:
+        # One batched read plus batched deletes in Firestore
+        deleted_visuals = await get_visual_service().delete_visuals(user_id=user_id, visual_ids=request.visual_ids)
+        
+        # Recover object paths for the visuals that existed
+        file_paths = {}
+        for visual_id, visual in deleted_visuals.items():
+            if visual:
+                file_path = StorageService.extract_file_path(visual.asset_url, user_id)
+                if file_path:
+                    file_paths[visual_id] = file_path
+        
+        # Delete the files concurrently; file failures don't fail the visual deletion
+        file_results = {}
+        if request.delete_files and file_paths:
+            file_results = await get_storage_service().delete_files(
+                file_paths=list(file_paths.values()),
+                user_id=user_id
+            )
+        
+        results = []
+        for visual_id, visual in deleted_visuals.items():
+            file_path = file_paths.get(visual_id)
+            results.append(BulkDeleteResult(
+                visual_id=visual_id,
+                status="deleted" if visual else "not_found",
+                file_path=file_path,
+                file_status=file_results.get(file_path) if file_path else None
+            ))
+        
+        deleted = sum(1 for visual in deleted_visuals.values() if visual)
+        return BulkDeleteVisualsResponse(
+            deleted=deleted,
+            not_found=len(deleted_visuals) - deleted,
+            results=results
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk deleting visuals: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete visuals"
+        )
+
 @router.get("/{visual_id}", response_model=VisualResponse)
 async def get_visual(
     visual_id: str,
@@ -53,7 +123,7 @@ async def get_visual(
 ):
     """Get a specific visual by ID"""
     try:
-        visual = await visual_service.get_visual(user_id=user_id, visual_id=visual_id)
+        visual = await get_visual_service().get_visual(user_id=user_id, visual_id=visual_id)
         
         if not visual:
             raise HTTPException(
@@ -102,7 +172,7 @@ async def update_visual(
                 detail="No valid update data provided"
             )
         
-        visual = await visual_service.update_visual(
+        visual = await get_visual_service().update_visual(
             user_id=user_id,
             visual_id=visual_id,
             updates=update_data
@@ -146,7 +216,7 @@ async def delete_visual(
     """Delete a visual entry and its associated file"""
     try:
         # Get visual info first to delete the file
-        visual = await visual_service.get_visual(user_id=user_id, visual_id=visual_id)
+        visual = await get_visual_service().get_visual(user_id=user_id, visual_id=visual_id)
         
         if not visual:
             raise HTTPException(
@@ -155,7 +225,7 @@ async def delete_visual(
             )
         
         # Delete the visual record from Firestore
-        success = await visual_service.delete_visual(user_id=user_id, visual_id=visual_id)
+        success = await get_visual_service().delete_visual(user_id=user_id, visual_id=visual_id)
         
         if not success:
             raise HTTPException(
@@ -165,27 +235,12 @@ async def delete_visual(
         
         # Try to delete the file from Cloud Storage
         # Extract file path from URL if it's a signed URL
-        file_path = None
-        if visual.asset_url:
-            if "gs://" in visual.asset_url:
-                # Extract path from gs:// URL
-                parts = visual.asset_url.replace("gs://", "").split("/", 1)
-                if len(parts) > 1:
-                    file_path = parts[1]
-            elif f"users/{user_id}/" in visual.asset_url:
-                # Extract path from signed URL or direct path
-                import urllib.parse
-                parsed_url = urllib.parse.urlparse(visual.asset_url)
-                path_parts = parsed_url.path.split("/")
-                for i, part in enumerate(path_parts):
-                    if part == "users" and i + 1 < len(path_parts) and path_parts[i + 1] == user_id:
-                        file_path = "/".join(path_parts[i:])
-                        break
+        file_path = StorageService.extract_file_path(visual.asset_url, user_id)
         
         # Delete file if we found a valid path
         if file_path:
             try:
-                await storage_service.delete_file(file_path=file_path, user_id=user_id)
+                await get_storage_service().delete_file(file_path=file_path, user_id=user_id)
                 logger.info(f"Deleted file {file_path} for visual {visual_id}")
             except Exception as file_error:
                 logger.warning(f"Failed to delete file {file_path} for visual {visual_id}: {str(file_error)}")
@@ -215,7 +270,7 @@ async def list_user_visuals(
                 detail="media_type must be 'image' or 'video'"
             )
         
-        visuals = await visual_service.list_user_visuals(
+        visuals = await get_visual_service().list_user_visuals(
             user_id=user_id,
             media_type=media_type,
             limit=limit
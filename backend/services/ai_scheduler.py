@@ -0,0 +1,263 @@
+"""
+In-process scheduler for OpenAI completions
+
+Every completion waits here for a slot. Work comes in three priority classes:
+
+- interactive: a user is waiting on the response (the default)
+- background: speculative work such as pre-generation
+- bulk: batch jobs that can wait indefinitely
+
+A higher class is always dispatched first, and background and bulk work may
+only use AI_SCHEDULER_MAX_CONCURRENT minus AI_SCHEDULER_INTERACTIVE_RESERVE
+slots, so a click never waits behind a long-running background completion
+when the reserve is free. Within a class, users share slots by weighted fair
+queuing on estimated tokens: a user with many queued completions doesn't
+delay another user's first one.
+
+With AI_SCHEDULER_TOKENS_PER_MINUTE, completions also wait for a token
+budget (estimated up front, corrected with the reported usage afterwards),
+to stay under the account's rate limit instead of collecting 429s.
+
+The class is taken from the caller's context, set with work_priority(), so
+it carries into tasks started inside (including single-flight calls).
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import AI_SCHEDULER_QUEUE_DEPTH, AI_SCHEDULER_IN_FLIGHT, AI_SCHEDULER_WAIT
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+BULK = "bulk"
+# Dispatch order
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+
+_priority: ContextVar[str] = ContextVar("ai_work_priority", default=INTERACTIVE)
+
+@contextmanager
+def work_priority(priority: str) -> Iterator[None]:
+    """Run the AI completions started in this block (and its tasks) at `priority`"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown AI work priority '{priority}'")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> str:
+    return _priority.get()
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Upper-bound token estimate of a completion: ~4 characters per prompt token plus max output"""
+    return sum(len(message.get("content", "")) for message in messages) // 4 + max_tokens
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+class _Ticket:
+    """A completion waiting for (or holding) a slot"""
+
+    __slots__ = ("user_id", "priority", "cost", "start", "finish", "future", "enqueued_at", "queued")
+
+    def __init__(self, user_id: str, priority: str, cost: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.priority = priority
+        self.cost = cost
+        self.start = 0.0
+        self.finish = 0.0
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.queued = True
+
+class Slot:
+    """Granted slot; set used_tokens to the completion's reported total"""
+
+    def __init__(self, ticket: _Ticket):
+        self.priority = ticket.priority
+        self.estimated_tokens = ticket.cost
+        self.used_tokens: Optional[int] = None
+
+class AIScheduler:
+    """Priority classes, per-user fair queuing, concurrency and token-rate limits"""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        interactive_reserve: Optional[int] = None,
+        tokens_per_minute: Optional[float] = None
+    ):
+        self.max_concurrent = max(1, max_concurrent if max_concurrent is not None
+                                  else int(_env_number("AI_SCHEDULER_MAX_CONCURRENT", 32)))
+        reserve = interactive_reserve if interactive_reserve is not None else int(_env_number("AI_SCHEDULER_INTERACTIVE_RESERVE", 4))
+        # Slots background and bulk work may occupy; the rest are kept for interactive work
+        self.shared_limit = max(1, self.max_concurrent - reserve)
+        self.tokens_per_minute = tokens_per_minute if tokens_per_minute is not None else _env_number("AI_SCHEDULER_TOKENS_PER_MINUTE", 0)
+        self._tokens = self.tokens_per_minute
+        self._refilled_at = time.monotonic()
+        self._refill_timer: Optional[asyncio.TimerHandle] = None
+
+        # Per class: heap of (finish tag, sequence, ticket), virtual time, and each user's last finish tag
+        self._queues: Dict[str, List[Tuple[float, int, _Ticket]]] = {priority: [] for priority in PRIORITIES}
+        self._virtual_time: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self._max_finish: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        self._sequence = itertools.count()
+        self._queued: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._in_flight: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    def saturated(self) -> bool:
+        """Every slot is taken, or interactive work is waiting for one"""
+        return self.in_flight >= self.max_concurrent or self._queued[INTERACTIVE] > 0
+
+    def describe(self) -> Dict[str, Dict[str, int]]:
+        """Queued and running completions by class (for the health check)"""
+        return {
+            priority: {"queued": self._queued[priority], "in_flight": self._in_flight[priority]}
+            for priority in PRIORITIES
+        }
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, estimated_tokens: int, priority: Optional[str] = None) -> AsyncIterator[Slot]:
+        """Wait for a slot for one completion of user_id, held until the block exits"""
+        ticket = _Ticket(user_id, priority or current_priority(), max(1, estimated_tokens),
+                         asyncio.get_running_loop().create_future())
+        self._enqueue(ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.queued:
+                self._dequeued(ticket)
+            elif not ticket.future.cancelled():
+                # Granted just as the caller was cancelled
+                self._release(ticket, None)
+            raise
+
+        slot = Slot(ticket)
+        try:
+            yield slot
+        finally:
+            self._release(ticket, slot.used_tokens)
+
+    def promote(self, user_id: str) -> None:
+        """Move user_id's queued background and bulk work to interactive (the user is now waiting)"""
+        moved = []
+        for priority in (BACKGROUND, BULK):
+            queue = self._queues[priority]
+            kept = [entry for entry in queue if entry[2].user_id != user_id or not entry[2].queued]
+            if len(kept) == len(queue):
+                continue
+            moved.extend(entry[2] for entry in queue if entry[2].user_id == user_id and entry[2].queued)
+            heapq.heapify(kept)
+            self._queues[priority] = kept
+
+        for ticket in sorted(moved, key=lambda ticket: ticket.enqueued_at):
+            self._dequeued(ticket)
+            ticket.priority = INTERACTIVE
+            self._enqueue(ticket)
+        if moved:
+            logger.debug(f"Promoted {len(moved)} queued AI completions of user {user_id}")
+            self._dispatch()
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        priority = ticket.priority
+        key = (priority, ticket.user_id)
+        ticket.start = max(self._virtual_time[priority], self._last_finish.get(key, 0.0))
+        ticket.finish = ticket.start + ticket.cost
+        self._last_finish[key] = ticket.finish
+        ticket.queued = True
+        heapq.heappush(self._queues[priority], (ticket.finish, next(self._sequence), ticket))
+        self._queued[priority] += 1
+        AI_SCHEDULER_QUEUE_DEPTH.labels(priority=priority).inc()
+
+    def _dequeued(self, ticket: _Ticket) -> None:
+        ticket.queued = False
+        self._queued[ticket.priority] -= 1
+        AI_SCHEDULER_QUEUE_DEPTH.labels(priority=ticket.priority).dec()
+
+    def _limit(self, priority: str) -> int:
+        return self.max_concurrent if priority == INTERACTIVE else self.shared_limit
+
+    def _dispatch(self) -> None:
+        """Grant slots in class order, then fair-queuing order, while limits allow"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                ticket = queue[0][2]
+                if not ticket.queued or ticket.future.done():
+                    # Cancelled while waiting
+                    heapq.heappop(queue)
+                    continue
+                if self.in_flight >= self._limit(priority):
+                    # Later classes have the same or a lower limit
+                    return
+                if not self._take_tokens(ticket.cost):
+                    # Nothing may overtake the head of the highest waiting class
+                    return
+
+                heapq.heappop(queue)
+                self._dequeued(ticket)
+                self._max_finish[priority] = max(self._max_finish[priority], ticket.finish)
+                # Once the class drains, nobody keeps credit or debt from earlier work
+                self._virtual_time[priority] = self._max_finish[priority] if not queue else max(
+                    self._virtual_time[priority], ticket.start
+                )
+                self._in_flight[priority] += 1
+                AI_SCHEDULER_IN_FLIGHT.labels(priority=priority).inc()
+                AI_SCHEDULER_WAIT.labels(priority=priority).observe(time.monotonic() - ticket.enqueued_at)
+                ticket.future.set_result(None)
+        self._prune()
+
+    def _release(self, ticket: _Ticket, used_tokens: Optional[int]) -> None:
+        self._in_flight[ticket.priority] -= 1
+        AI_SCHEDULER_IN_FLIGHT.labels(priority=ticket.priority).dec()
+        if self.tokens_per_minute > 0 and used_tokens is not None:
+            # Correct the up-front estimate with what the completion actually used
+            self._tokens = min(self.tokens_per_minute, self._tokens + ticket.cost - used_tokens)
+        self._dispatch()
+
+    def _take_tokens(self, cost: int) -> bool:
+        if self.tokens_per_minute <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60)
+        self._refilled_at = now
+        # A completion larger than the whole budget runs once the bucket is full
+        needed = min(cost, self.tokens_per_minute)
+        if self._tokens >= needed:
+            self._tokens -= cost
+            return True
+        if self._refill_timer is None:
+            delay = (needed - self._tokens) * 60 / self.tokens_per_minute
+            self._refill_timer = asyncio.get_running_loop().call_later(delay, self._on_refill)
+        return False
+
+    def _on_refill(self) -> None:
+        self._refill_timer = None
+        self._dispatch()
+
+    def _prune(self, max_users: int = 10000) -> None:
+        """Forget finish tags that no longer affect ordering (at or behind virtual time)"""
+        if len(self._last_finish) > max_users:
+            self._last_finish = {
+                key: finish for key, finish in self._last_finish.items()
+                if finish > self._virtual_time[key[0]]
+            }
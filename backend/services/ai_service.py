@@ -2,22 +2,74 @@
 AI content generation service using OpenAI
 """
 import os
+import time
+import asyncio
+import math
+import hashlib
 import logging
 from typing import Dict, Any, List, Optional
-import openai
-from openai import AsyncOpenAI
 import json
+import re
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.product import Product, ProductService
-from models.marketing_strategy import MarketingStrategy, MarketingStrategyService, CustomerAvatar, ProductInfoPack, CreativeBrief
-from models.creative_output import CreativeOutput, CreativeOutputService, AdCopy
+from models.product import Product, ProductNotFoundError
+from models.marketing_strategy import MarketingStrategy, CustomerAvatar, ProductInfoPack, CreativeBrief
+from models.creative_output import CreativeOutput, AdCopy
+from services.providers import get_product_service, get_strategy_service, get_creative_service
+from services.model_router import ModelRouter
+from services.ai_scheduler import AIScheduler, estimate_tokens
+from utils.metrics import OPENAI_REQUESTS, OPENAI_REQUEST_DURATION, AD_COPY_VARIATIONS, AI_ARTIFACT_REUSE, record_openai_usage
+from utils.openai_client import create_openai_client, warm_openai_client, request_timeout, DEFAULT_READ_TIMEOUT
+from utils.tracing import traced, start_span
+from utils.singleflight import single_flight
 
 logger = logging.getLogger(__name__)
 
+# Read timeout (seconds) per operation, sized to the longest completion each produces
+OPERATION_TIMEOUTS = {
+    "autofill_product_details": 30.0,
+    "generate_marketing_strategy": 90.0,
+    "generate_ad_copies": 90.0,
+    "generate_ad_concept": 45.0,
+    "generate_ad_copy_variation": 45.0,
+    "regenerate_ad_copy": 45.0,
+    "enhance_product_analysis": 60.0
+}
+
+# Bump when a prompt's output or its parsing changes, so stored artifacts are regenerated
+PROMPT_VERSIONS = {
+    "generate_marketing_strategy": 1,
+    "enhance_product_analysis": 1
+}
+
+STRATEGY_SYSTEM_PROMPT = "You are a senior marketing strategist with expertise in customer segmentation, positioning, and creative strategy across global markets."
+ANALYSIS_SYSTEM_PROMPT = "You are a senior product marketing analyst with expertise in market positioning, customer psychology, and competitive analysis."
+
+def input_fingerprint(operation: str, *messages: str) -> str:
+    """
+    Fingerprint of an operation's prompt version and rendered prompt messages
+
+    The prompts contain every product field the completion depends on, so an
+    unchanged fingerprint means a new completion would answer the same question.
+    """
+    digest = hashlib.sha256(f"{operation}:v{PROMPT_VERSIONS.get(operation, 1)}".encode("utf-8"))
+    for message in messages:
+        digest.update(b"\0")
+        digest.update(message.encode("utf-8"))
+    return digest.hexdigest()
+
+# Distinct approaches for fanned-out ad copy variations, in the order they are assigned
+AD_COPY_ANGLES = (
+    "Problem-Solution",
+    "Benefit-Driven",
+    "Social Proof",
+    "Offer and Urgency",
+    "Emotional Story"
+)
+
 class AIService:
     """Service for AI-powered content generation"""
     
@@ -28,30 +80,89 @@ class AIService:
             logger.warning("OPENAI_API_KEY not found in environment variables")
             self.client = None
         else:
-            self.client = AsyncOpenAI(api_key=api_key)
+            self.client = create_openai_client(api_key)
         
-        # Initialize other services
-        self.product_service = ProductService()
-        self.strategy_service = MarketingStrategyService()
-        self.creative_service = CreativeOutputService()
+        # Shared service instances
+        self.product_service = get_product_service()
+        self.strategy_service = get_strategy_service()
+        self.creative_service = get_creative_service()
         
-        # Model configuration
-        self.model = "gpt-4o-mini"  # Cost-effective model for most tasks
-        self.max_tokens = 2000
-        self.temperature = 0.7
+        # Priority, fairness and rate limits for all completions
+        self.scheduler = AIScheduler()
+        # Model, max_tokens and temperature per operation; degrades while the scheduler is saturated
+        self.router = ModelRouter(saturated=self.scheduler.saturated)
+        self.model = self.router.default_model
+        # Concept first, then one concurrent completion per ad copy variation
+        self.ad_copy_fanout = os.getenv("AI_AD_COPY_FANOUT", "false").strip().lower() in ("1", "true", "yes")
+        
+        # Reuse autofill results of near-duplicate products (built on first use: imports numpy)
+        self.autofill_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+        self._autofill_cache = None
     
-    async def autofill_product_details(self, user_id: str, product_name: str, 
-                                     what_is_it: str, price: float, 
-                                     target_country: str) -> Dict[str, str]:
-        """
-        Generate product description, problem it solves, and target customers
-        based on basic product information
+    def product_input_fingerprints(self, product: Product) -> Dict[str, str]:
+        """Input fingerprints of the product-level generations, by operation"""
+        return {
+            "enhance_product_analysis": input_fingerprint(
+                "enhance_product_analysis", ANALYSIS_SYSTEM_PROMPT, self._build_analysis_prompt(product)
+            ),
+            "generate_marketing_strategy": input_fingerprint(
+                "generate_marketing_strategy", STRATEGY_SYSTEM_PROMPT, self._build_strategy_prompt(product)
+            )
+        }
+    
+    async def warm_up(self) -> None:
+        """Open connections to the OpenAI API ahead of the first generation"""
+        if self.client:
+            await warm_openai_client(self.client, self.model)
+    
+    async def _create_completion(self, operation: str, user_id: str, messages: List[Dict[str, str]]):
         """
-        if not self.client:
-            raise Exception("OpenAI API key not configured")
+        Create a chat completion on the routed model, recording latency, outcome and token usage
         
-        try:
-            prompt = f"""
+        Waits for a scheduler slot first, at the priority of the calling context.
+        """
+        estimated_tokens = estimate_tokens(messages, self.router.route(operation).max_tokens)
+        async with self.scheduler.slot(user_id, estimated_tokens) as slot:
+            choice = self.router.select(operation)
+            model = choice.model
+            start = time.perf_counter()
+            outcome = "error"
+            self.router.started()
+            try:
+                with start_span("openai.chat.completions.create", **{
+                    "gen_ai.system": "openai",
+                    "gen_ai.operation.name": operation,
+                    "gen_ai.request.model": model,
+                    "gen_ai.request.max_tokens": choice.max_tokens,
+                    "nexsy.model.tier": choice.tier,
+                    "nexsy.model.routing_reason": choice.reason,
+                    "nexsy.ai.priority": slot.priority
+                }) as span:
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=choice.max_tokens,
+                        temperature=choice.temperature,
+                        timeout=request_timeout(OPERATION_TIMEOUTS.get(operation, DEFAULT_READ_TIMEOUT))
+                    )
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        span.set_attribute("gen_ai.usage.input_tokens", usage.prompt_tokens)
+                        span.set_attribute("gen_ai.usage.output_tokens", usage.completion_tokens)
+                        slot.used_tokens = usage.total_tokens
+                outcome = "success"
+                record_openai_usage(model, operation, usage)
+                return response
+            finally:
+                duration = time.perf_counter() - start
+                self.router.finished(choice, duration)
+                OPENAI_REQUEST_DURATION.labels(model=model, operation=operation).observe(duration)
+                OPENAI_REQUESTS.labels(model=model, operation=operation, outcome=outcome).inc()
+    
+    @staticmethod
+    def _build_autofill_prompt(product_name: str, what_is_it: str, price: float, target_country: str) -> str:
+        """Build the user prompt for product autofill"""
+        return f"""
             You are a marketing expert. Based on the following product information, generate detailed marketing content:
 
             Product Name: {product_name}
@@ -68,51 +179,11 @@ class AIService:
 
             Make sure the content is engaging, market-appropriate for {target_country}, and reflects the price point of ${price}.
             """
-            
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert marketing copywriter who creates compelling product descriptions and identifies target markets."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Parse JSON response
-            try:
-                result = json.loads(content)
-                logger.info(f"Generated autofill content for product: {product_name}")
-                return result
-            except json.JSONDecodeError:
-                # Fallback parsing if JSON is not perfect
-                logger.warning("Failed to parse JSON response, using fallback")
-                return {
-                    "product_description": f"High-quality {what_is_it} designed to meet your needs with excellent value at ${price}.",
-                    "problem_it_solves": f"Solves common challenges related to {what_is_it.lower()}.",
-                    "target_customers": f"Customers in {target_country} looking for reliable {what_is_it.lower()} solutions."
-                }
-                
-        except Exception as e:
-            logger.error(f"Error generating autofill content: {str(e)}")
-            raise Exception(f"Failed to generate content: {str(e)}")
     
-    async def generate_marketing_strategy(self, user_id: str, product_id: str) -> MarketingStrategy:
-        """
-        Generate a comprehensive marketing strategy for a product
-        """
-        if not self.client:
-            raise Exception("OpenAI API key not configured")
-        
-        try:
-            # Get product details
-            product = await self.product_service.get_product(user_id, product_id)
-            if not product:
-                raise Exception("Product not found")
-            
-            prompt = f"""
+    @staticmethod
+    def _build_strategy_prompt(product: Product) -> str:
+        """Build the user prompt for marketing strategy generation"""
+        return f"""
             Create a comprehensive marketing strategy for this product:
 
             Product Name: {product.product_name}
@@ -150,15 +221,319 @@ class AIService:
             - Aligned with the goal: {product.main_goal}
             - Based on real market insights and consumer psychology
             """
+    
+    @staticmethod
+    def _build_ad_copy_context(product: Product, strategy: Optional[MarketingStrategy]) -> str:
+        """Product information and strategy context shared by the ad copy prompts"""
+        # Build context from strategy if available
+        strategy_context = ""
+        if strategy:
+            if strategy.product_infopack and strategy.product_infopack.customer_avatars:
+                avatar_descriptions = [f"- {avatar.label}: {avatar.description}" for avatar in strategy.product_infopack.customer_avatars]
+                strategy_context += f"\nTarget Customer Segments:\n{chr(10).join(avatar_descriptions)}"
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            if strategy.creative_brief:
+                strategy_context += f"\nCreative Angle: {strategy.creative_brief.creative_angle}"
+                strategy_context += f"\nVisual Style: {strategy.creative_brief.visual_style_art_direction}"
+        
+        return f"""Product Information:
+            - Name: {product.product_name}
+            - Description: {product.what_is_it}
+            - Price: ${product.price} {product.currency}
+            - Target Country: {product.target_country}
+            - Main Goal: {product.main_goal}
+            - Product Description: {product.product_description or 'Not provided'}
+            - Problem It Solves: {product.problem_it_solves or 'Not provided'}
+            - Target Customers: {product.target_customers or 'Not provided'}
+            
+            {strategy_context}"""
+    
+    @classmethod
+    def _build_ad_copies_prompt(cls, product: Product, strategy: Optional[MarketingStrategy], tone: str, num_variations: int) -> str:
+        """Build the user prompt for ad copy generation, including strategy context when available"""
+        return f"""
+            Create compelling ad copy variations for this product with a {tone} tone:
+
+            {cls._build_ad_copy_context(product, strategy)}
+
+            Please create {num_variations} different ad copy variations in JSON format:
+            {{
+                "creative_concept_title": "A catchy title for this creative concept/campaign",
+                "creative_concept_description": "2-3 sentences explaining the overall creative concept and why it will work",
+                "target_audience_summary": "Brief summary of who this targets and why",
+                "why_this_works": "Explanation of the psychology and marketing principles that make this effective",
+                "ad_copies": [
+                    {{
+                        "variation_name": "Descriptive name for this variation (e.g., 'Social Proof Focus', 'Problem-Solution', 'Benefit-Driven')",
+                        "headline": "Compelling headline (max 60 characters for social media)",
+                        "body_text": "Main ad copy text (engaging, persuasive, appropriate length for digital ads)",
+                        "call_to_action": "Strong CTA button text",
+                        "platform_optimized": "facebook",
+                        "offer_value_proposition": "The key value proposition highlighted in this variation"
+                    }}
+                ]
+            }}
+
+            Requirements:
+            - Use {tone} tone throughout
+            - Make it compelling for {product.target_country} market
+            - Include emotional triggers and logical benefits
+            - Ensure headlines are catchy and memorable
+            - CTAs should be action-oriented
+            - Each variation should have a different approach/angle
+            """
+    
+    @classmethod
+    def _build_ad_concept_prompt(cls, product: Product, strategy: Optional[MarketingStrategy], tone: str, angles: List[str]) -> str:
+        """Build the user prompt for the creative concept shared by fanned-out variations"""
+        return f"""
+            Create a creative concept for an ad campaign for this product with a {tone} tone:
+
+            {cls._build_ad_copy_context(product, strategy)}
+
+            The campaign will be run as ad variations with these angles: {", ".join(angles)}.
+
+            Please provide the concept in JSON format:
+            {{
+                "creative_concept_title": "A catchy title for this creative concept/campaign",
+                "creative_concept_description": "2-3 sentences explaining the overall creative concept and why it will work",
+                "target_audience_summary": "Brief summary of who this targets and why",
+                "why_this_works": "Explanation of the psychology and marketing principles that make this effective"
+            }}
+
+            Make it compelling for the {product.target_country} market.
+            """
+    
+    @classmethod
+    def _build_ad_variation_prompt(cls, product: Product, strategy: Optional[MarketingStrategy], tone: str,
+                                   concept: Dict[str, Any], angle: str) -> str:
+        """Build the user prompt for one ad copy variation of a concept"""
+        return f"""
+            Write one ad copy variation with a {tone} tone, using the "{angle}" angle, for this campaign:
+
+            Campaign Concept: {concept.get("creative_concept_title", "")}
+            {concept.get("creative_concept_description", "")}
+            Audience: {concept.get("target_audience_summary", "")}
+
+            {cls._build_ad_copy_context(product, strategy)}
+
+            Please provide the variation in JSON format:
+            {{
+                "variation_name": "{angle}",
+                "headline": "Compelling headline (max 60 characters for social media)",
+                "body_text": "Main ad copy text (engaging, persuasive, appropriate length for digital ads)",
+                "call_to_action": "Strong CTA button text",
+                "platform_optimized": "facebook",
+                "offer_value_proposition": "The key value proposition highlighted in this variation"
+            }}
+
+            Requirements:
+            - Use {tone} tone throughout
+            - Make it compelling for {product.target_country} market
+            - Include emotional triggers and logical benefits
+            - The headline should be catchy and memorable
+            - The CTA should be action-oriented
+            """
+    
+    @staticmethod
+    def _build_ad_copy_regeneration_prompt(output: CreativeOutput, index: int) -> str:
+        """Build the user prompt replacing one ad copy: only the concept and the sibling headlines"""
+        current = output.ad_copies[index]
+        sibling_headlines = [
+            f"- {copy.headline}" for position, copy in enumerate(output.ad_copies) if position != index
+        ]
+        return f"""
+            Rewrite one ad copy variation of this campaign with a {output.tone or 'professional'} tone:
+
+            Campaign Concept: {output.creative_concept_title}
+            {output.creative_concept_description}
+            Audience: {output.target_audience_summary}
+
+            Variation to replace: "{current.variation_name}" (headline: {current.headline})
+            Other variations' headlines (take a clearly different approach):
+            {(chr(10) + ' ' * 12).join(sibling_headlines) or '- None'}
+
+            Please provide the new variation in JSON format:
+            {{
+                "variation_name": "Descriptive name for this variation",
+                "headline": "Compelling headline (max 60 characters for social media)",
+                "body_text": "Main ad copy text (engaging, persuasive, appropriate length for digital ads)",
+                "call_to_action": "Strong CTA button text",
+                "platform_optimized": "{current.platform_optimized}",
+                "offer_value_proposition": "The key value proposition highlighted in this variation"
+            }}
+            """
+    
+    @staticmethod
+    def _build_analysis_prompt(product: Product) -> str:
+        """Build the user prompt for enhanced product analysis"""
+        return f"""
+            Analyze this product and provide enhanced marketing insights:
+
+            Product Name: {product.product_name}
+            Description: {product.what_is_it}
+            Price: ${product.price} {product.currency}
+            Target Country: {product.target_country}
+            Main Goal: {product.main_goal}
+            Product Description: {product.product_description or 'Not provided'}
+            Problem It Solves: {product.problem_it_solves or 'Not provided'}
+            Target Customers: {product.target_customers or 'Not provided'}
+
+            Please provide enhanced analysis in JSON format:
+            {{
+                "ai_analysis_summary": "A comprehensive 2-3 sentence analysis of the product's market position, competitive advantages, and overall potential",
+                "ai_target_audience_profile": "A detailed profile of the ideal customer including demographics, psychographics, behavior patterns, and motivations",
+                "ai_key_selling_points": [
+                    "First key selling point that differentiates this product",
+                    "Second unique value proposition", 
+                    "Third compelling reason to buy",
+                    "Fourth benefit or feature that stands out"
+                ]
+            }}
+
+            Focus on:
+            - Unique value propositions
+            - Competitive differentiation
+            - Market positioning opportunities
+            - Customer pain points addressed
+            - Psychological triggers for {product.target_country} market
+            """
+    
+    def _get_autofill_cache(self):
+        if self._autofill_cache is None:
+            from utils.semantic_cache import create_semantic_cache
+            self._autofill_cache = create_semantic_cache("autofill", self.client)
+        return self._autofill_cache
+    
+    @staticmethod
+    def _autofill_scope(user_id: str, product_name: str, price: float, target_country: str):
+        """
+        Only a user's own products for the same country in the same price band,
+        whose names have the same key terms, share autofill results
+        """
+        from utils.semantic_cache import key_terms
+        # Bands double in width: ..., [16, 32), [32, 64), ...
+        price_band = math.floor(math.log2(max(price, 0.01)))
+        # A name word the cached product lacks (whey vs vegan) means different copy
+        return (user_id, target_country.strip().lower(), price_band, key_terms(product_name))
+    
+    @staticmethod
+    def _adapt_autofill(cached: Dict[str, Any], product_name: str, price: float) -> Dict[str, str]:
+        """Point a cached autofill result at the new product's name and price"""
+        name_pattern = re.compile(re.escape(cached["product_name"]), re.IGNORECASE)
+        price_text = f"${cached['price']}"
+        adapted = {}
+        for field, text in cached["result"].items():
+            if isinstance(text, str):
+                text = name_pattern.sub(lambda match: product_name, text).replace(price_text, f"${price}")
+            adapted[field] = text
+        return adapted
+    
+    async def _lookup_autofill_cache(self, user_id: str, product_name: str, what_is_it: str,
+                                     price: float, target_country: str):
+        """(match or None, vector, text, scope) from the autofill cache, or None if the lookup failed"""
+        text = f"{product_name} | {what_is_it}"
+        scope = self._autofill_scope(user_id, product_name, price, target_country)
+        try:
+            match, vector = await self._get_autofill_cache().lookup(text, scope)
+        except Exception as e:
+            logger.warning(f"Autofill cache lookup failed, generating: {e}")
+            return None
+        return match, vector, text, scope
+    
+    @single_flight()
+    @traced()
+    async def autofill_product_details(self, user_id: str, product_name: str, 
+                                     what_is_it: str, price: float, 
+                                     target_country: str) -> Dict[str, str]:
+        """
+        Generate product description, problem it solves, and target customers
+        based on basic product information
+        """
+        if not self.client:
+            raise Exception("OpenAI API key not configured")
+        
+        try:
+            cache_lookup = None
+            if self.autofill_cache_enabled:
+                cache_lookup = await self._lookup_autofill_cache(user_id, product_name, what_is_it, price, target_country)
+                match = cache_lookup[0] if cache_lookup else None
+                if match:
+                    logger.info(f"Autofill for '{product_name}' reused '{match.text}' ({match.similarity:.2f})")
+                    return self._adapt_autofill(match.value, product_name, price)
+            
+            prompt = self._build_autofill_prompt(product_name, what_is_it, price, target_country)
+            
+            response = await self._create_completion(
+                "autofill_product_details",
+                user_id=user_id,
                 messages=[
-                    {"role": "system", "content": "You are a senior marketing strategist with expertise in customer segmentation, positioning, and creative strategy across global markets."},
+                    {"role": "system", "content": "You are an expert marketing copywriter who creates compelling product descriptions and identifies target markets."},
                     {"role": "user", "content": prompt}
-                ],
-                max_tokens=3000,
-                temperature=self.temperature
+                ]
+            )
+            
+            content = response.choices[0].message.content.strip()
+            
+            # Parse JSON response
+            try:
+                result = json.loads(content)
+                logger.info(f"Generated autofill content for product: {product_name}")
+                if cache_lookup:
+                    _, vector, text, scope = cache_lookup
+                    self._autofill_cache.add(vector, text, scope, {
+                        "result": result, "product_name": product_name, "price": price
+                    })
+                return result
+            except json.JSONDecodeError:
+                # Fallback parsing if JSON is not perfect
+                logger.warning("Failed to parse JSON response, using fallback")
+                return {
+                    "product_description": f"High-quality {what_is_it} designed to meet your needs with excellent value at ${price}.",
+                    "problem_it_solves": f"Solves common challenges related to {what_is_it.lower()}.",
+                    "target_customers": f"Customers in {target_country} looking for reliable {what_is_it.lower()} solutions."
+                }
+                
+        except Exception as e:
+            logger.error(f"Error generating autofill content: {str(e)}")
+            raise Exception(f"Failed to generate content: {str(e)}")
+    
+    @single_flight()
+    @traced()
+    async def generate_marketing_strategy(self, user_id: str, product_id: str, force: bool = False) -> MarketingStrategy:
+        """
+        Generate a comprehensive marketing strategy for a product
+        
+        Returns the product's latest strategy instead if it was generated from
+        the same inputs and prompt version, unless force is set.
+        """
+        if not self.client:
+            raise Exception("OpenAI API key not configured")
+        
+        try:
+            # Get product details
+            product = await self.product_service.get_product(user_id, product_id)
+            if not product:
+                raise ProductNotFoundError("Product not found")
+            
+            prompt = self._build_strategy_prompt(product)
+            fingerprint = input_fingerprint("generate_marketing_strategy", STRATEGY_SYSTEM_PROMPT, prompt)
+            
+            if not force:
+                latest = await self.strategy_service.get_product_strategy(user_id, product_id)
+                if latest and latest.input_fingerprint == fingerprint:
+                    AI_ARTIFACT_REUSE.labels(operation="generate_marketing_strategy", result="reused").inc()
+                    logger.info(f"Reusing marketing strategy {latest.id} for unchanged product {product_id}")
+                    return latest
+            AI_ARTIFACT_REUSE.labels(operation="generate_marketing_strategy", result="forced" if force else "generated").inc()
+            
+            response = await self._create_completion(
+                "generate_marketing_strategy",
+                user_id=user_id,
+                messages=[
+                    {"role": "system", "content": STRATEGY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ]
             )
             
             content = response.choices[0].message.content.strip()
@@ -183,7 +558,9 @@ class AIService:
                         creative_angle=strategy_data.get("creative_brief", {}).get("creative_angle", ""),
                         visual_style_art_direction=strategy_data.get("creative_brief", {}).get("visual_style_art_direction", "")
                     ),
-                    "openai_response_id": response.id
+                    "openai_response_id": response.id,
+                    "ai_model": response.model,
+                    "input_fingerprint": fingerprint
                 }
                 
                 # Save to Firestore
@@ -200,6 +577,111 @@ class AIService:
             logger.error(f"Error generating marketing strategy: {str(e)}")
             raise
     
+    @staticmethod
+    def _ad_copy_system_message(tone: str) -> Dict[str, str]:
+        return {"role": "system", "content": f"You are an expert advertising copywriter specializing in {tone} tone and high-converting digital ad copy for various platforms."}
+    
+    @staticmethod
+    def _parse_ad_copy(copy_data: Dict[str, Any]) -> AdCopy:
+        return AdCopy(
+            variation_name=copy_data.get("variation_name", ""),
+            headline=copy_data.get("headline", ""),
+            body_text=copy_data.get("body_text", ""),
+            call_to_action=copy_data.get("call_to_action", ""),
+            platform_optimized=copy_data.get("platform_optimized", "universal"),
+            offer_value_proposition=copy_data.get("offer_value_proposition")
+        )
+    
+    async def _generate_ad_copies_single(self, product: Product, strategy: Optional[MarketingStrategy],
+                                         tone: str, num_variations: int):
+        """Generate the concept and all variations in one completion"""
+        prompt = self._build_ad_copies_prompt(product, strategy, tone, num_variations)
+        
+        response = await self._create_completion(
+            "generate_ad_copies",
+            user_id=product.user_id,
+            messages=[
+                self._ad_copy_system_message(tone),
+                {"role": "user", "content": prompt}
+            ]
+        )
+        
+        content = response.choices[0].message.content.strip()
+        
+        # Parse JSON response
+        try:
+            creative_data = json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse creative output JSON: {str(e)}")
+            raise Exception("Failed to parse AI response")
+        
+        ad_copies = [self._parse_ad_copy(copy_data) for copy_data in creative_data.get("ad_copies", [])]
+        return creative_data, ad_copies, response.model
+    
+    async def _generate_ad_copies_fanout(self, product: Product, strategy: Optional[MarketingStrategy],
+                                         tone: str, num_variations: int):
+        """
+        Generate the concept, then every variation concurrently with its own angle
+        
+        Latency is about one concept plus one variation completion regardless of
+        num_variations. Variations that fail or come back malformed are left out;
+        only if all of them fail does the generation fail.
+        """
+        angles = [AD_COPY_ANGLES[i % len(AD_COPY_ANGLES)] for i in range(num_variations)]
+        
+        response = await self._create_completion(
+            "generate_ad_concept",
+            user_id=product.user_id,
+            messages=[
+                self._ad_copy_system_message(tone),
+                {"role": "user", "content": self._build_ad_concept_prompt(product, strategy, tone, angles)}
+            ]
+        )
+        try:
+            concept = json.loads(response.choices[0].message.content.strip())
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse creative concept JSON: {str(e)}")
+            raise Exception("Failed to parse AI response")
+        models = {response.model}
+        
+        async def generate_variation(index: int, angle: str):
+            variation = await self._create_completion(
+                "generate_ad_copy_variation",
+                user_id=product.user_id,
+                messages=[
+                    self._ad_copy_system_message(tone),
+                    {"role": "user", "content": self._build_ad_variation_prompt(product, strategy, tone, concept, angle)}
+                ]
+            )
+            copy_data = json.loads(variation.choices[0].message.content.strip())
+            if not copy_data.get("variation_name"):
+                copy_data["variation_name"] = angle
+            return index, self._parse_ad_copy(copy_data), variation.model
+        
+        tasks = [asyncio.ensure_future(generate_variation(index, angle)) for index, angle in enumerate(angles)]
+        ad_copies: Dict[int, AdCopy] = {}
+        try:
+            # Collect variations as they complete
+            for next_variation in asyncio.as_completed(tasks):
+                try:
+                    index, ad_copy, model = await next_variation
+                except Exception as e:
+                    AD_COPY_VARIATIONS.labels(outcome="failed").inc()
+                    logger.warning(f"Ad copy variation failed for product {product.id}: {str(e)}")
+                    continue
+                AD_COPY_VARIATIONS.labels(outcome="success").inc()
+                ad_copies[index] = ad_copy
+                models.add(model)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if not ad_copies:
+            raise Exception("All ad copy variations failed")
+        return concept, [ad_copies[index] for index in sorted(ad_copies)], ", ".join(sorted(models))
+    
+    @single_flight()
+    @traced()
     async def generate_ad_copies(self, user_id: str, product_id: str, 
                                tone: str = "professional", 
                                num_variations: int = 3) -> CreativeOutput:
@@ -213,119 +695,92 @@ class AIService:
             # Get product and marketing strategy
             product = await self.product_service.get_product(user_id, product_id)
             if not product:
-                raise Exception("Product not found")
+                raise ProductNotFoundError("Product not found")
             
             strategy = await self.strategy_service.get_product_strategy(user_id, product_id)
             
-            # Build context from strategy if available
-            strategy_context = ""
-            if strategy:
-                if strategy.product_infopack and strategy.product_infopack.customer_avatars:
-                    avatar_descriptions = [f"- {avatar.label}: {avatar.description}" for avatar in strategy.product_infopack.customer_avatars]
-                    strategy_context += f"\nTarget Customer Segments:\n{chr(10).join(avatar_descriptions)}"
-                
-                if strategy.creative_brief:
-                    strategy_context += f"\nCreative Angle: {strategy.creative_brief.creative_angle}"
-                    strategy_context += f"\nVisual Style: {strategy.creative_brief.visual_style_art_direction}"
+            if self.ad_copy_fanout and num_variations > 1:
+                creative_data, ad_copies, ai_model = await self._generate_ad_copies_fanout(product, strategy, tone, num_variations)
+            else:
+                creative_data, ad_copies, ai_model = await self._generate_ad_copies_single(product, strategy, tone, num_variations)
             
-            prompt = f"""
-            Create compelling ad copy variations for this product with a {tone} tone:
-
-            Product Information:
-            - Name: {product.product_name}
-            - Description: {product.what_is_it}
-            - Price: ${product.price} {product.currency}
-            - Target Country: {product.target_country}
-            - Main Goal: {product.main_goal}
-            - Product Description: {product.product_description or 'Not provided'}
-            - Problem It Solves: {product.problem_it_solves or 'Not provided'}
-            - Target Customers: {product.target_customers or 'Not provided'}
+            # Create creative output
+            creative_payload = {
+                "product_id": product_id,
+                "creative_concept_title": creative_data.get("creative_concept_title", ""),
+                "creative_concept_description": creative_data.get("creative_concept_description", ""),
+                "target_audience_summary": creative_data.get("target_audience_summary", ""),
+                "why_this_works": creative_data.get("why_this_works", ""),
+                "ad_copies": ad_copies,
+                "tone": tone,
+                "ai_model": ai_model
+            }
             
-            {strategy_context}
-
-            Please create {num_variations} different ad copy variations in JSON format:
-            {{
-                "creative_concept_title": "A catchy title for this creative concept/campaign",
-                "creative_concept_description": "2-3 sentences explaining the overall creative concept and why it will work",
-                "target_audience_summary": "Brief summary of who this targets and why",
-                "why_this_works": "Explanation of the psychology and marketing principles that make this effective",
-                "ad_copies": [
-                    {{
-                        "variation_name": "Descriptive name for this variation (e.g., 'Social Proof Focus', 'Problem-Solution', 'Benefit-Driven')",
-                        "headline": "Compelling headline (max 60 characters for social media)",
-                        "body_text": "Main ad copy text (engaging, persuasive, appropriate length for digital ads)",
-                        "call_to_action": "Strong CTA button text",
-                        "platform_optimized": "facebook",
-                        "offer_value_proposition": "The key value proposition highlighted in this variation"
-                    }}
-                ]
-            }}
-
-            Requirements:
-            - Use {tone} tone throughout
-            - Make it compelling for {product.target_country} market
-            - Include emotional triggers and logical benefits
-            - Ensure headlines are catchy and memorable
-            - CTAs should be action-oriented
-            - Each variation should have a different approach/angle
-            """
+            # Save to Firestore
+            creative_output = await self.creative_service.create_creative_output(user_id, creative_payload)
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            logger.info(f"Generated {len(ad_copies)} ad copy variations for product {product_id}")
+            return creative_output
+                
+        except Exception as e:
+            logger.error(f"Error generating ad copies: {str(e)}")
+            raise
+    
+    @single_flight()
+    @traced()
+    async def regenerate_ad_copy(self, user_id: str, output_id: str, index: int) -> Optional[CreativeOutput]:
+        """
+        Regenerate the ad copy at index of an existing creative output, in place
+        
+        Returns None if the output doesn't exist; raises IndexError for an index
+        outside its ad copies.
+        """
+        if not self.client:
+            raise Exception("OpenAI API key not configured")
+        
+        try:
+            output = await self.creative_service.get_creative_output(user_id, output_id)
+            if not output:
+                return None
+            if not 0 <= index < len(output.ad_copies):
+                raise IndexError(f"Ad copy {index} not found in creative output {output_id}")
+            
+            response = await self._create_completion(
+                "regenerate_ad_copy",
+                user_id=user_id,
                 messages=[
-                    {"role": "system", "content": f"You are an expert advertising copywriter specializing in {tone} tone and high-converting digital ad copy for various platforms."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=3000,
-                temperature=self.temperature
+                    self._ad_copy_system_message(output.tone or "professional"),
+                    {"role": "user", "content": self._build_ad_copy_regeneration_prompt(output, index)}
+                ]
             )
             
-            content = response.choices[0].message.content.strip()
-            
-            # Parse JSON response
             try:
-                creative_data = json.loads(content)
-                
-                # Create ad copy objects
-                ad_copies = []
-                for copy_data in creative_data.get("ad_copies", []):
-                    ad_copies.append(AdCopy(
-                        variation_name=copy_data.get("variation_name", ""),
-                        headline=copy_data.get("headline", ""),
-                        body_text=copy_data.get("body_text", ""),
-                        call_to_action=copy_data.get("call_to_action", ""),
-                        platform_optimized=copy_data.get("platform_optimized", "universal"),
-                        offer_value_proposition=copy_data.get("offer_value_proposition")
-                    ))
-                
-                # Create creative output
-                creative_payload = {
-                    "product_id": product_id,
-                    "creative_concept_title": creative_data.get("creative_concept_title", ""),
-                    "creative_concept_description": creative_data.get("creative_concept_description", ""),
-                    "target_audience_summary": creative_data.get("target_audience_summary", ""),
-                    "why_this_works": creative_data.get("why_this_works", ""),
-                    "ad_copies": ad_copies,
-                    "tone": tone
-                }
-                
-                # Save to Firestore
-                creative_output = await self.creative_service.create_creative_output(user_id, creative_payload)
-                
-                logger.info(f"Generated {len(ad_copies)} ad copy variations for product {product_id}")
-                return creative_output
-                
+                copy_data = json.loads(response.choices[0].message.content.strip())
             except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse creative output JSON: {str(e)}")
+                logger.error(f"Failed to parse ad copy JSON: {str(e)}")
                 raise Exception("Failed to parse AI response")
-                
+            if not copy_data.get("variation_name"):
+                copy_data["variation_name"] = output.ad_copies[index].variation_name
+            ad_copy = self._parse_ad_copy(copy_data)
+            
+            # Spliced into the copies as they are at write time, in a transaction
+            updated_output = await self.creative_service.replace_ad_copy(user_id, output_id, index, ad_copy.dict())
+            
+            logger.info(f"Regenerated ad copy {index} of creative output {output_id} ({response.model})")
+            return updated_output
+            
         except Exception as e:
-            logger.error(f"Error generating ad copies: {str(e)}")
+            logger.error(f"Error regenerating ad copy {index} of creative output {output_id}: {str(e)}")
             raise
     
-    async def enhance_product_analysis(self, user_id: str, product_id: str) -> Product:
+    @single_flight()
+    @traced()
+    async def enhance_product_analysis(self, user_id: str, product_id: str, force: bool = False) -> Product:
         """
         Generate enhanced AI analysis for a product including key selling points and audience insights
+        
+        Returns the product as is if its analysis was generated from the same
+        inputs and prompt version, unless force is set.
         """
         if not self.client:
             raise Exception("OpenAI API key not configured")
@@ -334,48 +789,24 @@ class AIService:
             # Get product details
             product = await self.product_service.get_product(user_id, product_id)
             if not product:
-                raise Exception("Product not found")
+                raise ProductNotFoundError("Product not found")
             
-            prompt = f"""
-            Analyze this product and provide enhanced marketing insights:
-
-            Product Name: {product.product_name}
-            Description: {product.what_is_it}
-            Price: ${product.price} {product.currency}
-            Target Country: {product.target_country}
-            Main Goal: {product.main_goal}
-            Product Description: {product.product_description or 'Not provided'}
-            Problem It Solves: {product.problem_it_solves or 'Not provided'}
-            Target Customers: {product.target_customers or 'Not provided'}
-
-            Please provide enhanced analysis in JSON format:
-            {{
-                "ai_analysis_summary": "A comprehensive 2-3 sentence analysis of the product's market position, competitive advantages, and overall potential",
-                "ai_target_audience_profile": "A detailed profile of the ideal customer including demographics, psychographics, behavior patterns, and motivations",
-                "ai_key_selling_points": [
-                    "First key selling point that differentiates this product",
-                    "Second unique value proposition", 
-                    "Third compelling reason to buy",
-                    "Fourth benefit or feature that stands out"
-                ]
-            }}
-
-            Focus on:
-            - Unique value propositions
-            - Competitive differentiation
-            - Market positioning opportunities
-            - Customer pain points addressed
-            - Psychological triggers for {product.target_country} market
-            """
+            prompt = self._build_analysis_prompt(product)
+            fingerprint = input_fingerprint("enhance_product_analysis", ANALYSIS_SYSTEM_PROMPT, prompt)
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            if not force and product.ai_analysis_summary and product.ai_analysis_fingerprint == fingerprint:
+                AI_ARTIFACT_REUSE.labels(operation="enhance_product_analysis", result="reused").inc()
+                logger.info(f"Reusing analysis of unchanged product {product_id}")
+                return product
+            AI_ARTIFACT_REUSE.labels(operation="enhance_product_analysis", result="forced" if force else "generated").inc()
+            
+            response = await self._create_completion(
+                "enhance_product_analysis",
+                user_id=user_id,
                 messages=[
-                    {"role": "system", "content": "You are a senior product marketing analyst with expertise in market positioning, customer psychology, and competitive analysis."},
+                    {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=self.temperature
+                ]
             )
             
             content = response.choices[0].message.content.strip()
@@ -388,7 +819,9 @@ class AIService:
                 updates = {
                     "ai_analysis_summary": analysis_data.get("ai_analysis_summary", ""),
                     "ai_target_audience_profile": analysis_data.get("ai_target_audience_profile", ""),
-                    "ai_key_selling_points": analysis_data.get("ai_key_selling_points", [])
+                    "ai_key_selling_points": analysis_data.get("ai_key_selling_points", []),
+                    "ai_analysis_model": response.model,
+                    "ai_analysis_fingerprint": fingerprint
                 }
                 
                 # Save updates to Firestore
@@ -0,0 +1,238 @@
+"""
+Cross-instance cache coherence through Firestore snapshot listeners
+
+With CACHE_COHERENCE=listeners, each instance watches the marketingStrategies
+and creativeOutputs subcollections of the users whose lookups it caches, and
+evicts the affected (user_id, product_id) entries when any instance (or any
+other writer) changes a document there. Local writes still invalidate
+immediately, so an instance always reads its own writes.
+
+A user's entries are only cached once their listeners have delivered the
+initial snapshot; until then lookups go to Firestore. Watches are dropped
+(with the user's entries) after CACHE_COHERENCE_IDLE_SECONDS without a cache
+fill, and the least recently active user is dropped beyond
+CACHE_COHERENCE_MAX_USERS, since every listener holds an open stream.
+The cache TTL remains a backstop for a listener that fails silently.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Hashable, List, Optional, Set
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.product import PRODUCT_STRATEGY_CACHE, LATEST_OUTPUT_CACHE
+from utils.cache import get_cache, set_admission_hook
+from utils.firestore import get_firestore_client
+from utils.metrics import CACHE_COHERENCE_INVALIDATIONS, CACHE_COHERENCE_WATCHED_USERS
+
+logger = logging.getLogger(__name__)
+
+# Watched subcollection -> cache of per-product lookups derived from it
+WATCHED_COLLECTIONS = {
+    "marketingStrategies": PRODUCT_STRATEGY_CACHE,
+    "creativeOutputs": LATEST_OUTPUT_CACHE
+}
+
+class _UserWatch:
+    """Snapshot listeners on one user's watched subcollections"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.listeners: List = []
+        self.live_collections: Set[str] = set()
+        self.last_used = time.monotonic()
+        self.stopped = False
+        # Listeners are opened and closed on executor threads
+        self._lock = threading.Lock()
+
+    @property
+    def live(self) -> bool:
+        return len(self.live_collections) == len(WATCHED_COLLECTIONS)
+
+    @property
+    def healthy(self) -> bool:
+        return all(listener.is_active for listener in list(self.listeners))
+
+    def start(self, callback) -> None:
+        """Open the listeners (blocking); raises if any fails, leaving none open"""
+        user_ref = get_firestore_client().collection("users").document(self.user_id)
+        with self._lock:
+            if self.stopped:
+                return
+            try:
+                for collection in WATCHED_COLLECTIONS:
+                    self.listeners.append(user_ref.collection(collection).on_snapshot(
+                        partial(callback, self, collection)
+                    ))
+            except Exception:
+                self._close_listeners()
+                raise
+
+    def stop(self) -> None:
+        """Close the listeners (blocking); a start still under way opens none"""
+        with self._lock:
+            self.stopped = True
+            self._close_listeners()
+
+    def _close_listeners(self) -> None:
+        for listener in self.listeners:
+            try:
+                listener.unsubscribe()
+            except Exception as e:
+                logger.debug(f"Error unsubscribing listener for user {self.user_id}: {e}")
+        self.listeners.clear()
+
+class CacheCoherence:
+    """
+    Keeps the per-product caches coherent with Firestore for active users
+
+    Bookkeeping happens on the event loop; opening and closing listeners
+    blocks on Firestore, so it runs in the loop's default executor.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_users: int = 100, idle_seconds: float = 900):
+        self.loop = loop
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self._users: "OrderedDict[str, _UserWatch]" = OrderedDict()
+        self._cache_names = set(WATCHED_COLLECTIONS.values())
+
+    def admit(self, cache_name: str, key: Hashable) -> bool:
+        """Admission hook for utils.cache: may a value for key be cached now?"""
+        if cache_name not in self._cache_names:
+            return True
+        user_id = key[0]
+        watch = self._users.get(user_id)
+        if watch is None or not watch.healthy:
+            self._watch(user_id)
+            return False
+        watch.last_used = time.monotonic()
+        self._users.move_to_end(user_id)
+        return watch.live
+
+    def _watch(self, user_id: str) -> None:
+        """Record a watch for user_id and open its listeners in the background"""
+        self._unwatch(user_id)
+        while len(self._users) >= self.max_users:
+            self._unwatch(next(iter(self._users)))
+
+        # Until its listeners deliver initial snapshots the watch isn't live,
+        # so nothing is cached for the user and admit() doesn't start another
+        watch = _UserWatch(user_id)
+        self._users[user_id] = watch
+        CACHE_COHERENCE_WATCHED_USERS.inc()
+        future = self.loop.run_in_executor(None, watch.start, self._on_snapshot)
+        future.add_done_callback(partial(self._started, watch))
+
+    def _started(self, watch: _UserWatch, future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is None:
+            return
+        logger.warning(f"Failed to watch caches of user {watch.user_id}: {future.exception()}")
+        if self._users.get(watch.user_id) is watch:
+            del self._users[watch.user_id]
+            CACHE_COHERENCE_WATCHED_USERS.dec()
+
+    def _unwatch(self, user_id: str) -> Optional[asyncio.Future]:
+        """Forget user_id's watch and close its listeners in the background"""
+        watch = self._users.pop(user_id, None)
+        if watch is None:
+            return None
+        CACHE_COHERENCE_WATCHED_USERS.dec()
+        # Nothing keeps this user's entries coherent any more
+        self._evict_user(user_id)
+        return self.loop.run_in_executor(None, watch.stop)
+
+    def _evict_user(self, user_id: str, cache_names=None) -> None:
+        for cache_name in cache_names or self._cache_names:
+            get_cache(cache_name).invalidate_where(lambda key: key[0] == user_id)
+
+    def _on_snapshot(self, watch: _UserWatch, collection: str, docs, changes, read_time) -> None:
+        # Runs on the listener's thread: collect what changed, apply it on the event loop
+        initial = collection not in watch.live_collections
+        product_ids = set()
+        for change in changes:
+            data = change.document.to_dict() or {}
+            if data.get("product_id"):
+                product_ids.add(data["product_id"])
+        self.loop.call_soon_threadsafe(self._apply, watch, collection, product_ids, initial)
+
+    def _apply(self, watch: _UserWatch, collection: str, product_ids: Set[str], initial: bool) -> None:
+        if self._users.get(watch.user_id) is not watch:
+            return
+        cache_name = WATCHED_COLLECTIONS[collection]
+        if initial:
+            # Anything cached before the listener was current may have missed changes
+            watch.live_collections.add(collection)
+            self._evict_user(watch.user_id, [cache_name])
+            return
+        cache = get_cache(cache_name)
+        for product_id in product_ids:
+            cache.invalidate((watch.user_id, product_id))
+        CACHE_COHERENCE_INVALIDATIONS.labels(cache=cache_name).inc(len(product_ids))
+
+    def sweep(self) -> None:
+        """Drop idle users and restart watches whose listeners failed"""
+        now = time.monotonic()
+        for user_id, watch in list(self._users.items()):
+            if now - watch.last_used > self.idle_seconds:
+                self._unwatch(user_id)
+            elif not watch.healthy:
+                logger.warning(f"Cache listener for user {user_id} stopped, re-watching")
+                self._watch(user_id)
+
+    async def close(self) -> None:
+        """Close all listeners and wait for them to stop"""
+        stopping = [self._unwatch(user_id) for user_id in list(self._users)]
+        await asyncio.gather(*stopping, return_exceptions=True)
+
+_coherence: Optional[CacheCoherence] = None
+_sweeper: Optional[asyncio.Task] = None
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+async def _sweep_periodically(coherence: CacheCoherence, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            coherence.sweep()
+        except Exception as e:
+            logger.warning(f"Cache coherence sweep failed: {e}")
+
+async def start_cache_coherence() -> Optional[CacheCoherence]:
+    """Enable coherence if CACHE_COHERENCE=listeners (called from the app lifespan)"""
+    global _coherence, _sweeper
+    mode = os.getenv("CACHE_COHERENCE", "none").strip().lower()
+    if mode in ("", "none", "off", "false"):
+        return None
+    if mode != "listeners":
+        logger.warning(f"Unknown CACHE_COHERENCE '{mode}', cache coherence disabled")
+        return None
+
+    _coherence = CacheCoherence(
+        asyncio.get_running_loop(),
+        max_users=int(_env_number("CACHE_COHERENCE_MAX_USERS", 100)),
+        idle_seconds=_env_number("CACHE_COHERENCE_IDLE_SECONDS", 900)
+    )
+    set_admission_hook(_coherence.admit)
+    _sweeper = asyncio.create_task(_sweep_periodically(_coherence, interval=60))
+    logger.info("Cache coherence enabled (Firestore snapshot listeners)")
+    return _coherence
+
+async def stop_cache_coherence() -> None:
+    """Stop all listeners (on shutdown)"""
+    global _coherence, _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        _sweeper = None
+    if _coherence is not None:
+        set_admission_hook(None)
+        await _coherence.close()
+        _coherence = None
@@ -0,0 +1,186 @@
+"""
+Task-aware OpenAI model routing
+
+Each AI operation has a route: a model tier plus its own max_tokens,
+temperature and latency budget. Tiers map to models through the environment,
+and so do the operations' tiers, so quality can be traded for latency per
+endpoint without a deploy:
+
+    AI_MODEL_FAST=gpt-4o-mini
+    AI_MODEL_STANDARD=gpt-4o-mini
+    AI_MODEL_QUALITY=gpt-4o
+    AI_ROUTE_GENERATE_AD_COPIES=quality       # AI_ROUTE_<OPERATION>=<tier>
+
+Requests degrade one tier at a time towards "fast" under load, or while an
+operation's recent latency on its tier (EWMA) exceeds the route's latency
+budget. Load is the AI scheduler being saturated (every slot taken or
+interactive work queued), or completions in flight reaching
+AI_DEGRADE_MAX_IN_FLIGHT if that is set. A latency
+degradation lasts AI_DEGRADE_COOLDOWN_SECONDS, after which the tier is
+tried again.
+"""
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional, Tuple
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import MODEL_ROUTING_DECISIONS, OPENAI_COMPLETIONS_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Fastest first; degradation moves towards index 0
+TIERS = ("fast", "standard", "quality")
+
+DEFAULT_TIER_MODELS = {
+    "fast": "gpt-4o-mini",
+    "standard": "gpt-4o-mini",
+    "quality": "gpt-4o-mini"
+}
+
+@dataclass(frozen=True)
+class Route:
+    """How an operation is served: tier, generation settings and latency budget (seconds)"""
+    tier: str
+    max_tokens: int
+    temperature: float
+    latency_budget: float
+
+DEFAULT_ROUTES = {
+    "autofill_product_details": Route("fast", max_tokens=1000, temperature=0.7, latency_budget=10.0),
+    "enhance_product_analysis": Route("standard", max_tokens=2000, temperature=0.7, latency_budget=25.0),
+    "generate_marketing_strategy": Route("quality", max_tokens=3000, temperature=0.7, latency_budget=40.0),
+    "generate_ad_copies": Route("quality", max_tokens=3000, temperature=0.7, latency_budget=40.0),
+    # Fanned-out ad copies: one concept, then one completion per variation
+    "generate_ad_concept": Route("quality", max_tokens=800, temperature=0.7, latency_budget=15.0),
+    "generate_ad_copy_variation": Route("quality", max_tokens=800, temperature=0.7, latency_budget=15.0),
+    # Higher temperature: the user asked for something other than the previous attempt
+    "regenerate_ad_copy": Route("quality", max_tokens=800, temperature=0.9, latency_budget=15.0)
+}
+DEFAULT_ROUTE = Route("standard", max_tokens=2000, temperature=0.7, latency_budget=30.0)
+
+@dataclass(frozen=True)
+class ModelChoice:
+    """The model selected for one completion, and why"""
+    operation: str
+    tier: str
+    model: str
+    max_tokens: int
+    temperature: float
+    reason: str
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+class ModelRouter:
+    """Selects a model per operation and tracks load and latency to degrade tiers"""
+
+    def __init__(
+        self,
+        tier_models: Optional[Dict[str, str]] = None,
+        routes: Optional[Dict[str, Route]] = None,
+        max_in_flight: Optional[int] = None,
+        cooldown_seconds: Optional[float] = None,
+        ewma_alpha: float = 0.3,
+        min_samples: int = 3,
+        saturated: Optional[Callable[[], bool]] = None
+    ):
+        self.tier_models = dict(tier_models or {
+            tier: os.getenv(f"AI_MODEL_{tier.upper()}", model) for tier, model in DEFAULT_TIER_MODELS.items()
+        })
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        if routes is None:
+            for operation, route in self.routes.items():
+                tier = os.getenv(f"AI_ROUTE_{operation.upper()}", "").strip().lower()
+                if tier in TIERS:
+                    self.routes[operation] = replace(route, tier=tier)
+                elif tier:
+                    logger.warning(f"Unknown tier '{tier}' for {operation}, using '{route.tier}'")
+        # Completions in flight that count as load on their own (0: only the saturated() signal)
+        self.max_in_flight = max_in_flight if max_in_flight is not None else int(_env_number("AI_DEGRADE_MAX_IN_FLIGHT", 0))
+        # Load signal from whatever admits completions (the AI scheduler)
+        self.saturated = saturated
+        self.cooldown_seconds = cooldown_seconds if cooldown_seconds is not None else _env_number("AI_DEGRADE_COOLDOWN_SECONDS", 60)
+        self.ewma_alpha = ewma_alpha
+        # A single slow completion is not a trend
+        self.min_samples = min_samples
+
+        self.in_flight = 0
+        # (operation, tier) -> (EWMA of completion latency, samples), and end of its degradation
+        self._latency: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._degraded_until: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def default_model(self) -> str:
+        return self.tier_models["standard"]
+
+    def route(self, operation: str) -> Route:
+        return self.routes.get(operation, DEFAULT_ROUTE)
+
+    def select(self, operation: str) -> ModelChoice:
+        """Choose the model for one completion of operation"""
+        route = self.route(operation)
+        index = TIERS.index(route.tier)
+        reason = "primary"
+
+        now = time.monotonic()
+        saturated = self.saturated is not None and self.saturated()
+        with self._lock:
+            # Latency: skip tiers this operation is currently too slow on
+            while index > 0 and self._degraded_until.get((operation, TIERS[index]), 0) > now:
+                index -= 1
+                reason = "latency"
+            # Load: one step down while the pool of completions is saturated
+            if index > 0 and (saturated or 0 < self.max_in_flight <= self.in_flight):
+                index -= 1
+                reason = "load"
+
+        tier = TIERS[index]
+        MODEL_ROUTING_DECISIONS.labels(operation=operation, tier=tier, reason=reason).inc()
+        return ModelChoice(
+            operation=operation,
+            tier=tier,
+            model=self.tier_models[tier],
+            max_tokens=route.max_tokens,
+            temperature=route.temperature,
+            reason=reason
+        )
+
+    def started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+        OPENAI_COMPLETIONS_IN_FLIGHT.inc()
+
+    def finished(self, choice: ModelChoice, duration: float) -> None:
+        """Record a completed (or failed) completion's latency on its tier"""
+        key = (choice.operation, choice.tier)
+        budget = self.route(choice.operation).latency_budget
+        with self._lock:
+            self.in_flight -= 1
+            previous, samples = self._latency.get(key, (duration, 0))
+            latency = previous + self.ewma_alpha * (duration - previous)
+            samples += 1
+            if samples >= self.min_samples and latency > budget and choice.tier != TIERS[0]:
+                # Back off this tier, then try it afresh
+                self._degraded_until[key] = time.monotonic() + self.cooldown_seconds
+                self._latency.pop(key, None)
+                logger.warning(
+                    f"{choice.operation} on {choice.tier} ({choice.model}) averaging {latency:.1f}s "
+                    f"over its {budget:.0f}s budget, degrading for {self.cooldown_seconds:.0f}s"
+                )
+            else:
+                self._latency[key] = (latency, samples)
+        OPENAI_COMPLETIONS_IN_FLIGHT.dec()
+
+    def describe(self) -> Dict[str, Dict[str, str]]:
+        """Current operation -> tier/model mapping (for health checks)"""
+        return {
+            operation: {"tier": route.tier, "model": self.tier_models[route.tier]}
+            for operation, route in self.routes.items()
+        }
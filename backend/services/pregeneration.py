@@ -0,0 +1,137 @@
+"""
+Speculative pre-generation of product analysis and marketing strategy
+
+With PREGENERATION_ENABLED, creating a product schedules a background job
+that runs enhance_product_analysis and then generate_marketing_strategy for
+it, so both are usually stored (and reused through their input fingerprints)
+by the time the user asks for them. A user request arriving while a step is
+running joins that completion instead of starting another.
+
+Jobs are low priority: at most PREGENERATION_MAX_CONCURRENT run at once,
+their completions are scheduled in the background class of the AI scheduler
+(behind interactive work, outside its reserved slots), and a job is dropped
+if the product's inputs change or it is deleted before a step starts. A
+completion already under way is left to finish, since a user request may
+share it; if the product was deleted meanwhile, its result isn't stored.
+"""
+import os
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.providers import get_ai_service, get_product_service
+from services.ai_scheduler import BACKGROUND, work_priority
+from models.product import ProductNotFoundError
+from utils.metrics import PREGENERATION_JOBS
+
+logger = logging.getLogger(__name__)
+
+# Steps in the order they run, as AIService method names
+PREGENERATION_STEPS = ("enhance_product_analysis", "generate_marketing_strategy")
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def pregeneration_enabled() -> bool:
+    return os.getenv("PREGENERATION_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+
+class _Stale(Exception):
+    """The product changed or disappeared since the job was scheduled"""
+
+class Pregenerator:
+    """Background pre-generation jobs by (user_id, product_id)"""
+
+    def __init__(self, max_concurrent: int = 2, max_pending: int = 100, delay: float = 1.0):
+        self.max_pending = max_pending
+        self.delay = delay
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+        self._jobs: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def schedule(self, user_id: str, product) -> bool:
+        """Start a job for a freshly created product; False if it was not scheduled"""
+        ai_service = get_ai_service()
+        if not ai_service.client:
+            return False
+        key = (user_id, product.id)
+        if key in self._jobs:
+            return False
+        if len(self._jobs) >= self.max_pending:
+            PREGENERATION_JOBS.labels(step="none", outcome="dropped").inc()
+            logger.warning(f"Pre-generation queue full, skipping product {product.id}")
+            return False
+
+        fingerprints = ai_service.product_input_fingerprints(product)
+        with work_priority(BACKGROUND):
+            # The task (and single-flight calls it starts) inherit the priority
+            task = asyncio.create_task(self._run(user_id, product.id, fingerprints))
+        self._jobs[key] = task
+        task.add_done_callback(lambda _: self._done(key, task))
+        return True
+
+    def cancel(self, user_id: str, product_id: str) -> None:
+        """Drop the product's job (it was deleted)"""
+        task = self._jobs.pop((user_id, product_id), None)
+        if task is not None:
+            task.cancel()
+
+    def _done(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if self._jobs.get(key) is task:
+            del self._jobs[key]
+
+    async def close(self) -> None:
+        """Cancel all jobs (on shutdown)"""
+        tasks = list(self._jobs.values())
+        self._jobs.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, user_id: str, product_id: str, fingerprints: Dict[str, str]) -> None:
+        step = "none"
+        try:
+            # Let the create response (and the client's follow-up reads) go first
+            await asyncio.sleep(self.delay)
+            async with self._slots:
+                for step in PREGENERATION_STEPS:
+                    await self._check_unchanged(user_id, product_id, fingerprints)
+                    # Same arguments as the routes, so a user request joins this flight
+                    await getattr(get_ai_service(), step)(user_id=user_id, product_id=product_id, force=False)
+                    PREGENERATION_JOBS.labels(step=step, outcome="completed").inc()
+        except asyncio.CancelledError:
+            PREGENERATION_JOBS.labels(step=step, outcome="cancelled").inc()
+            raise
+        except (_Stale, ProductNotFoundError):
+            PREGENERATION_JOBS.labels(step=step, outcome="stale").inc()
+            logger.info(f"Dropped pre-generation for changed product {product_id}")
+        except Exception as e:
+            PREGENERATION_JOBS.labels(step=step, outcome="failed").inc()
+            logger.warning(f"Pre-generation {step} failed for product {product_id}: {str(e)}")
+
+    async def _check_unchanged(self, user_id: str, product_id: str, fingerprints: Dict[str, str]) -> None:
+        product = await get_product_service().get_product(user_id, product_id)
+        if product is None or get_ai_service().product_input_fingerprints(product) != fingerprints:
+            raise _Stale(product_id)
+
+_pregenerator: Optional[Pregenerator] = None
+
+def get_pregenerator() -> Optional[Pregenerator]:
+    """Process-wide pregenerator, or None unless PREGENERATION_ENABLED"""
+    global _pregenerator
+    if _pregenerator is None and pregeneration_enabled():
+        _pregenerator = Pregenerator(
+            max_concurrent=int(_env_number("PREGENERATION_MAX_CONCURRENT", 2)),
+            max_pending=int(_env_number("PREGENERATION_MAX_PENDING", 100)),
+            delay=_env_number("PREGENERATION_DELAY_SECONDS", 1.0)
+        )
+    return _pregenerator
+
+async def close_pregenerator() -> None:
+    """Cancel pending jobs (on shutdown)"""
+    global _pregenerator
+    pregenerator, _pregenerator = _pregenerator, None
+    if pregenerator is not None:
+        await pregenerator.close()
@@ -0,0 +1,91 @@
+"""
+Lazily constructed, process-wide service instances
+
+Routes and services get their dependencies here instead of constructing them
+at import time, so importing the app does no credential discovery or client
+setup. Each service is built on first use, or ahead of traffic by
+warm_services() from the app lifespan.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.product import ProductService
+from models.visual_library import VisualLibraryService
+from models.creative_output import CreativeOutputService
+from models.marketing_strategy import MarketingStrategyService
+from services.storage_service import StorageService
+from utils.firestore import close_firestore_client
+
+logger = logging.getLogger(__name__)
+
+_instances: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+def _get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+def get_product_service() -> ProductService:
+    return _get_or_create("product", ProductService)
+
+def get_visual_service() -> VisualLibraryService:
+    return _get_or_create("visual", VisualLibraryService)
+
+def get_creative_service() -> CreativeOutputService:
+    return _get_or_create("creative", CreativeOutputService)
+
+def get_strategy_service() -> MarketingStrategyService:
+    return _get_or_create("strategy", MarketingStrategyService)
+
+def get_storage_service() -> StorageService:
+    return _get_or_create("storage", StorageService)
+
+def get_ai_service():
+    # Imported here: services.ai_service depends on this module
+    from services.ai_service import AIService
+    return _get_or_create("ai", AIService)
+
+async def warm_services() -> None:
+    """Construct all services off the event loop so the first requests don't pay for it"""
+    for provider in (get_product_service, get_visual_service, get_creative_service,
+                     get_strategy_service, get_storage_service, get_ai_service):
+        try:
+            await asyncio.to_thread(provider)
+        except Exception as e:
+            logger.warning(f"Failed to warm {provider.__name__}: {e}")
+
+    # Connection setup to the OpenAI API, so the first generation doesn't pay for it
+    ai_service = _instances.get("ai")
+    if ai_service is not None:
+        try:
+            await ai_service.warm_up()
+        except Exception as e:
+            logger.warning(f"Failed to warm OpenAI connections: {e}")
+
+async def close_services() -> None:
+    """Release clients held by the services (on shutdown)"""
+    with _lock:
+        instances = dict(_instances)
+        _instances.clear()
+
+    ai_service = instances.get("ai")
+    if ai_service is not None and ai_service.client is not None:
+        await ai_service.client.close()
+
+    storage_service = instances.get("storage")
+    if storage_service is not None:
+        storage_service.client.close()
+
+    close_firestore_client()
@@ -2,16 +2,32 @@
 Cloud Storage service for file upload and management
 """
 import os
+import re
 import uuid
+import asyncio
 import logging
+import urllib.parse
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, BinaryIO, List
-from google.cloud import storage
+from typing import Optional, Dict, Any, BinaryIO, List, Iterator, AsyncIterator, Tuple, TYPE_CHECKING
 from fastapi import HTTPException, status, UploadFile
 import mimetypes
 
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import observe_gcs, record_gcs_bytes
+from utils.tracing import traced
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
 logger = logging.getLogger(__name__)
 
+# Object names written by this service end in "<timestamp>_<uuid4><ext>" and are never overwritten
+IMMUTABLE_FILENAME_PATTERN = re.compile(
+    r"\d{8}_\d{6}_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.[A-Za-z0-9]+)?$"
+)
+
 class StorageService:
     """Service for Google Cloud Storage operations"""
 
@@ -21,8 +37,13 @@ class StorageService:
     allowed_image_types = {'image/jpeg', 'image/jpg', 'image/png', 'image/webp'}
     allowed_video_types = {'video/mp4', 'video/webm', 'video/mov'}
     allowed_document_types = {'application/pdf', 'text/plain', 'application/json'}
+    download_chunk_size = 2 * 1024 * 1024
+    max_delete_concurrency = 16
+    max_upload_concurrency = 8
 
     def __init__(self):
+        # Deferred import: google.cloud.storage pulls in google-auth and requests
+        from google.cloud import storage
         self.client = storage.Client()
         self.project_id = os.getenv('GCP_PROJECT_ID', 'nexsy-authv1')
 
@@ -61,7 +82,9 @@ class StorageService:
         """Resolve a bucket name by prefix (handles random suffix)."""
         try:
             # Prefer gcloud listed names via API client
-            for bucket in self.client.list_buckets(project=self.project_id):
+            with observe_gcs("list_buckets"):
+                buckets = list(self.client.list_buckets(project=self.project_id))
+            for bucket in buckets:
                 name = getattr(bucket, 'name', str(bucket))
                 if name and name.startswith(prefix):
                     return name
@@ -79,7 +102,7 @@ class StorageService:
         self.allowed_video_types = {'video/mp4', 'video/webm', 'video/mov'}
         self.allowed_document_types = {'application/pdf', 'text/plain', 'application/json'}
     
-    def _get_bucket(self, bucket_type: str) -> storage.Bucket:
+    def _get_bucket(self, bucket_type: str) -> "storage.Bucket":
         """Get bucket by type"""
         # Resolve and cache bucket names lazily (skip if explicitly set via env)
         if not self.assets_bucket_name:
@@ -108,6 +131,46 @@ class StorageService:
         
         return self.client.bucket(bucket_name)
     
+    def _get_bucket_for_path(self, file_path: str) -> "storage.Bucket":
+        """Get the bucket a user-scoped file path is stored in"""
+        if "/generated/" in file_path:
+            return self._get_bucket('generated')
+        elif "/reports/" in file_path:
+            return self._get_bucket('reports')
+        return self._get_bucket('assets')
+    
+    def _parse_file_reference(self, file_ref: str) -> Tuple[Optional[str], str]:
+        """Split a gs://bucket/path URL or plain object path into (bucket_name, file_path)"""
+        if file_ref.startswith("gs://"):
+            bucket_name, _, file_path = file_ref[len("gs://"):].partition("/")
+            return bucket_name, file_path
+        return None, file_ref.lstrip("/")
+    
+    @staticmethod
+    def extract_file_path(asset_url: str, user_id: str) -> Optional[str]:
+        """Recover the object path from a gs:// URL, signed URL or plain path owned by user_id"""
+        if not asset_url:
+            return None
+        
+        if "gs://" in asset_url:
+            # Extract path from gs:// URL
+            parts = asset_url.replace("gs://", "").split("/", 1)
+            if len(parts) > 1:
+                return parts[1]
+        elif f"users/{user_id}/" in asset_url:
+            # Extract path from signed URL or direct path
+            parsed_url = urllib.parse.urlparse(asset_url)
+            path_parts = parsed_url.path.split("/")
+            for i, part in enumerate(path_parts):
+                if part == "users" and i + 1 < len(path_parts) and path_parts[i + 1] == user_id:
+                    return "/".join(path_parts[i:])
+        
+        return None
+    
+    def is_immutable_path(self, file_path: str) -> bool:
+        """Whether the object at this path is write-once (timestamped, uuid-suffixed name)"""
+        return bool(IMMUTABLE_FILENAME_PATTERN.search(file_path))
+    
     def _validate_file(self, file: UploadFile, file_type: str) -> None:
         """Validate file type and size"""
         if not file.content_type:
@@ -166,6 +229,7 @@ class StorageService:
         
         return path
     
+    @traced()
     async def upload_file(self, file: UploadFile, user_id: str, file_type: str = "image", 
                          product_id: Optional[str] = None, 
                          bucket_type: str = "assets") -> Dict[str, Any]:
@@ -186,41 +250,7 @@ class StorageService:
             # Validate file
             self._validate_file(file, file_type)
             
-            # Generate secure file path
-            file_path = self._generate_file_path(user_id, file_type, product_id, file.filename)
-            
-            # Get bucket
-            bucket = self._get_bucket(bucket_type)
-            blob = bucket.blob(file_path)
-            
-            # Set metadata
-            blob.metadata = {
-                "user_id": user_id,
-                "file_type": file_type,
-                "original_filename": file.filename or "unknown",
-                "upload_timestamp": datetime.utcnow().isoformat(),
-                "product_id": product_id or ""
-            }
-            
-            # Set content type
-            blob.content_type = file.content_type
-            
-            # Upload file
-            blob.upload_from_file(file.file, content_type=file.content_type)
-            
-            # Get file info (no signed URL here; proxy download endpoint will be used)
-            file_info = {
-                "file_path": file_path,
-                "bucket_name": bucket.name,
-                "file_name": file.filename,
-                "file_size": blob.size,
-                "content_type": file.content_type,
-                "uploaded_at": datetime.utcnow().isoformat(),
-                "public_url": f"gs://{bucket.name}/{file_path}"
-            }
-            
-            logger.info(f"Successfully uploaded file {file_path} for user {user_id}")
-            return file_info
+            return self._store_upload(file, user_id, file_type, product_id, bucket_type)
             
         except Exception as e:
             logger.error(f"Error uploading file for user {user_id}: {str(e)}")
@@ -229,6 +259,97 @@ class StorageService:
                 detail=f"File upload failed: {str(e)}"
             )
     
+    @traced()
+    def _store_upload(self, file: UploadFile, user_id: str, file_type: str,
+                      product_id: Optional[str], bucket_type: str) -> Dict[str, Any]:
+        """Write a validated upload to its bucket (blocking GCS call)"""
+        # Generate secure file path
+        file_path = self._generate_file_path(user_id, file_type, product_id, file.filename)
+        
+        # Get bucket
+        bucket = self._get_bucket(bucket_type)
+        blob = bucket.blob(file_path)
+        
+        # Set metadata
+        blob.metadata = {
+            "user_id": user_id,
+            "file_type": file_type,
+            "original_filename": file.filename or "unknown",
+            "upload_timestamp": datetime.utcnow().isoformat(),
+            "product_id": product_id or ""
+        }
+        
+        # Set content type
+        blob.content_type = file.content_type
+        
+        # Upload file
+        with observe_gcs("upload"):
+            blob.upload_from_file(file.file, content_type=file.content_type)
+        record_gcs_bytes("upload", blob.size)
+        
+        # Get file info (no signed URL here; proxy download endpoint will be used)
+        file_info = {
+            "file_path": file_path,
+            "bucket_name": bucket.name,
+            "file_name": file.filename,
+            "file_size": blob.size,
+            "content_type": file.content_type,
+            "uploaded_at": datetime.utcnow().isoformat(),
+            "public_url": f"gs://{bucket.name}/{file_path}"
+        }
+        
+        logger.info(f"Successfully uploaded file {file_path} for user {user_id}")
+        return file_info
+    
+    async def upload_files(self, files: List[UploadFile], user_id: str, file_type: str = "image",
+                           product_id: Optional[str] = None, bucket_type: str = "assets",
+                           max_concurrency: Optional[int] = None
+                           ) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Upload many files concurrently, yielding results as each one finishes
+        
+        Args:
+            files: FastAPI UploadFile objects
+            user_id: ID of the user uploading the files
+            file_type: Type of file (image, video, document)
+            product_id: Optional product ID for organizing files
+            bucket_type: Type of bucket (assets, generated, templates, reports)
+            max_concurrency: Maximum simultaneous GCS uploads
+            
+        Yields:
+            tuple: (index in files, file info or None, error message or None)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_upload_concurrency)
+        
+        async def _upload(index: int, file: UploadFile):
+            try:
+                self._validate_file(file, file_type)
+                async with semaphore:
+                    file_info = await asyncio.to_thread(
+                        self._store_upload, file, user_id, file_type, product_id, bucket_type
+                    )
+                return index, file_info, None
+            except HTTPException as e:
+                return index, None, str(e.detail)
+            except Exception as e:
+                logger.error(f"Error uploading file {file.filename} for user {user_id}: {str(e)}")
+                return index, None, "File upload failed"
+        
+        # Resolve bucket names once before fanning out; failures resurface per file
+        try:
+            await asyncio.to_thread(self._get_bucket, bucket_type)
+        except Exception as e:
+            logger.error(f"Error resolving {bucket_type} bucket: {e}")
+        
+        tasks = [asyncio.create_task(_upload(index, file)) for index, file in enumerate(files)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    @traced()
     async def upload_generated_content(self, content: bytes, user_id: str, product_id: str,
                                      content_type: str, file_extension: str, 
                                      content_category: str = "ai_generated") -> Dict[str, Any]:
@@ -270,7 +391,9 @@ class StorageService:
             blob.content_type = content_type
             
             # Upload content
-            blob.upload_from_string(content, content_type=content_type)
+            with observe_gcs("upload"):
+                blob.upload_from_string(content, content_type=content_type)
+            record_gcs_bytes("upload", len(content))
             
             # Generate signed URL
             signed_url = blob.generate_signed_url(
@@ -296,6 +419,7 @@ class StorageService:
             logger.error(f"Error uploading generated content for user {user_id}: {str(e)}")
             raise
     
+    @traced()
     async def generate_signed_url(self, file_path: str, user_id: str, 
                                  expiration_hours: int = 24) -> str:
         """
@@ -318,17 +442,13 @@ class StorageService:
                 )
             
             # Determine bucket based on file path
-            if "/generated/" in file_path:
-                bucket = self._get_bucket('generated')
-            elif "/reports/" in file_path:
-                bucket = self._get_bucket('reports')
-            else:
-                bucket = self._get_bucket('assets')
-            
+            bucket = self._get_bucket_for_path(file_path)
             blob = bucket.blob(file_path)
             
             # Check if file exists
-            if not blob.exists():
+            with observe_gcs("exists"):
+                exists = blob.exists()
+            if not exists:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="File not found"
@@ -347,6 +467,7 @@ class StorageService:
             logger.error(f"Error generating signed URL for {file_path}: {str(e)}")
             raise
     
+    @traced()
     async def delete_file(self, file_path: str, user_id: str) -> bool:
         """
         Delete a file from Cloud Storage
@@ -367,17 +488,12 @@ class StorageService:
                 )
             
             # Determine bucket
-            if "/generated/" in file_path:
-                bucket = self._get_bucket('generated')
-            elif "/reports/" in file_path:
-                bucket = self._get_bucket('reports')
-            else:
-                bucket = self._get_bucket('assets')
-            
+            bucket = self._get_bucket_for_path(file_path)
             blob = bucket.blob(file_path)
             
             # Delete file
-            blob.delete()
+            with observe_gcs("delete"):
+                blob.delete()
             
             logger.info(f"Successfully deleted file {file_path} for user {user_id}")
             return True
@@ -386,29 +502,201 @@ class StorageService:
             logger.error(f"Error deleting file {file_path} for user {user_id}: {str(e)}")
             raise
     
+    @traced()
+    async def delete_files(self, file_paths: List[str], user_id: str) -> Dict[str, str]:
+        """
+        Delete many files from Cloud Storage concurrently
+        
+        Args:
+            file_paths: Paths to the files in Cloud Storage
+            user_id: ID of the user requesting deletion
+            
+        Returns:
+            dict: file_path -> "deleted", "not_found", "forbidden" or "error"
+        """
+        results: Dict[str, str] = {}
+        semaphore = asyncio.Semaphore(self.max_delete_concurrency)
+        
+        from google.api_core.exceptions import NotFound
+        
+        def _delete_blob(file_path: str) -> str:
+            try:
+                with observe_gcs("delete"):
+                    self._get_bucket_for_path(file_path).blob(file_path).delete()
+                return "deleted"
+            except NotFound:
+                return "not_found"
+        
+        async def _delete(file_path: str) -> None:
+            # Validate user has access to this file (a prefix check: the path may contain other users' ids)
+            if not file_path.startswith(f"users/{user_id}/") or ".." in file_path.split("/"):
+                results[file_path] = "forbidden"
+                return
+            async with semaphore:
+                try:
+                    results[file_path] = await asyncio.to_thread(_delete_blob, file_path)
+                except Exception as e:
+                    logger.error(f"Error deleting file {file_path} for user {user_id}: {str(e)}")
+                    results[file_path] = "error"
+        
+        # Resolve bucket names once up front rather than racing in every worker thread
+        self._get_bucket('assets')
+        
+        await asyncio.gather(*(_delete(path) for path in dict.fromkeys(file_paths)))
+        
+        deleted = sum(1 for result in results.values() if result == "deleted")
+        logger.info(f"Deleted {deleted} of {len(results)} files for user {user_id}")
+        return results
+    
+    @traced()
+    async def get_file_for_download(self, file_ref: str, user_id: str) -> "storage.Blob":
+        """
+        Resolve a file for streaming download
+        
+        Args:
+            file_ref: Object path or gs:// URL of the file
+            user_id: ID of the user requesting access
+            
+        Returns:
+            storage.Blob: Blob with size, etag, updated, generation and content type loaded
+        """
+        try:
+            bucket_name, file_path = self._parse_file_reference(file_ref)
+            
+            # Validate user has access to this file
+            if not file_path.startswith(f"users/{user_id}/") or ".." in file_path.split("/"):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Access denied: File is outside your scope"
+                )
+            
+            bucket = self._get_bucket_for_path(file_path)
+            
+            # gs:// URLs must point at one of our own buckets
+            if bucket_name and bucket_name != bucket.name:
+                known_buckets = {
+                    self.assets_bucket_name,
+                    self.generated_bucket_name,
+                    self.templates_bucket_name,
+                    self.reports_bucket_name
+                }
+                if bucket_name not in known_buckets:
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail="Access denied: Unknown bucket"
+                    )
+                bucket = self.client.bucket(bucket_name)
+            
+            # Single metadata request; returns None when the object does not exist
+            with observe_gcs("get_metadata"):
+                blob = bucket.get_blob(file_path)
+            if blob is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="File not found"
+                )
+            
+            return blob
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error resolving file {file_ref} for user {user_id}: {str(e)}")
+            raise
+    
+    def iter_file_chunks(self, blob: "storage.Blob", start: int, end: int,
+                         chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Stream an inclusive byte range of a blob in fixed-size chunks
+        
+        Each chunk is a separate ranged GCS read pinned to the blob's generation, so
+        memory per request stays bounded by chunk_size and a concurrent overwrite
+        cannot splice two object versions into one response.
+        
+        Args:
+            blob: Blob returned by get_file_for_download
+            start: First byte offset
+            end: Last byte offset (inclusive)
+            chunk_size: Bytes per GCS read (defaults to download_chunk_size)
+        """
+        chunk_size = chunk_size or self.download_chunk_size
+        position = start
+        while position <= end:
+            chunk_end = min(position + chunk_size - 1, end)
+            with observe_gcs("download"):
+                chunk = blob.download_as_bytes(
+                    start=position,
+                    end=chunk_end,
+                    if_generation_match=blob.generation
+                )
+            record_gcs_bytes("download", len(chunk))
+            yield chunk
+            position = chunk_end + 1
+    
+    def _build_list_prefix(self, user_id: str, product_id: Optional[str] = None,
+                           file_type: Optional[str] = None, prefix: str = "") -> str:
+        """Build a user-scoped listing prefix matching the layout of _generate_file_path"""
+        if ".." in prefix.split("/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid prefix"
+            )
+        
+        path = f"users/{user_id}/"
+        if product_id:
+            path += f"products/{product_id}/"
+            if file_type == "generated":
+                path += "generated/"
+            elif file_type:
+                path += f"{file_type}s/"
+        elif file_type:
+            path += f"uploads/{file_type}s/"
+        
+        return path + prefix.lstrip("/")
+    
+    @traced()
     async def list_user_files(self, user_id: str, bucket_type: str = "assets", 
-                             prefix: str = "", limit: int = 100) -> List[Dict[str, Any]]:
+                             prefix: str = "", limit: int = 100,
+                             product_id: Optional[str] = None,
+                             file_type: Optional[str] = None,
+                             folders: bool = False,
+                             page_token: Optional[str] = None) -> Dict[str, Any]:
         """
-        List files for a user in a specific bucket
+        List one page of files for a user in a specific bucket
         
         Args:
             user_id: ID of the user
             bucket_type: Type of bucket to search
-            prefix: Additional prefix to filter files
-            limit: Maximum number of files to return
+            prefix: Additional prefix to filter files (relative to the product/type prefix)
+            limit: Maximum number of files to return in this page
+            product_id: Only list files belonging to this product
+            file_type: Only list files of this type (image, video, document, generated)
+            folders: Return immediate sub-folders instead of recursing into them
+            page_token: Token from a previous page's next_page_token
             
         Returns:
-            List[dict]: List of file information
+            dict: files, folders (when requested), the listed prefix and next_page_token
         """
         try:
             bucket = self._get_bucket(bucket_type)
             
-            # Create user-scoped prefix
-            user_prefix = f"users/{user_id}/"
-            if prefix:
-                user_prefix += prefix
+            # Create user-scoped prefix; the narrower it is, the fewer objects GCS scans
+            list_prefix = self._build_list_prefix(user_id, product_id, file_type, prefix)
+            
+            iterator = bucket.list_blobs(
+                prefix=list_prefix,
+                delimiter="/" if folders else None,
+                max_results=limit,
+                page_token=page_token,
+                # Field mask: only the attributes we return below
+                fields=("items(name,size,contentType,timeCreated,updated,metadata),"
+                        "prefixes,nextPageToken")
+            )
             
-            blobs = bucket.list_blobs(prefix=user_prefix, max_results=limit)
+            # Fetch exactly one page (a single GCS request)
+            with observe_gcs("list"):
+                page = next(iterator.pages, None)
+            blobs = list(page) if page is not None else []
             
             files = []
             for blob in blobs:
@@ -417,14 +705,21 @@ class StorageService:
                     "file_name": blob.name.split('/')[-1],
                     "file_size": blob.size,
                     "content_type": blob.content_type,
-                    "created_at": blob.time_created.isoformat(),
-                    "updated_at": blob.updated.isoformat(),
+                    "created_at": blob.time_created.isoformat() if blob.time_created else None,
+                    "updated_at": blob.updated.isoformat() if blob.updated else None,
                     "metadata": blob.metadata or {}
                 }
                 files.append(file_info)
             
-            return files
+            return {
+                "files": files,
+                "folders": sorted(page.prefixes) if (folders and page is not None) else [],
+                "prefix": list_prefix,
+                "next_page_token": iterator.next_page_token
+            }
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error listing files for user {user_id}: {str(e)}")
             raise
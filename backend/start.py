@@ -1,27 +1,194 @@
 #!/usr/bin/env python3
 """
 Nexsy Backend Startup Script
+
+Development (default): single uvicorn process with auto-reload.
+Production (--mode prod or SERVER_MODE=prod): Gunicorn managing Uvicorn
+workers, one per available CPU, with the app preloaded in the master so
+workers share imported code.
+
+Production settings (environment overrides):
+    HOST, PORT                   Bind address (default 0.0.0.0:8000)
+    WEB_CONCURRENCY              Worker count (default: available CPUs)
+    KEEP_ALIVE                   Idle keep-alive seconds (default 75)
+    BACKLOG                      Listen backlog (default 2048)
+    GRACEFUL_TIMEOUT             Seconds to finish in-flight requests on shutdown (default 25)
+    WORKER_TIMEOUT               Seconds before a silent worker is restarted (default 120)
+    MAX_REQUESTS                 Recycle workers after this many requests (default 0, off)
 """
-import uvicorn
+import argparse
+import importlib.util
+import math
 import os
+import shutil
+import tempfile
 from pathlib import Path
 
-if __name__ == "__main__":
-    # Get the directory where this script is located
-    backend_dir = Path(__file__).parent
-    
-    # Change to backend directory
-    os.chdir(backend_dir)
-    
+import uvicorn
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+def _cgroup_cpu_limit():
+    """CPU limit from the container's cgroup quota (v2, then v1), or None if unlimited"""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus() -> int:
+    """CPUs this process can use, honoring CPU affinity and container CPU quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+def production_settings(args) -> dict:
+    """Resolve production server settings from CLI arguments and environment"""
+    return {
+        "host": args.host or os.getenv("HOST", "0.0.0.0"),
+        "port": args.port or _env_int("PORT", 8000),
+        "workers": args.workers or _env_int("WEB_CONCURRENCY", available_cpus()),
+        # Keep idle connections open longer than the fronting proxy/load balancer does
+        "keep_alive": _env_int("KEEP_ALIVE", 75),
+        "backlog": _env_int("BACKLOG", 2048),
+        "graceful_timeout": _env_int("GRACEFUL_TIMEOUT", 25),
+        "worker_timeout": _env_int("WORKER_TIMEOUT", 120),
+        "max_requests": _env_int("MAX_REQUESTS", 0),
+        "loop": "uvloop" if _has_module("uvloop") else "asyncio",
+        "http": "httptools" if _has_module("httptools") else "h11"
+    }
+
+def _prepare_prometheus_multiprocess(workers: int) -> None:
+    """Point prometheus_client at a shared directory so /metrics aggregates all workers"""
+    if workers < 2 or os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return
+    metrics_dir = os.path.join(tempfile.gettempdir(), "nexsy-prometheus")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    # Must be set before prometheus_client is imported by the app
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+def run_gunicorn(settings: dict) -> None:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn_worker import UvicornWorker
+
+    class ProductionWorker(UvicornWorker):
+        CONFIG_KWARGS = {"loop": settings["loop"], "http": settings["http"], "proxy_headers": True}
+
+    def child_exit(server, worker):
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(worker.pid)
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{settings['host']}:{settings['port']}",
+                "workers": settings["workers"],
+                "worker_class": ProductionWorker,
+                # Import the app once in the master; workers fork with it loaded.
+                # Service clients (gRPC channels) are created lazily after fork.
+                "preload_app": True,
+                "keepalive": settings["keep_alive"],
+                "backlog": settings["backlog"],
+                "graceful_timeout": settings["graceful_timeout"],
+                "timeout": settings["worker_timeout"],
+                "max_requests": settings["max_requests"],
+                "max_requests_jitter": settings["max_requests"] // 10,
+                "child_exit": child_exit,
+                "accesslog": None,
+                "errorlog": "-"
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    ProductionServer().run()
+
+def run_production(settings: dict) -> None:
+    _prepare_prometheus_multiprocess(settings["workers"])
+
+    print("🚀 Starting Nexsy Backend API (production)...")
+    print(f"⚙️  {settings['workers']} worker(s), loop={settings['loop']}, http={settings['http']}, "
+          f"keep-alive={settings['keep_alive']}s, backlog={settings['backlog']}, "
+          f"graceful timeout={settings['graceful_timeout']}s")
+
+    if _has_module("gunicorn") and _has_module("uvicorn_worker"):
+        run_gunicorn(settings)
+        return
+
+    # Gunicorn is Unix-only: fall back to uvicorn's own process manager (no preload)
+    print("⚠️  gunicorn/uvicorn-worker not available, using uvicorn workers without preload")
+    uvicorn.run(
+        "main:app",
+        host=settings["host"],
+        port=settings["port"],
+        workers=settings["workers"],
+        loop=settings["loop"],
+        http=settings["http"],
+        timeout_keep_alive=settings["keep_alive"],
+        backlog=settings["backlog"],
+        timeout_graceful_shutdown=settings["graceful_timeout"],
+        limit_max_requests=settings["max_requests"] or None,
+        proxy_headers=True,
+        access_log=False,
+        log_level="info"
+    )
+
+def run_development(args) -> None:
     print("🚀 Starting Nexsy Backend API...")
     print("📝 API Documentation: http://localhost:8000/docs")
     print("🏥 Health Check: http://localhost:8000/health")
     print("⚡ Press Ctrl+C to stop")
-    
+
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
+        host=args.host or "0.0.0.0",
+        port=args.port or 8000,
         reload=True,
         log_level="info"
     )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the Nexsy backend API")
+    server_mode = os.getenv("SERVER_MODE", "dev").strip().lower()
+    server_mode = {"development": "dev", "production": "prod"}.get(server_mode, server_mode)
+    parser.add_argument("--mode", choices=["dev", "prod"], default=server_mode,
+                        help="dev: auto-reload server; prod: multi-worker production server")
+    parser.add_argument("--host", help="Bind host")
+    parser.add_argument("--port", type=int, help="Bind port")
+    parser.add_argument("--workers", type=int, help="Worker processes (prod only)")
+    args = parser.parse_args()
+
+    # Get the directory where this script is located
+    backend_dir = Path(__file__).parent
+
+    # Change to backend directory
+    os.chdir(backend_dir)
+
+    if args.mode == "prod":
+        run_production(production_settings(args))
+    else:
+        run_development(args)
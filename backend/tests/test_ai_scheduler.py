@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from services.ai_scheduler import (
+    BACKGROUND, BULK, INTERACTIVE, AIScheduler, current_priority, estimate_tokens, work_priority
+)
+
+async def _hold(scheduler, user_id, order, release, priority=None, tokens=100):
+    async with scheduler.slot(user_id, tokens, priority):
+        order.append(user_id if priority is None else (priority, user_id))
+        await release.wait()
+
+def test_work_priority_sets_context():
+    assert current_priority() == INTERACTIVE
+    with work_priority(BACKGROUND):
+        assert current_priority() == BACKGROUND
+    assert current_priority() == INTERACTIVE
+    with pytest.raises(ValueError):
+        with work_priority("urgent"):
+            pass
+
+def test_estimate_tokens():
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert estimate_tokens(messages, max_tokens=50) == 150
+
+def test_grants_up_to_max_concurrent():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=2, interactive_reserve=0, tokens_per_minute=0)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(scheduler, f"u{i}", order, release)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert len(order) == 2
+        assert scheduler.describe()[INTERACTIVE] == {"queued": 1, "in_flight": 2}
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.in_flight == 0
+
+    asyncio.run(main())
+
+def test_higher_class_is_dispatched_first():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=1, interactive_reserve=0, tokens_per_minute=0)
+        order, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(scheduler, "blocker", order, release, INTERACTIVE))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(_hold(scheduler, "u1", order, release, priority))
+            for priority in (BULK, BACKGROUND, INTERACTIVE)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *waiters)
+        return order
+
+    assert asyncio.run(main()) == [
+        (INTERACTIVE, "blocker"), (INTERACTIVE, "u1"), (BACKGROUND, "u1"), (BULK, "u1")
+    ]
+
+def test_background_work_leaves_the_interactive_reserve():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=3, interactive_reserve=1, tokens_per_minute=0)
+        order, release = [], asyncio.Event()
+        background = [
+            asyncio.create_task(_hold(scheduler, f"b{i}", order, release, BACKGROUND)) for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        # Two of three slots may run background work
+        assert scheduler.describe()[BACKGROUND] == {"queued": 1, "in_flight": 2}
+        interactive = asyncio.create_task(_hold(scheduler, "u1", order, release, INTERACTIVE))
+        await asyncio.sleep(0)
+        assert (INTERACTIVE, "u1") in order
+        release.set()
+        await asyncio.gather(interactive, *background)
+
+    asyncio.run(main())
+
+def test_users_share_slots_fairly():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=1, interactive_reserve=0, tokens_per_minute=0)
+        order, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(scheduler, "blocker", order, release))
+        await asyncio.sleep(0)
+        # heavy queues three completions before light queues one
+        tasks = [asyncio.create_task(_hold(scheduler, "heavy", order, release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(_hold(scheduler, "light", order, release)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    order = asyncio.run(main())
+    assert order[0] == "blocker"
+    assert order.index("light") <= 2
+
+def test_promote_moves_queued_work_to_interactive():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=1, interactive_reserve=0, tokens_per_minute=0)
+        order, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(scheduler, "blocker", order, release, INTERACTIVE))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(_hold(scheduler, "other", order, release, BACKGROUND)),
+            asyncio.create_task(_hold(scheduler, "u1", order, release, BULK)),
+        ]
+        await asyncio.sleep(0)
+        scheduler.promote("u1")
+        assert scheduler.describe()[INTERACTIVE]["queued"] == 1
+        assert scheduler.describe()[BULK]["queued"] == 0
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    # The promoted completion keeps its recorded class, but runs first
+    assert [user for _, user in asyncio.run(main())] == ["blocker", "u1", "other"]
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=1, interactive_reserve=0, tokens_per_minute=0)
+        order, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(scheduler, "blocker", order, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(scheduler, "u1", order, release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.describe()[INTERACTIVE] == {"queued": 0, "in_flight": 1}
+        release.set()
+        await blocker
+        assert scheduler.in_flight == 0
+        return order
+
+    assert asyncio.run(main()) == ["blocker"]
+
+def test_token_budget_delays_completions():
+    async def main():
+        # 60000 tokens per minute: 1000 per second
+        scheduler = AIScheduler(max_concurrent=10, interactive_reserve=0, tokens_per_minute=60000)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with scheduler.slot("u1", 60000):
+            pass
+        # The bucket is empty; 50 tokens take about 50 ms to refill
+        async with scheduler.slot("u1", 50):
+            pass
+        return loop.time() - started
+
+    assert 0.03 <= asyncio.run(main()) < 1
+
+def test_reported_usage_refunds_the_estimate():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=10, interactive_reserve=0, tokens_per_minute=60000)
+        async with scheduler.slot("u1", 60000) as slot:
+            slot.used_tokens = 1000
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        # 59000 tokens came back, so this doesn't wait
+        async with scheduler.slot("u1", 50000):
+            pass
+        return loop.time() - started
+
+    assert asyncio.run(main()) < 0.03
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import TTLCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+def test_get_returns_default_on_miss():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+
+def test_none_values_are_cached():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    cache.set("key", None)
+    assert cache.get("key", "default") is None
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    cache.set("key", "value")
+    clock.now += 59
+    assert cache.get("key") == "value"
+    clock.now += 1
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+def test_invalidate_where():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    for key in [("u1", "p1"), ("u1", "p2"), ("u2", "p1")]:
+        cache.set(key, key)
+    assert cache.invalidate_where(lambda key: key[0] == "u1") == 2
+    assert cache.get(("u2", "p1")) == ("u2", "p1")
+    assert len(cache) == 1
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache("test", maxsize=10, ttl=60, enabled=False)
+    cache.set("key", "value")
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+def test_get_or_load_loads_once():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        return "value"
+
+    async def main():
+        assert await cache.get_or_load("key", load) == "value"
+        assert await cache.get_or_load("key", load) == "value"
+
+    asyncio.run(main())
+    assert calls == 1
+
+def test_get_or_load_drops_result_invalidated_while_loading():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+
+    async def main():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def load():
+            loading.set()
+            await release.wait()
+            return "stale"
+
+        task = asyncio.create_task(cache.get_or_load("key", load))
+        await loading.wait()
+        # A write lands while the read is in flight
+        cache.invalidate("key")
+        release.set()
+        assert await task == "stale"
+
+    asyncio.run(main())
+    assert cache.get("key") is None
+
+def test_admission_hook_can_refuse(monkeypatch):
+    monkeypatch.setattr(cache_module, "_admission_hook", None)
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    cache_module.set_admission_hook(lambda name, key: key != "refused")
+    cache.set("refused", 1)
+    cache.set("admitted", 2)
+    assert cache.get("refused") is None
+    assert cache.get("admitted") == 2
+
+def test_get_cache_is_shared_by_name(monkeypatch):
+    monkeypatch.setattr(cache_module, "_caches", {})
+    first = cache_module.get_cache("shared", maxsize=5, ttl=1)
+    assert cache_module.get_cache("shared") is first
+    assert first.maxsize == 5
+    assert cache_module.all_caches() == {"shared": first}
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from services import cache_coherence
+from services.cache_coherence import WATCHED_COLLECTIONS, CacheCoherence
+from utils.cache import get_cache
+
+CACHE_NAME = next(iter(WATCHED_COLLECTIONS.values()))
+
+class FakeListener:
+    def __init__(self, unsubscribed: threading.Event):
+        self.is_active = True
+        self._unsubscribed = unsubscribed
+
+    def unsubscribe(self):
+        # Blocks like closing a real stream would
+        self._unsubscribed.wait(5)
+        self.is_active = False
+
+class FakeFirestore:
+    """Snapshot listeners that block until the test lets them open and close"""
+
+    def __init__(self):
+        self.opened = threading.Event()
+        self.unsubscribed = threading.Event()
+        self.fail = False
+        self.listeners = []
+        self.callbacks = []
+
+    def collection(self, name):
+        return self
+
+    def document(self, user_id):
+        return self
+
+    def on_snapshot(self, callback):
+        self.opened.wait(5)
+        if self.fail:
+            raise RuntimeError("stream refused")
+        listener = FakeListener(self.unsubscribed)
+        self.listeners.append(listener)
+        self.callbacks.append(callback)
+        # Initial snapshot
+        callback([], [], None)
+        return listener
+
+    def change(self, product_id):
+        """Deliver a later snapshot in which product_id's document changed, to every listener"""
+        change = SimpleNamespace(document=SimpleNamespace(to_dict=lambda: {"product_id": product_id}))
+        for callback in self.callbacks:
+            callback([], [change], None)
+
+@pytest.fixture
+def firestore(monkeypatch):
+    firestore = FakeFirestore()
+    monkeypatch.setattr(cache_coherence, "get_firestore_client", lambda: firestore)
+    yield firestore
+    firestore.opened.set()
+    firestore.unsubscribed.set()
+
+async def _settle(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+def test_admit_does_not_block_on_listeners(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop())
+        # on_snapshot blocks until opened is set, so this would hang on the loop
+        assert coherence.admit(CACHE_NAME, ("u1", "p1")) is False
+        assert coherence.admit(CACHE_NAME, ("u1", "p1")) is False
+        firestore.opened.set()
+        await _settle(lambda: coherence.admit(CACHE_NAME, ("u1", "p1")))
+        assert len(firestore.listeners) == len(WATCHED_COLLECTIONS)
+        firestore.unsubscribed.set()
+        await coherence.close()
+        assert not any(listener.is_active for listener in firestore.listeners)
+
+    asyncio.run(main())
+
+def test_other_caches_are_always_admitted(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop())
+        assert coherence.admit("unrelated", ("u1", "p1")) is True
+        assert not coherence._users
+
+    asyncio.run(main())
+
+def test_evicting_a_user_does_not_block(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop(), max_users=1)
+        firestore.opened.set()
+        coherence.admit(CACHE_NAME, ("u1", "p1"))
+        await _settle(lambda: coherence.admit(CACHE_NAME, ("u1", "p1")))
+        get_cache(CACHE_NAME).set(("u1", "p1"), "cached")
+
+        # unsubscribe blocks until unsubscribed is set
+        coherence.admit(CACHE_NAME, ("u2", "p1"))
+        assert list(coherence._users) == ["u2"]
+        assert get_cache(CACHE_NAME).get(("u1", "p1")) is None
+        firestore.unsubscribed.set()
+        await coherence.close()
+
+    asyncio.run(main())
+
+def test_failed_watch_is_forgotten(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop())
+        firestore.fail = True
+        firestore.opened.set()
+        assert coherence.admit(CACHE_NAME, ("u1", "p1")) is False
+        await _settle(lambda: not coherence._users)
+
+    asyncio.run(main())
+
+def test_entries_cached_before_initial_snapshot_are_dropped(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop())
+        cache = get_cache(CACHE_NAME)
+        coherence.admit(CACHE_NAME, ("u1", "p1"))
+        # Stored while the listeners were opening, e.g. by a load that began earlier
+        cache.set(("u1", "p1"), "stale")
+        cache.set(("u2", "p1"), "other user")
+        firestore.opened.set()
+        await _settle(lambda: coherence.admit(CACHE_NAME, ("u1", "p1")))
+        assert cache.get(("u1", "p1")) is None
+        assert cache.get(("u2", "p1")) == "other user"
+        firestore.unsubscribed.set()
+        await coherence.close()
+
+    asyncio.run(main())
+
+def test_changed_document_evicts_its_entry(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop())
+        cache = get_cache(CACHE_NAME)
+        firestore.opened.set()
+        coherence.admit(CACHE_NAME, ("u1", "p1"))
+        await _settle(lambda: coherence.admit(CACHE_NAME, ("u1", "p1")))
+        cache.set(("u1", "p1"), "cached")
+        cache.set(("u1", "p2"), "untouched")
+
+        # Another instance wrote p1's strategy or creative output
+        await asyncio.to_thread(firestore.change, "p1")
+        await _settle(lambda: cache.get(("u1", "p1")) is None)
+        assert cache.get(("u1", "p2")) == "untouched"
+        # Still live: the user's entries keep being admitted
+        assert coherence.admit(CACHE_NAME, ("u1", "p1")) is True
+        firestore.unsubscribed.set()
+        await coherence.close()
+
+    asyncio.run(main())
+
+def test_changes_after_unwatch_are_ignored(firestore):
+    async def main():
+        coherence = CacheCoherence(asyncio.get_running_loop())
+        cache = get_cache(CACHE_NAME)
+        firestore.opened.set()
+        firestore.unsubscribed.set()
+        coherence.admit(CACHE_NAME, ("u1", "p1"))
+        await _settle(lambda: coherence.admit(CACHE_NAME, ("u1", "p1")))
+        await coherence.close()
+
+        cache.set(("u1", "p1"), "cached")
+        await asyncio.to_thread(firestore.change, "p1")
+        await asyncio.sleep(0.05)
+        assert cache.get(("u1", "p1")) == "cached"
+        cache.invalidate(("u1", "p1"))
+
+    asyncio.run(main())
@@ -0,0 +1,11 @@
+from benchmarks.coldstart import DEFERRED_MODULES, measure_import
+
+# Generous: catches an SDK or heavy dependency creeping into `import main`, not noise
+IMPORT_BUDGET_MS = 5000
+
+def test_import_main_defers_sdks_and_stays_within_budget():
+    # measure_import runs `import main` in a fresh interpreter
+    runs = [measure_import() for _ in range(2)]
+    import_ms, _, eager = min(runs, key=lambda run: run[0])
+    assert eager == [], f"imported eagerly by main: {', '.join(eager)} (deferred: {', '.join(DEFERRED_MODULES)})"
+    assert import_ms < IMPORT_BUDGET_MS
@@ -0,0 +1,105 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middleware.compression import CompressionMiddleware, choose_encoding
+
+BODY = b'{"text": "' + b"compressible " * 500 + b'"}'
+
+def _client(status_code=200, headers=None, media_type="application/json", body=BODY):
+    def endpoint(request):
+        return Response(body, status_code=status_code, headers=headers, media_type=media_type)
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+def _get(client):
+    return client.get("/", headers={"Accept-Encoding": "gzip"})
+
+@pytest.mark.parametrize("accept_encoding, brotli_available, expected", [
+    ("gzip, br", True, "br"),
+    ("gzip, br", False, "gzip"),
+    ("br;q=0.5, gzip", True, "gzip"),
+    ("*", True, "br"),
+    ("identity", True, None),
+    ("gzip;q=0", True, None),
+    ("", True, None),
+])
+def test_choose_encoding(accept_encoding, brotli_available, expected):
+    assert choose_encoding(accept_encoding, brotli_available) == expected
+
+def test_compresses_large_json():
+    response = _get(_client())
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == BODY
+    assert int(response.headers["content-length"]) < len(BODY)
+
+def test_small_body_passes_through():
+    response = _get(_client(body=b'{"ok": true}'))
+    assert "content-encoding" not in response.headers
+
+def test_media_passes_through():
+    response = _get(_client(media_type="image/png"))
+    assert "content-encoding" not in response.headers
+
+def test_identity_only_client_gets_identity():
+    response = _client().get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == BODY
+
+@pytest.mark.parametrize("status_code, headers", [
+    (206, {"Content-Range": f"bytes 0-{len(BODY) - 1}/{len(BODY) * 2}"}),
+    (200, {"Cache-Control": "private, no-transform"}),
+    (200, {"Content-Encoding": "identity"}),
+])
+def test_ineligible_responses_pass_through(status_code, headers):
+    response = _get(_client(status_code=status_code, headers=headers))
+    assert response.status_code == status_code
+    assert response.headers.get("content-encoding") == headers.get("Content-Encoding")
+    assert "vary" not in response.headers
+
+def test_not_modified_passes_through():
+    response = _get(_client(status_code=304, body=b"", headers={"ETag": '"abc"'}))
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"abc"'
+    assert "content-encoding" not in response.headers
+
+@pytest.mark.parametrize("vary, expected", [
+    ("Origin", "Origin, Accept-Encoding"),
+    ("accept-encoding", "accept-encoding"),
+    ("*", "*"),
+])
+def test_vary_is_merged(vary, expected):
+    response = _get(_client(headers={"Vary": vary}))
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == expected
+
+def test_compressed_response_has_weak_etag_and_no_ranges():
+    response = _get(_client(headers={"ETag": '"abc"', "Accept-Ranges": "bytes"}))
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert "accept-ranges" not in response.headers
+
+def test_weak_etag_is_kept():
+    response = _get(_client(headers={"ETag": 'W/"abc"'}))
+    assert response.headers["etag"] == 'W/"abc"'
+
+def test_streaming_response_is_compressed_chunk_by_chunk():
+    chunks = [b"line of text\n" * 100 for _ in range(5)]
+
+    def endpoint(request):
+        return StreamingResponse(iter(chunks), media_type="text/plain")
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    with TestClient(app).stream("GET", "/", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw) == b"".join(chunks)
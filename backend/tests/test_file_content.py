@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+
+from routes.upload import _etag_matches, _parse_range_header
+
+SIZE = 1000
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("BYTES = 0-0", (0, 0)),
+])
+def test_parse_range_header(header, expected):
+    assert _parse_range_header(header, SIZE) == expected
+
+@pytest.mark.parametrize("header", [
+    "bytes=0-99,200-299",  # multiple ranges
+    "items=0-99",
+    "bytes=abc-",
+    "bytes=-",
+    "bytes=100",
+    "bytes=500-100",
+])
+def test_parse_range_header_serves_full_response(header):
+    assert _parse_range_header(header, SIZE) is None
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_parse_range_header_unsatisfiable(header):
+    with pytest.raises(HTTPException) as exc_info:
+        _parse_range_header(header, SIZE)
+    assert exc_info.value.status_code == 416
+    assert exc_info.value.headers["Content-Range"] == f"bytes */{SIZE}"
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+    ("abc", False),
+])
+def test_etag_matches(header, expected):
+    assert _etag_matches(header, '"abc"') is expected
@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, Response
+from fastapi.testclient import TestClient
+
+from middleware import idempotency as idempotency_middleware
+from middleware.idempotency import idempotency_key, run_idempotent
+from utils.idempotency import (
+    COMPLETED, IN_PROGRESS, MISMATCH, STARTED,
+    Idempotency, IdempotencyInProgress, IdempotencyKeyMismatch, IdempotencyStore,
+    MemoryIdempotencyStore, request_fingerprint
+)
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        IdempotencyStore()
+
+def test_memory_store_states():
+    async def main():
+        store = MemoryIdempotencyStore()
+        assert await store.begin("key", "a", 60) == (STARTED, None)
+        assert await store.begin("key", "a", 60) == (IN_PROGRESS, None)
+        assert await store.begin("key", "b", 60) == (MISMATCH, None)
+        await store.complete("key", {"id": 1}, 60)
+        assert await store.begin("key", "a", 60) == (COMPLETED, {"id": 1})
+        await store.abandon("key")
+        assert await store.begin("key", "a", 60) == (STARTED, None)
+        # An expired lease frees the key
+        assert await store.begin("expiring", "a", 0) == (STARTED, None)
+        assert await store.begin("expiring", "b", 60) == (STARTED, None)
+
+    asyncio.run(main())
+
+def test_request_fingerprint_ignores_key_order():
+    assert request_fingerprint({"a": 1, "b": [1, 2]}) == request_fingerprint({"b": [1, 2], "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+def test_completed_response_is_replayed():
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        return {"id": calls}
+
+    async def main():
+        idempotency = Idempotency(MemoryIdempotencyStore())
+        first = await idempotency.run("key", "test", "fp", operation)
+        second = await idempotency.run("key", "test", "fp", operation)
+        return first, second
+
+    assert asyncio.run(main()) == (({"id": 1}, False), ({"id": 1}, True))
+    assert calls == 1
+
+def test_concurrent_duplicates_join_the_running_request():
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": calls}
+
+    async def main():
+        idempotency = Idempotency(MemoryIdempotencyStore())
+        return await asyncio.gather(*(idempotency.run("key", "test", "fp", operation) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+
+def test_failed_operation_is_not_stored():
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("generation failed")
+        return {"id": calls}
+
+    async def main():
+        idempotency = Idempotency(MemoryIdempotencyStore())
+        with pytest.raises(RuntimeError):
+            await idempotency.run("key", "test", "fp", operation)
+        return await idempotency.run("key", "test", "fp", operation)
+
+    assert asyncio.run(main()) == ({"id": 2}, False)
+
+def test_key_reused_with_other_payload_is_rejected():
+    async def operation():
+        return {"id": 1}
+
+    async def main():
+        idempotency = Idempotency(MemoryIdempotencyStore())
+        await idempotency.run("key", "test", "fp", operation)
+        await idempotency.run("key", "test", "other", operation)
+
+    with pytest.raises(IdempotencyKeyMismatch):
+        asyncio.run(main())
+
+def test_key_held_elsewhere_times_out():
+    async def main():
+        store = MemoryIdempotencyStore()
+        # Another instance claimed the key and is still running
+        await store.begin("key", "fp", 60)
+        idempotency = Idempotency(store, lease_seconds=0.05, poll_interval=0.01)
+        await idempotency.run("key", "test", "fp", _unreachable)
+
+    with pytest.raises(IdempotencyInProgress):
+        asyncio.run(main())
+
+def test_joiner_takes_over_from_cancelled_request():
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return {"id": calls}
+
+    async def main():
+        idempotency = Idempotency(MemoryIdempotencyStore())
+        leader = asyncio.create_task(idempotency.run("key", "test", "fp", operation))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(idempotency.run("key", "test", "fp", operation))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await joiner
+
+    assert asyncio.run(main()) == ({"id": 2}, False)
+
+async def _unreachable():
+    raise AssertionError("operation must not run")
+
+@pytest.fixture
+def client(monkeypatch):
+    idempotency = Idempotency(MemoryIdempotencyStore(), lease_seconds=0.05, poll_interval=0.01)
+    monkeypatch.setattr(idempotency_middleware, "_idempotency", idempotency)
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/generate/{product_id}")
+    async def generate(product_id: str, response: Response, key=Depends(idempotency_key)):
+        async def operation():
+            app.state.calls += 1
+            return {"product_id": product_id, "run": app.state.calls}
+        return await run_idempotent(response, "user-1", "generate", key, {"product_id": product_id}, operation)
+
+    client = TestClient(app)
+    client.idempotency = idempotency
+    return client
+
+def test_route_replays_with_header(client):
+    first = client.post("/generate/p1", headers={"Idempotency-Key": "k1"})
+    second = client.post("/generate/p1", headers={"Idempotency-Key": "k1"})
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() == {"product_id": "p1", "run": 1}
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+
+def test_route_without_key_always_runs(client):
+    assert client.post("/generate/p1").json()["run"] == 1
+    assert client.post("/generate/p1").json()["run"] == 2
+
+def test_route_rejects_key_reused_for_other_payload(client):
+    client.post("/generate/p1", headers={"Idempotency-Key": "k1"})
+    response = client.post("/generate/p2", headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 422
+
+def test_route_reports_key_still_in_progress(client):
+    # Claimed by a request on another instance that hasn't finished
+    asyncio.run(client.idempotency.store.begin(
+        "user-1:generate:k1", request_fingerprint({"product_id": "p1"}), 60
+    ))
+    response = client.post("/generate/p1", headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 409
+
+@pytest.mark.parametrize("key", ["   ", "x" * 256])
+def test_route_rejects_invalid_key(client, key):
+    assert client.post("/generate/p1", headers={"Idempotency-Key": key}).status_code == 400
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.ai_scheduler import AIScheduler
+from services.ai_service import AIService
+from services.model_router import Route, ModelRouter
+
+ROUTES = {"generate": Route("quality", max_tokens=100, temperature=0.7, latency_budget=10.0)}
+TIERS = {"fast": "fast-model", "standard": "standard-model", "quality": "quality-model"}
+
+def _router(**kwargs):
+    return ModelRouter(tier_models=TIERS, routes=ROUTES, cooldown_seconds=60, **kwargs)
+
+def test_primary_tier_when_idle():
+    scheduler = AIScheduler(max_concurrent=2, interactive_reserve=0, tokens_per_minute=0)
+    choice = _router(max_in_flight=0, saturated=scheduler.saturated).select("generate")
+    assert (choice.tier, choice.reason) == ("quality", "primary")
+
+def test_latency_over_budget_degrades_for_cooldown():
+    router = _router(max_in_flight=0, min_samples=2)
+    choice = router.select("generate")
+    for _ in range(2):
+        router.started()
+        router.finished(choice, duration=30.0)
+    degraded = router.select("generate")
+    assert (degraded.tier, degraded.reason) == ("standard", "latency")
+
+def test_in_flight_threshold_counts_as_load():
+    router = _router(max_in_flight=2)
+    router.started()
+    router.started()
+    choice = router.select("generate")
+    assert (choice.tier, choice.reason) == ("standard", "load")
+
+def test_saturated_scheduler_degrades_one_tier():
+    async def main():
+        scheduler = AIScheduler(max_concurrent=2, interactive_reserve=0, tokens_per_minute=0)
+        router = _router(max_in_flight=0, saturated=scheduler.saturated)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("other", 100):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        # The last free slot: the pool is now saturated
+        async with scheduler.slot("u1", 100):
+            choice = router.select("generate")
+        release.set()
+        await holder
+        return choice
+
+    choice = asyncio.run(main())
+    assert (choice.tier, choice.reason) == ("standard", "load")
+
+def test_create_completion_degrades_when_scheduler_is_saturated(monkeypatch):
+    """AIService wires the scheduler's saturation into its router"""
+    models = []
+
+    async def create(model, **kwargs):
+        models.append(model)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(usage=None)
+
+    monkeypatch.setenv("AI_SCHEDULER_MAX_CONCURRENT", "2")
+    monkeypatch.setenv("AI_SCHEDULER_INTERACTIVE_RESERVE", "0")
+    monkeypatch.setenv("AI_SCHEDULER_TOKENS_PER_MINUTE", "0")
+    monkeypatch.delenv("AI_DEGRADE_MAX_IN_FLIGHT", raising=False)
+    monkeypatch.setattr("services.ai_service.get_product_service", lambda: None)
+    monkeypatch.setattr("services.ai_service.get_strategy_service", lambda: None)
+    monkeypatch.setattr("services.ai_service.get_creative_service", lambda: None)
+    monkeypatch.setenv("OPENAI_API_KEY", "")
+    service = AIService()
+    service.router.tier_models = dict(TIERS)
+    service.router.routes = dict(ROUTES)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    async def main():
+        messages = [{"role": "user", "content": "hi"}]
+        await asyncio.gather(*(service._create_completion("generate", "u1", messages) for _ in range(4)))
+
+    asyncio.run(main())
+    # The first completion had the pool to itself; later ones found it saturated
+    assert models[0] == "quality-model"
+    assert "standard-model" in models
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from middleware import rate_limit as rate_limit_middleware
+from middleware.rate_limit import RateLimiter, ai_rate_limited_user_id
+from utils.rate_limit import MemoryRateLimitBackend, RateLimitBackend, RedisRateLimitBackend
+
+def _limiter(backend=None, per_minute=60, burst=2, max_concurrent=1):
+    return RateLimiter(backend or MemoryRateLimitBackend(), "test", per_minute=per_minute,
+                       burst=burst, max_concurrent=max_concurrent)
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+def test_burst_then_rate_limited():
+    async def main():
+        limiter = _limiter(max_concurrent=0)
+        assert await limiter.acquire("u1") is None
+        assert await limiter.acquire("u1") is None
+        with pytest.raises(HTTPException) as exc_info:
+            await limiter.acquire("u1")
+        return exc_info.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "1"
+
+def test_concurrency_limit_and_release():
+    async def main():
+        limiter = _limiter(per_minute=0)
+        lease = await limiter.acquire("u1")
+        assert lease is not None
+        with pytest.raises(HTTPException):
+            await limiter.acquire("u1")
+        # Other users have their own slots
+        assert await limiter.acquire("u2") is not None
+        await limiter.release("u1", lease)
+        assert await limiter.acquire("u1") is not None
+
+    asyncio.run(main())
+
+def test_rate_limited_request_returns_its_slot():
+    async def main():
+        limiter = _limiter(burst=1)
+        await limiter.release("u1", await limiter.acquire("u1"))
+        with pytest.raises(HTTPException):
+            await limiter.acquire("u1")
+        return await limiter.backend.acquire_slot("test:u1", 1, 60)
+
+    assert asyncio.run(main()) is not None
+
+def test_backend_errors_fail_open():
+    class BrokenBackend(MemoryRateLimitBackend):
+        async def consume(self, key, rate, capacity, cost=1):
+            raise ConnectionError("redis down")
+
+    async def main():
+        limiter = _limiter(backend=BrokenBackend(), max_concurrent=0)
+        return [await limiter.acquire("u1") for _ in range(5)]
+
+    assert asyncio.run(main()) == [None] * 5
+
+def test_fakeredis_backend_matches_memory():
+    pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+
+    async def main():
+        backend = RedisRateLimitBackend("fakeredis://")
+        try:
+            assert await backend.consume("bucket", rate=1, capacity=2) == 0
+            assert await backend.consume("bucket", rate=1, capacity=2) == 0
+            assert await backend.consume("bucket", rate=1, capacity=2) > 0
+            lease = await backend.acquire_slot("slots", limit=1, lease_seconds=60)
+            assert lease is not None
+            assert await backend.acquire_slot("slots", limit=1, lease_seconds=60) is None
+            await backend.release_slot("slots", lease)
+            assert await backend.acquire_slot("slots", limit=1, lease_seconds=60) is not None
+        finally:
+            await backend.close()
+
+    asyncio.run(main())
+
+class RecordingScheduler:
+    def __init__(self):
+        self.promoted = []
+
+    def promote(self, user_id):
+        self.promoted.append(user_id)
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = RecordingScheduler()
+    service = type("Service", (), {"scheduler": scheduler})()
+    monkeypatch.setattr(rate_limit_middleware, "get_ai_service", lambda: service)
+    return scheduler
+
+async def _enter(user_id):
+    dependency = ai_rate_limited_user_id(user_id)
+    assert await dependency.__anext__() == user_id
+    return dependency
+
+def test_admitted_request_promotes_queued_work(monkeypatch, scheduler):
+    monkeypatch.setattr(rate_limit_middleware, "_limiter", _limiter())
+
+    async def main():
+        dependency = await _enter("u1")
+        await dependency.aclose()
+
+    asyncio.run(main())
+    assert scheduler.promoted == ["u1"]
+
+def test_rejected_request_promotes_nothing(monkeypatch, scheduler):
+    monkeypatch.setattr(rate_limit_middleware, "_limiter", _limiter(max_concurrent=0, burst=1))
+
+    async def main():
+        await (await _enter("u1")).aclose()
+        with pytest.raises(HTTPException):
+            await _enter("u1")
+
+    asyncio.run(main())
+    assert scheduler.promoted == ["u1"]
+
+def test_promotes_when_rate_limiting_is_disabled(monkeypatch, scheduler):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+
+    async def main():
+        await (await _enter("u1")).aclose()
+
+    asyncio.run(main())
+    assert scheduler.promoted == ["u1"]
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from services.ai_service import AIService
+from utils.semantic_cache import EmbeddingProvider, HashingEmbedding, SemanticCache, key_terms
+
+def _cache(**kwargs):
+    return SemanticCache("test", HashingEmbedding(), **kwargs)
+
+async def _store(cache, text, scope, value):
+    _, vector = await cache.lookup(text, scope)
+    cache.add(vector, text, scope, value)
+
+def test_provider_is_abstract():
+    with pytest.raises(TypeError):
+        EmbeddingProvider()
+
+def test_near_duplicate_is_reused():
+    async def main():
+        cache = _cache()
+        await _store(cache, "Vegan protein powder | supplement", "scope", "stored")
+        match, _ = await cache.lookup("vegan protein powder | supplement", "scope")
+        miss, _ = await cache.lookup("Leather hiking boots | footwear", "scope")
+        return match, miss
+
+    match, miss = asyncio.run(main())
+    assert match.value == "stored"
+    assert miss is None
+
+def test_entries_only_match_their_scope():
+    async def main():
+        cache = _cache()
+        await _store(cache, "Vegan protein powder | supplement", "a", "stored")
+        match, _ = await cache.lookup("Vegan protein powder | supplement", "b")
+        return match
+
+    assert asyncio.run(main()) is None
+
+def test_key_terms_fold_synonyms_plurals_and_filler():
+    assert key_terms("Plant-based Protein Powders") == ("powder", "protein", "vegan")
+    assert key_terms("The vegan protein powder") == ("powder", "protein", "vegan")
+    assert key_terms("Mens running shoes") != key_terms("Womens running shoes")
+
+def test_autofill_scope_separates_users_countries_and_price_bands():
+    scope = AIService._autofill_scope
+    assert scope("u1", "Tea", 20, "US") == scope("u1", "tea", 30, " us ")
+    assert scope("u1", "Tea", 20, "US") != scope("u2", "Tea", 20, "US")
+    assert scope("u1", "Tea", 20, "US") != scope("u1", "Tea", 20, "DE")
+    assert scope("u1", "Tea", 20, "US") != scope("u1", "Tea", 40, "US")
+
+async def _autofill_lookup(cache, product_name, what_is_it="Protein supplement"):
+    """Look up like AIService._lookup_autofill_cache"""
+    text = f"{product_name} | {what_is_it}"
+    return await cache.lookup(text, AIService._autofill_scope("u1", product_name, 30, "US"))
+
+async def _autofill_store(cache, product_name, what_is_it="Protein supplement"):
+    _, vector = await _autofill_lookup(cache, product_name, what_is_it)
+    text = f"{product_name} | {what_is_it}"
+    cache.add(vector, text, AIService._autofill_scope("u1", product_name, 30, "US"), product_name)
+
+@pytest.mark.parametrize("stored, requested", [
+    ("Vegan protein powder", "Whey protein powder"),
+    ("Mens running shoes", "Womens running shoes"),
+    ("Vegan protein powder", "Vegan protein bar"),
+])
+def test_autofill_misses_different_products(stored, requested):
+    async def main():
+        cache = _cache()
+        await _autofill_store(cache, stored)
+        match, _ = await _autofill_lookup(cache, requested)
+        return match
+
+    assert asyncio.run(main()) is None
+
+@pytest.mark.parametrize("stored, requested", [
+    ("Vegan protein powder", "Plant protein powder"),
+    ("Vegan protein powder", "Plant-based protein powders"),
+    ("Running sneakers", "running shoes"),
+])
+def test_autofill_reuses_near_duplicates(stored, requested):
+    async def main():
+        cache = _cache()
+        await _autofill_store(cache, stored)
+        match, _ = await _autofill_lookup(cache, requested)
+        return match
+
+    match = asyncio.run(main())
+    assert match is not None and match.value == stored
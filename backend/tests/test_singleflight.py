@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight, single_flight
+
+def test_concurrent_calls_share_one_run():
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        group = SingleFlight("test")
+        results = await asyncio.gather(*(group.do("key", load) for _ in range(5)))
+        assert results == [1] * 5
+        # Nothing is kept once the call finished
+        assert await group.do("key", load) == 2
+
+    asyncio.run(main())
+    assert calls == 2
+
+def test_different_keys_run_separately():
+    async def main():
+        group = SingleFlight("test")
+        return await asyncio.gather(group.do("a", _value("a")), group.do("b", _value("b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+def test_exception_is_shared():
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        group = SingleFlight("test")
+        return await asyncio.gather(*(group.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def main():
+        group = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def load():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.create_task(group.do("key", load))
+        await started.wait()
+        second = asyncio.create_task(group.do("key", load))
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await second == "done"
+
+    asyncio.run(main())
+
+def test_forget_starts_a_new_flight():
+    async def main():
+        group = SingleFlight("test")
+        release = asyncio.Event()
+        calls = []
+
+        async def load():
+            calls.append(len(calls))
+            await release.wait()
+            return len(calls)
+
+        first = asyncio.create_task(group.do("key", load))
+        await asyncio.sleep(0)
+        group.forget("key")
+        second = asyncio.create_task(group.do("key", load))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, second)
+        return calls
+
+    assert asyncio.run(main()) == [0, 1]
+
+def test_decorator_keys_on_bound_arguments_without_self():
+    class Service:
+        def __init__(self):
+            self.calls = 0
+
+        @single_flight()
+        async def get(self, user_id: str, product_id: str, force: bool = False):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return (user_id, product_id, force)
+
+    async def main(service_a, service_b):
+        return await asyncio.gather(
+            service_a.get("u1", "p1"),
+            service_b.get(user_id="u1", product_id="p1"),
+            service_a.get("u1", "p1", False),
+            service_a.get("u1", "p1", force=True),
+            service_a.get("u2", "p1")
+        )
+
+    service_a, service_b = Service(), Service()
+    results = asyncio.run(main(service_a, service_b))
+    assert results[:3] == [("u1", "p1", False)] * 3
+    assert results[3] == ("u1", "p1", True)
+    assert results[4] == ("u2", "p1", False)
+    # Three distinct flights: (u1, p1, False), (u1, p1, True), (u2, p1, False)
+    assert service_a.calls + service_b.calls == 3
+
+def _value(value):
+    async def load():
+        await asyncio.sleep(0)
+        return value
+    return load
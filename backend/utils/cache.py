@@ -0,0 +1,162 @@
+"""
+In-process read-through caches with LRU and TTL bounds
+
+Caches are named and shared process-wide through get_cache(), so writers
+can invalidate entries that readers in other services populate.
+
+Settings (environment):
+    CACHE_ENABLED         Turn all caches off with "false" (default true)
+    CACHE_TTL_SECONDS     Entry lifetime (default 60)
+    CACHE_MAX_ENTRIES     Entries per cache before LRU eviction (default 10000)
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import CACHE_REQUESTS, CACHE_EVICTIONS, CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Optional (cache_name, key) -> bool check before storing; see set_admission_hook()
+_admission_hook: Optional[Callable[[str, Hashable], bool]] = None
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire after ttl seconds
+
+    Values may be None (e.g. "product has no strategy"), which is cached like
+    any other value. All methods run without awaiting between reads and writes
+    of the entries, so they are safe on the event loop without locks.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, enabled: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Bumped by every invalidation; loads that started before it don't store their result
+        self._generation = 0
+        # Labelled metric children resolved once: labels() costs more than a lookup
+        self._hits = CACHE_REQUESTS.labels(cache=name, result="hit")
+        self._misses = CACHE_REQUESTS.labels(cache=name, result="miss")
+        self._entry_count = CACHE_ENTRIES.labels(cache=name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default on a miss"""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def _lookup(self, key: Hashable) -> Any:
+        if not self.enabled:
+            return _MISSING
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses.inc()
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key, "expired")
+            self._misses.inc()
+            return _MISSING
+        self._entries.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        if _admission_hook is not None and not _admission_hook(self.name, key):
+            return
+        if key not in self._entries:
+            self._entry_count.inc()
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)), "size")
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, or await loader() and cache its result
+
+        A result is not cached if the cache was invalidated while it loaded,
+        since it may predate the write that caused the invalidation.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        generation = self._generation
+        value = await loader()
+        if generation == self._generation:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one entry (after a write that changes it)"""
+        self._generation += 1
+        if key in self._entries:
+            self._remove(key, "invalidated")
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop all entries whose key matches; returns how many were dropped"""
+        self._generation += 1
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            self._remove(key, "invalidated")
+        return len(keys)
+
+    def clear(self) -> None:
+        self.invalidate_where(lambda key: True)
+
+    def _remove(self, key: Hashable, reason: str) -> None:
+        del self._entries[key]
+        self._entry_count.dec()
+        CACHE_EVICTIONS.labels(cache=self.name, reason=reason).inc()
+
+_caches: Dict[str, TTLCache] = {}
+_caches_lock = threading.Lock()
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def get_cache(name: str, maxsize: Optional[int] = None, ttl: Optional[float] = None) -> TTLCache:
+    """Return the process-wide cache called name, creating it on first use"""
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = TTLCache(
+                    name,
+                    maxsize=maxsize or int(_env_number("CACHE_MAX_ENTRIES", 10000)),
+                    ttl=ttl if ttl is not None else _env_number("CACHE_TTL_SECONDS", 60),
+                    enabled=os.getenv("CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+                )
+                _caches[name] = cache
+    return cache
+
+def set_admission_hook(hook: Optional[Callable[[str, Hashable], bool]]) -> None:
+    """
+    Install a check that may refuse to cache a value (None removes it)
+
+    Used by services.cache_coherence to keep entries out of the cache until
+    something will invalidate them when other instances write.
+    """
+    global _admission_hook
+    _admission_hook = hook
+
+def all_caches() -> Dict[str, TTLCache]:
+    """All caches created so far, by name"""
+    return dict(_caches)
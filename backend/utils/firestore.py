@@ -0,0 +1,50 @@
+"""
+Shared Firestore client
+
+google.cloud.firestore is imported and the client (credential discovery,
+gRPC channel) created on first use rather than at import time. All model
+services share one client, which is thread-safe.
+"""
+import asyncio
+import threading
+import logging
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+# Same values as firestore.Query.ASCENDING / DESCENDING, without importing the SDK
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_client = None
+_lock = threading.Lock()
+
+def get_firestore_client():
+    """Return the process-wide Firestore client, creating it on first call"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from google.cloud import firestore
+                _client = firestore.Client()
+                logger.info("Firestore client initialized")
+    return _client
+
+def close_firestore_client() -> None:
+    """Close the shared client's channels (on shutdown)"""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Firestore client: {e}")
+
+async def get_document(doc_ref) -> Any:
+    """Fetch a document snapshot without blocking the event loop"""
+    return await asyncio.to_thread(doc_ref.get)
+
+async def stream_documents(query) -> List[Any]:
+    """Run a query to completion without blocking the event loop"""
+    return await asyncio.to_thread(lambda: list(query.stream()))
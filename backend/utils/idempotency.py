@@ -0,0 +1,264 @@
+"""
+Idempotency-Key support: run an operation at most once per user and key
+
+- MemoryIdempotencyStore: per-process records, for single-instance deployments
+- FirestoreIdempotencyStore: records in the "idempotencyKeys" collection,
+  shared across workers and instances (set a Firestore TTL policy on
+  expires_at to have expired records deleted)
+
+Backends are selected by IDEMPOTENCY_BACKEND (memory | firestore). Records
+live IDEMPOTENCY_TTL_SECONDS after completion; an in-progress record is
+abandoned (and the key reusable) if its owner doesn't finish within
+IDEMPOTENCY_LEASE_SECONDS.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.firestore import get_firestore_client
+from utils.metrics import IDEMPOTENCY_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# States returned by IdempotencyStore.begin
+STARTED = "started"
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+MISMATCH = "mismatch"
+
+class IdempotencyKeyMismatch(Exception):
+    """The key was already used for a request with a different payload"""
+
+class IdempotencyInProgress(Exception):
+    """Another request with the key is still running (and outlived our wait)"""
+
+class IdempotencyStore(ABC):
+    """Storage for idempotency records"""
+
+    @abstractmethod
+    async def begin(self, key: str, fingerprint: str, lease_seconds: float) -> Tuple[str, Optional[Any]]:
+        """
+        Claim `key` for a request with payload `fingerprint`
+
+        Returns:
+            (STARTED, None): the caller owns the key and must complete() or abandon() it
+            (COMPLETED, response): a request with the same payload already completed
+            (IN_PROGRESS, None): a request with the same payload is running elsewhere
+            (MISMATCH, None): the key belongs to a request with a different payload
+        """
+
+    @abstractmethod
+    async def complete(self, key: str, response: Any, ttl: float) -> None:
+        """Store the response of a started key, replayed for ttl seconds"""
+
+    @abstractmethod
+    async def abandon(self, key: str) -> None:
+        """Release a started key without a response (the operation failed)"""
+
+def _claim(record: Optional[Dict[str, Any]], fingerprint: str, now: float) -> Tuple[str, Optional[Any]]:
+    """Decide begin() from the existing record, shared by the stores"""
+    if record is None or record["expires_at"] <= now:
+        return STARTED, None
+    if record["fingerprint"] != fingerprint:
+        return MISMATCH, None
+    if record["status"] == COMPLETED:
+        return COMPLETED, record["response"]
+    return IN_PROGRESS, None
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    In-process store
+
+    Methods never await between reading and writing records, so they are
+    atomic on the event loop without locks.
+    """
+
+    def __init__(self, sweep_every: int = 1000):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._sweep_every = sweep_every
+        self._writes = 0
+
+    async def begin(self, key: str, fingerprint: str, lease_seconds: float) -> Tuple[str, Optional[Any]]:
+        now = time.time()
+        state, response = _claim(self._records.get(key), fingerprint, now)
+        if state == STARTED:
+            self._records[key] = {
+                "fingerprint": fingerprint, "status": IN_PROGRESS, "response": None,
+                "expires_at": now + lease_seconds
+            }
+            self._sweep(now)
+        return state, response
+
+    async def complete(self, key: str, response: Any, ttl: float) -> None:
+        record = self._records.get(key)
+        if record is not None:
+            record.update(status=COMPLETED, response=response, expires_at=time.time() + ttl)
+
+    async def abandon(self, key: str) -> None:
+        self._records.pop(key, None)
+
+    def _sweep(self, now: float) -> None:
+        self._writes += 1
+        if self._writes % self._sweep_every == 0:
+            for key in [key for key, record in self._records.items() if record["expires_at"] <= now]:
+                del self._records[key]
+
+class FirestoreIdempotencyStore(IdempotencyStore):
+    """Records in Firestore, claimed in transactions so only one instance runs a key"""
+
+    def __init__(self, collection: str = "idempotencyKeys"):
+        self.collection = collection
+
+    def _ref(self, key: str):
+        # Keys contain user ids and client-chosen strings; hash them into valid document ids
+        return get_firestore_client().collection(self.collection).document(hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _begin_sync(self, key: str, fingerprint: str, lease_seconds: float) -> Tuple[str, Optional[Any]]:
+        from google.cloud import firestore
+
+        db = get_firestore_client()
+        ref = self._ref(key)
+
+        @firestore.transactional
+        def claim(transaction):
+            snapshot = ref.get(transaction=transaction)
+            now = time.time()
+            state, response = _claim(snapshot.to_dict() if snapshot.exists else None, fingerprint, now)
+            if state == STARTED:
+                transaction.set(ref, {
+                    "fingerprint": fingerprint, "status": IN_PROGRESS, "response": None,
+                    "expires_at": now + lease_seconds
+                })
+            return state, response
+
+        return claim(db.transaction())
+
+    async def begin(self, key: str, fingerprint: str, lease_seconds: float) -> Tuple[str, Optional[Any]]:
+        return await asyncio.to_thread(self._begin_sync, key, fingerprint, lease_seconds)
+
+    async def complete(self, key: str, response: Any, ttl: float) -> None:
+        await asyncio.to_thread(self._ref(key).update, {
+            "status": COMPLETED, "response": response, "expires_at": time.time() + ttl
+        })
+
+    async def abandon(self, key: str) -> None:
+        await asyncio.to_thread(self._ref(key).delete)
+
+def create_idempotency_store() -> IdempotencyStore:
+    """Store selected by IDEMPOTENCY_BACKEND"""
+    backend = os.getenv("IDEMPOTENCY_BACKEND", "memory").strip().lower()
+    if backend == "firestore":
+        return FirestoreIdempotencyStore()
+    if backend != "memory":
+        logger.warning(f"Unknown IDEMPOTENCY_BACKEND '{backend}', using memory")
+    return MemoryIdempotencyStore()
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable digest of a request payload (JSON-compatible values)"""
+    import json
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class Idempotency:
+    """Runs operations at most once per key, replaying their stored response"""
+
+    def __init__(self, store: IdempotencyStore, ttl: float = 86400, lease_seconds: float = 300,
+                 poll_interval: float = 0.5):
+        self.store = store
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # Requests running in this process: key -> (fingerprint, future of the response)
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(self, key: str, scope: str, fingerprint: str,
+                  operation: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run operation once for key, or wait for/replay the run that owns it
+
+        The response must be JSON-compatible. Failed operations are not
+        stored: their duplicates see the same error, later retries run again.
+
+        Returns:
+            (response, replayed)
+
+        Raises:
+            IdempotencyKeyMismatch: the key was used with a different payload
+            IdempotencyInProgress: the owning request didn't finish within the lease
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != fingerprint:
+                IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome="mismatch").inc()
+                raise IdempotencyKeyMismatch(key)
+            IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome="joined").inc()
+            try:
+                return await asyncio.shield(inflight[1]), True
+            except asyncio.CancelledError:
+                if not inflight[1].cancelled():
+                    raise
+                # The request we joined was cancelled (client went away): take over
+                return await self.run(key, scope, fingerprint, operation)
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on it; don't warn about an unretrieved exception
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = (fingerprint, future)
+        try:
+            response, replayed = await self._lead(key, scope, fingerprint, operation)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response, replayed
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _lead(self, key: str, scope: str, fingerprint: str,
+                    operation: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        deadline = time.monotonic() + self.lease_seconds
+        while True:
+            state, response = await self.store.begin(key, fingerprint, self.lease_seconds)
+            if state == MISMATCH:
+                IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome="mismatch").inc()
+                raise IdempotencyKeyMismatch(key)
+            if state == COMPLETED:
+                IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome="replayed").inc()
+                return response, True
+            if state == STARTED:
+                break
+            # Running on another instance: wait for its response (or its lease to lapse)
+            if time.monotonic() >= deadline:
+                IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome="in_progress").inc()
+                raise IdempotencyInProgress(key)
+            await asyncio.sleep(self.poll_interval)
+
+        IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome="executed").inc()
+        try:
+            response = await operation()
+        except BaseException:
+            await asyncio.shield(self._abandon(key))
+            raise
+        try:
+            await asyncio.shield(self.store.complete(key, response, self.ttl))
+        except Exception as e:
+            # The operation succeeded; a retry will just run it again
+            logger.error(f"Failed to store idempotent response: {str(e)}")
+        return response, False
+
+    async def _abandon(self, key: str) -> None:
+        try:
+            await self.store.abandon(key)
+        except Exception as e:
+            # The record's lease expires on its own
+            logger.warning(f"Failed to release idempotency key: {str(e)}")
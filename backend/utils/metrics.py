@@ -0,0 +1,247 @@
+"""
+Prometheus metrics for the API, Firestore, Cloud Storage and OpenAI
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional, List, Iterator
+
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds): API/Firestore/GCS calls are sub-second, OpenAI completions take up to a minute
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0)
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "nexsy_http_requests_total", "HTTP requests handled",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "nexsy_http_request_duration_seconds", "HTTP request latency",
+    ["method", "route"], buckets=FAST_BUCKETS + (30.0, 60.0)
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "nexsy_http_requests_in_progress", "HTTP requests currently being handled",
+    ["method"], multiprocess_mode="livesum"
+)
+# Compression ratio = compressed / raw
+HTTP_COMPRESSION_BYTES = Counter(
+    "nexsy_http_compression_bytes_total", "Response body bytes before and after compression",
+    ["encoding", "stage"]
+)
+
+# Firestore
+FIRESTORE_OPERATIONS = Counter(
+    "nexsy_firestore_operations_total", "Firestore service operations",
+    ["collection", "operation", "outcome"]
+)
+FIRESTORE_OPERATION_DURATION = Histogram(
+    "nexsy_firestore_operation_duration_seconds", "Firestore service operation latency",
+    ["collection", "operation"], buckets=FAST_BUCKETS
+)
+FIRESTORE_DOCUMENTS_READ = Counter(
+    "nexsy_firestore_documents_read_total", "Firestore documents read",
+    ["collection"]
+)
+FIRESTORE_READS_PER_REQUEST = Histogram(
+    "nexsy_firestore_reads_per_request", "Firestore documents read per HTTP request",
+    ["route"], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+
+# Cloud Storage
+GCS_OPERATIONS = Counter(
+    "nexsy_gcs_operations_total", "Cloud Storage operations",
+    ["operation", "outcome"]
+)
+GCS_OPERATION_DURATION = Histogram(
+    "nexsy_gcs_operation_duration_seconds", "Cloud Storage operation latency",
+    ["operation"], buckets=FAST_BUCKETS + (30.0, 60.0)
+)
+GCS_BYTES = Counter(
+    "nexsy_gcs_bytes_total", "Bytes transferred to and from Cloud Storage",
+    ["direction"]
+)
+
+# OpenAI
+OPENAI_REQUESTS = Counter(
+    "nexsy_openai_requests_total", "OpenAI API requests",
+    ["model", "operation", "outcome"]
+)
+OPENAI_REQUEST_DURATION = Histogram(
+    "nexsy_openai_request_duration_seconds", "OpenAI API request latency",
+    ["model", "operation"], buckets=SLOW_BUCKETS
+)
+OPENAI_TOKENS = Counter(
+    "nexsy_openai_tokens_total", "OpenAI tokens consumed",
+    ["model", "operation", "kind"]
+)
+OPENAI_COMPLETIONS_IN_FLIGHT = Gauge(
+    "nexsy_openai_completions_in_flight", "OpenAI completions currently awaited",
+    multiprocess_mode="livesum"
+)
+# Ad copy variations generated concurrently (AI_AD_COPY_FANOUT); failed ones are left out of the output
+AD_COPY_VARIATIONS = Counter(
+    "nexsy_ad_copy_variations_total", "Fanned-out ad copy variation completions",
+    ["outcome"]
+)
+# Stored AI artifacts returned instead of regenerating from unchanged inputs
+AI_ARTIFACT_REUSE = Counter(
+    "nexsy_ai_artifact_reuse_total", "AI generations answered from a stored artifact or regenerated",
+    ["operation", "result"]
+)
+# Model routing: tier chosen per operation; reason is "primary", "load" or "latency"
+MODEL_ROUTING_DECISIONS = Counter(
+    "nexsy_model_routing_decisions_total", "Model tier selections",
+    ["operation", "tier", "reason"]
+)
+
+# Single-flight: "leader" calls do the work, "shared" calls joined one in flight
+SINGLEFLIGHT_CALLS = Counter(
+    "nexsy_singleflight_calls_total", "Calls through single-flight coalescing",
+    ["operation", "role"]
+)
+
+# In-process caches (hit rate = hit / (hit + miss))
+CACHE_REQUESTS = Counter(
+    "nexsy_cache_requests_total", "Cache lookups",
+    ["cache", "result"]
+)
+CACHE_EVICTIONS = Counter(
+    "nexsy_cache_evictions_total", "Cache entries removed",
+    ["cache", "reason"]
+)
+CACHE_ENTRIES = Gauge(
+    "nexsy_cache_entries", "Entries currently cached",
+    ["cache"], multiprocess_mode="livesum"
+)
+SEMANTIC_CACHE_REQUESTS = Counter(
+    "nexsy_semantic_cache_requests_total", "Semantic (similarity) cache lookups",
+    ["cache", "result"]
+)
+CACHE_COHERENCE_INVALIDATIONS = Counter(
+    "nexsy_cache_coherence_invalidations_total", "Cache entries invalidated by Firestore change listeners",
+    ["cache"]
+)
+CACHE_COHERENCE_WATCHED_USERS = Gauge(
+    "nexsy_cache_coherence_watched_users", "Users whose collections are watched for cache coherence",
+    multiprocess_mode="livesum"
+)
+
+# Rate limiting
+RATE_LIMIT_DECISIONS = Counter(
+    "nexsy_rate_limit_decisions_total", "Rate limiter decisions",
+    ["scope", "outcome"]
+)
+AI_GENERATIONS_IN_PROGRESS = Gauge(
+    "nexsy_ai_generations_in_progress", "AI generation requests currently holding a concurrency slot",
+    multiprocess_mode="livesum"
+)
+
+# AI work scheduler (services.ai_scheduler) by priority class
+AI_SCHEDULER_QUEUE_DEPTH = Gauge(
+    "nexsy_ai_scheduler_queue_depth", "OpenAI completions waiting for a scheduler slot",
+    ["priority"], multiprocess_mode="livesum"
+)
+AI_SCHEDULER_IN_FLIGHT = Gauge(
+    "nexsy_ai_scheduler_in_flight", "OpenAI completions holding a scheduler slot",
+    ["priority"], multiprocess_mode="livesum"
+)
+AI_SCHEDULER_WAIT = Histogram(
+    "nexsy_ai_scheduler_wait_seconds", "Time OpenAI completions waited for a scheduler slot",
+    ["priority"], buckets=FAST_BUCKETS + (30.0, 60.0, 120.0)
+)
+
+# Speculative pre-generation jobs by step reached and how they ended
+PREGENERATION_JOBS = Counter(
+    "nexsy_pregeneration_jobs_total", "Background pre-generation steps",
+    ["step", "outcome"]
+)
+
+# Idempotency keys: "executed" ran the operation, "replayed"/"joined" returned a stored/in-flight response
+IDEMPOTENCY_REQUESTS = Counter(
+    "nexsy_idempotency_requests_total", "Requests carrying an Idempotency-Key",
+    ["scope", "outcome"]
+)
+
+# Documents read during the current HTTP request (set by MetricsMiddleware)
+_request_firestore_reads: ContextVar[Optional[List[int]]] = ContextVar("request_firestore_reads", default=None)
+
+def start_request_read_count() -> List[int]:
+    """Start counting Firestore reads for the current request; returns the mutable counter"""
+    counter = [0]
+    _request_firestore_reads.set(counter)
+    return counter
+
+def record_firestore_reads(collection: str, count: int = 1) -> None:
+    """Record documents read from a Firestore collection"""
+    if count <= 0:
+        return
+    FIRESTORE_DOCUMENTS_READ.labels(collection=collection).inc(count)
+    counter = _request_firestore_reads.get()
+    if counter is not None:
+        counter[0] += count
+
+def instrument_firestore(collection: str, operation: str):
+    """Decorator recording latency and outcome of an async Firestore service method"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                outcome = "success"
+                return result
+            finally:
+                FIRESTORE_OPERATION_DURATION.labels(collection=collection, operation=operation).observe(
+                    time.perf_counter() - start
+                )
+                FIRESTORE_OPERATIONS.labels(collection=collection, operation=operation, outcome=outcome).inc()
+        return wrapper
+    return decorator
+
+@contextmanager
+def observe_gcs(operation: str) -> Iterator[None]:
+    """Record latency and outcome of a Cloud Storage call"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        GCS_OPERATION_DURATION.labels(operation=operation).observe(time.perf_counter() - start)
+        GCS_OPERATIONS.labels(operation=operation, outcome=outcome).inc()
+
+def record_gcs_bytes(direction: str, count: Optional[int]) -> None:
+    """Record bytes uploaded to ("upload") or downloaded from ("download") Cloud Storage"""
+    if count:
+        GCS_BYTES.labels(direction=direction).inc(count)
+
+def record_openai_usage(model: str, operation: str, usage) -> None:
+    """Record token counts from an OpenAI response's usage block"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            OPENAI_TOKENS.labels(model=model, operation=operation, kind=kind.replace("_tokens", "")).inc(value)
+
+def metrics_payload() -> bytes:
+    """Render all metrics in the Prometheus text format"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Multi-worker servers: aggregate the per-process metric files
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
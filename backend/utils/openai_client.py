@@ -0,0 +1,88 @@
+"""
+OpenAI client with an explicitly tuned HTTP transport
+
+The AsyncOpenAI client gets its own httpx connection pool: bounded size,
+long keep-alive (completions are minutes apart per user, TLS setup to
+api.openai.com costs a few round trips) and HTTP/2 when the h2 package is
+installed, so concurrent generations multiplex over one connection.
+warm_openai_client() opens connections ahead of the first generation.
+
+Settings (environment):
+    OPENAI_MAX_CONNECTIONS     Connection pool size (default 50)
+    OPENAI_KEEPALIVE_SECONDS   Idle connection lifetime (default 120)
+    OPENAI_HTTP2               Use HTTP/2 if h2 is installed (default true)
+    OPENAI_MAX_RETRIES         SDK retries on connection errors/429/5xx (default 2)
+    OPENAI_WARM_CONNECTIONS    Connections opened by warm_openai_client (default 2)
+"""
+import os
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Timeouts (seconds) for establishing a connection, writing the request and waiting on the pool;
+# read timeouts depend on the operation and are passed per request
+CONNECT_TIMEOUT = 5.0
+WRITE_TIMEOUT = 10.0
+POOL_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def _http2_available() -> bool:
+    if os.getenv("OPENAI_HTTP2", "true").strip().lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def request_timeout(read: float):
+    """httpx timeout for one request whose response may take up to read seconds"""
+    import httpx
+    return httpx.Timeout(read, connect=CONNECT_TIMEOUT, write=WRITE_TIMEOUT, pool=POOL_TIMEOUT)
+
+def create_openai_client(api_key: str, base_url: Optional[str] = None):
+    """Create an AsyncOpenAI client on a tuned, dedicated connection pool"""
+    # Deferred import: the openai package is the slowest import in the app
+    import httpx
+    from openai import AsyncOpenAI
+
+    max_connections = int(_env_number("OPENAI_MAX_CONNECTIONS", 50))
+    http2 = _http2_available()
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=_env_number("OPENAI_KEEPALIVE_SECONDS", 120)
+        ),
+        timeout=request_timeout(DEFAULT_READ_TIMEOUT),
+        follow_redirects=True
+    )
+    logger.info(f"OpenAI client created (pool {max_connections}, HTTP/2 {'on' if http2 else 'off'})")
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=http_client,
+        max_retries=int(_env_number("OPENAI_MAX_RETRIES", 2))
+    )
+
+async def warm_openai_client(client, model: str) -> None:
+    """Open pooled connections (DNS, TCP, TLS) with cheap authenticated requests"""
+    count = max(1, int(_env_number("OPENAI_WARM_CONNECTIONS", 2)))
+    warm_client = client.with_options(max_retries=0, timeout=request_timeout(10.0))
+    # Concurrent requests each need a connection (HTTP/1.1) or share one (HTTP/2)
+    results = await asyncio.gather(
+        *(warm_client.models.retrieve(model) for _ in range(count)),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        logger.warning(f"OpenAI warm-up: {len(errors)}/{count} requests failed: {errors[0]}")
+    else:
+        logger.info(f"OpenAI connections warmed ({count})")
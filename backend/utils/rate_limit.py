@@ -0,0 +1,195 @@
+"""
+Token-bucket rate limiting and concurrency caps with pluggable backends
+
+- MemoryRateLimitBackend: per-process state, for single-instance deployments
+- RedisRateLimitBackend: shared across workers and instances through Redis
+  (redis.asyncio). "fakeredis://" runs the same scripts against an
+  in-process fakeredis server as a local stand-in (fakeredis[lua] is in
+  requirements-dev.txt; without it the memory backend is used).
+
+Backends are selected by RATE_LIMIT_BACKEND (memory | redis) and
+RATE_LIMIT_REDIS_URL.
+"""
+import os
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets and concurrency leases"""
+
+    @abstractmethod
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1) -> float:
+        """
+        Take `cost` tokens from the bucket at `key`
+
+        Args:
+            key: Bucket key (e.g. "ai:<user_id>")
+            rate: Refill rate in tokens per second
+            capacity: Bucket size (maximum burst)
+            cost: Tokens this request needs
+
+        Returns:
+            float: 0 if allowed, otherwise seconds until enough tokens are available
+        """
+
+    @abstractmethod
+    async def acquire_slot(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        """
+        Take one of `limit` concurrency slots at `key`
+
+        Leases expire after lease_seconds so slots held by crashed workers are reclaimed.
+
+        Returns:
+            str: Lease id to pass to release_slot, or None if all slots are taken
+        """
+
+    @abstractmethod
+    async def release_slot(self, key: str, lease: str) -> None:
+        """Return a slot taken by acquire_slot"""
+
+    async def close(self) -> None:
+        pass
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    In-process backend
+
+    Methods never await between reading and writing state, so they are atomic
+    on the event loop without locks.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._leases: Dict[str, Dict[str, float]] = {}
+
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets[key] = (tokens, now)
+
+        if len(self._buckets) > self.max_keys:
+            self._prune_buckets(now, rate, capacity)
+        return wait
+
+    def _prune_buckets(self, now: float, rate: float, capacity: float) -> None:
+        # Buckets that have refilled completely carry no state worth keeping
+        full = [k for k, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * rate >= capacity]
+        for key in full:
+            del self._buckets[key]
+
+    async def acquire_slot(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        now = time.monotonic()
+        leases = {lease: expiry for lease, expiry in self._leases.get(key, {}).items() if expiry > now}
+        if len(leases) >= limit:
+            self._leases[key] = leases
+            return None
+        lease = uuid.uuid4().hex
+        leases[lease] = now + lease_seconds
+        self._leases[key] = leases
+        return lease
+
+    async def release_slot(self, key: str, lease: str) -> None:
+        leases = self._leases.get(key)
+        if leases is None:
+            return
+        leases.pop(lease, None)
+        if not leases:
+            del self._leases[key]
+
+# Scripts run atomically in Redis and use the server clock, so all instances agree
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+_ACQUIRE_SLOT_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local lease_seconds = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + lease_seconds, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease_seconds) + 1)
+return 1
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Backend shared by every worker and instance pointing at the same Redis"""
+
+    def __init__(self, url: str, key_prefix: str = "nexsy:ratelimit:"):
+        if url.startswith("fakeredis://"):
+            # Local stand-in: same code path, in-process server
+            import fakeredis
+            self.redis = fakeredis.FakeAsyncRedis()
+        else:
+            import redis.asyncio as redis
+            self.redis = redis.from_url(url)
+        self.key_prefix = key_prefix
+        self._consume = self.redis.register_script(_TOKEN_BUCKET_SCRIPT)
+        self._acquire = self.redis.register_script(_ACQUIRE_SLOT_SCRIPT)
+
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1) -> float:
+        wait = await self._consume(keys=[f"{self.key_prefix}bucket:{key}"], args=[rate, capacity, cost])
+        return float(wait)
+
+    async def acquire_slot(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        lease = uuid.uuid4().hex
+        acquired = await self._acquire(keys=[f"{self.key_prefix}slots:{key}"], args=[limit, lease_seconds, lease])
+        return lease if int(acquired) else None
+
+    async def release_slot(self, key: str, lease: str) -> None:
+        await self.redis.zrem(f"{self.key_prefix}slots:{key}", lease)
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    """Build the backend selected by RATE_LIMIT_BACKEND"""
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if backend == "redis":
+        url = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+        try:
+            limiter_backend = RedisRateLimitBackend(url)
+        except ImportError as e:
+            # fakeredis is a dev dependency; don't take the AI endpoints down without it
+            logger.error(f"Redis rate limit backend unavailable ({e}); install requirements-dev.txt "
+                         f"for fakeredis:// - using the memory backend")
+            return MemoryRateLimitBackend()
+        logger.info(f"Using Redis rate limit backend at {url.split('@')[-1]}")
+        return limiter_backend
+    if backend != "memory":
+        logger.warning(f"Unknown RATE_LIMIT_BACKEND '{backend}', using memory")
+    return MemoryRateLimitBackend()
@@ -0,0 +1,242 @@
+"""
+In-memory semantic cache: reuse results of near-duplicate inputs
+
+Inputs are embedded into unit vectors and compared by cosine similarity
+against a NumPy matrix of past inputs, in one matrix-vector product per
+lookup. Only entries with the same scope (an exact-match key such as
+user, country and price band) are candidates. The oldest entry is overwritten once
+max_entries are stored.
+
+Embeddings alone can't tell "vegan protein powder" from "whey protein
+powder": one differing word barely moves the vector. Callers put key_terms()
+of the distinguishing part of the input (e.g. the product name) in the scope,
+so a word only one of the inputs has rules a match out. SYNONYMS folds
+interchangeable words together first, so "plant protein powder" still matches.
+
+Embedding providers are pluggable: HashingEmbedding is a local, dependency-free
+bag of words and character trigrams (good at "vegan protein powder" vs
+"plant protein powder"), OpenAIEmbedding uses the embeddings API.
+
+numpy is imported on first use, so the module costs nothing when disabled.
+"""
+import os
+import re
+import time
+import zlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import SEMANTIC_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Interchangeable product words (normalized phrase -> canonical word)
+SYNONYMS = {
+    "plant based": "vegan",
+    "plant": "vegan",
+    "veggie": "vegetarian",
+    "t shirt": "tshirt",
+    "tee": "tshirt",
+    "sneaker": "shoe",
+    "sneakers": "shoes",
+    "trainers": "shoes",
+}
+_SYNONYM_RE = re.compile(r"\b(" + "|".join(
+    re.escape(phrase) for phrase in sorted(SYNONYMS, key=len, reverse=True)
+) + r")\b")
+
+# Words that don't distinguish one product from another
+_FILLER_WORDS = frozenset(("a", "an", "and", "for", "in", "of", "the", "with"))
+
+def normalize_text(text: str) -> str:
+    """Lowercase alphanumeric words separated by single spaces"""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+def canonical_text(text: str) -> str:
+    """normalize_text with SYNONYMS replaced by their canonical word"""
+    return _SYNONYM_RE.sub(lambda match: SYNONYMS[match.group(1)], normalize_text(text))
+
+def key_terms(text: str) -> Tuple[str, ...]:
+    """
+    Sorted distinct words of text that must all match for a cache hit
+
+    Synonyms are folded, filler words dropped and a plural "s" stripped, so
+    "Plant Protein Powders" and "vegan protein powder" have the same terms
+    while "mens running shoes" and "womens running shoes" don't.
+    """
+    terms = set()
+    for word in canonical_text(text).split():
+        if word in _FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+    return tuple(sorted(terms))
+
+class EmbeddingProvider(ABC):
+    """Turns texts into L2-normalized float32 vectors of a fixed dimension"""
+
+    dimension: int
+    # Similarity above which inputs count as the same request, for this kind of embedding
+    default_threshold: float = 0.9
+
+    @abstractmethod
+    async def embed(self, texts: List[str]):
+        """Return a (len(texts), dimension) array"""
+
+class HashingEmbedding(EmbeddingProvider):
+    """
+    Feature-hashed words and character trigrams
+
+    Deterministic across processes (crc32, not hash()), so nothing needs to be
+    trained or downloaded. Words carry more weight than trigrams; trigrams make
+    "powder"/"powders" or typos land close together. Being lexical, it scores
+    rephrasings lower than a semantic model would, hence the lower threshold;
+    SYNONYMS are folded before hashing to make up for some of that.
+    """
+
+    default_threshold = 0.85
+
+    def __init__(self, dimension: int = 1024, word_weight: float = 2.0):
+        self.dimension = dimension
+        self.word_weight = word_weight
+
+    def _features(self, text: str):
+        words = canonical_text(text).split()
+        for word in words:
+            yield word, self.word_weight
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                yield "#" + padded[i:i + 3], 1.0
+
+    async def embed(self, texts: List[str]):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                # One hash bit picks the sign so collisions cancel out on average
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dimension] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class OpenAIEmbedding(EmbeddingProvider):
+    """OpenAI embeddings API (text-embedding-3-small by default)"""
+
+    def __init__(self, client, model: str = "text-embedding-3-small", dimension: int = 512):
+        self.client = client
+        self.model = model
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str]):
+        import numpy as np
+
+        response = await self.client.embeddings.create(model=self.model, input=texts, dimensions=self.dimension)
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SemanticMatch:
+    """A cached value whose input was similar enough to the query"""
+
+    def __init__(self, value: Any, text: str, similarity: float):
+        self.value = value
+        self.text = text
+        self.similarity = similarity
+
+class SemanticCache:
+    """Fixed-capacity vector index of (scope, input text) -> value"""
+
+    def __init__(self, name: str, provider: EmbeddingProvider, threshold: Optional[float] = None,
+                 max_entries: int = 5000, ttl: float = 86400):
+        import numpy as np
+
+        self.name = name
+        self.provider = provider
+        self.threshold = threshold if threshold is not None else provider.default_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors = np.zeros((max_entries, provider.dimension), dtype=np.float32)
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        # Scopes as small integers, so filtering by scope is vectorized too
+        self._scope_ids = np.full(max_entries, -1, dtype=np.int32)
+        self._scope_index: Dict[Hashable, int] = {}
+        self._texts: List[Optional[str]] = [None] * max_entries
+        self._values: List[Any] = [None] * max_entries
+        self._size = 0
+        # Next slot to write; wraps around to overwrite the oldest entry
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    async def embed(self, text: str):
+        return (await self.provider.embed([normalize_text(text)]))[0]
+
+    async def lookup(self, text: str, scope: Hashable) -> Tuple[Optional[SemanticMatch], Any]:
+        """
+        Find the most similar live entry in scope
+
+        Returns (match or None, query vector); pass the vector to add() to
+        store a freshly computed value without embedding the text again.
+        """
+        import numpy as np
+
+        vector = await self.embed(text)
+        match = None
+        scope_id = self._scope_index.get(scope)
+        if self._size and scope_id is not None:
+            size = self._size
+            similarities = self._vectors[:size] @ vector
+            candidates = (self._scope_ids[:size] == scope_id) & (self._expires_at[:size] > time.time())
+            similarities = np.where(candidates, similarities, -1.0)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                match = SemanticMatch(self._values[best], self._texts[best], float(similarities[best]))
+
+        SEMANTIC_CACHE_REQUESTS.labels(cache=self.name, result="hit" if match else "miss").inc()
+        return match, vector
+
+    def add(self, vector, text: str, scope: Hashable, value: Any) -> None:
+        slot = self._next
+        self._vectors[slot] = vector
+        self._expires_at[slot] = time.time() + self.ttl
+        self._scope_ids[slot] = self._scope_index.setdefault(scope, len(self._scope_index))
+        self._texts[slot] = text
+        self._values[slot] = value
+        self._next = (slot + 1) % self.max_entries
+        self._size = max(self._size, slot + 1)
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def create_embedding_provider(openai_client=None) -> EmbeddingProvider:
+    """Provider selected by SEMANTIC_CACHE_EMBEDDINGS ("hashing" or "openai")"""
+    kind = os.getenv("SEMANTIC_CACHE_EMBEDDINGS", "hashing").strip().lower()
+    if kind == "openai":
+        if openai_client is not None:
+            return OpenAIEmbedding(openai_client, model=os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small"))
+        logger.warning("SEMANTIC_CACHE_EMBEDDINGS=openai without an OpenAI client, using hashing embeddings")
+    elif kind != "hashing":
+        logger.warning(f"Unknown SEMANTIC_CACHE_EMBEDDINGS '{kind}', using hashing embeddings")
+    return HashingEmbedding()
+
+def create_semantic_cache(name: str, openai_client=None) -> SemanticCache:
+    """SemanticCache configured from the environment"""
+    threshold = os.getenv("SEMANTIC_CACHE_THRESHOLD")
+    return SemanticCache(
+        name,
+        create_embedding_provider(openai_client),
+        threshold=float(threshold) if threshold else None,
+        max_entries=int(_env_number("SEMANTIC_CACHE_MAX_ENTRIES", 5000)),
+        ttl=_env_number("SEMANTIC_CACHE_TTL_SECONDS", 86400)
+    )
@@ -0,0 +1,101 @@
+"""
+Single-flight coalescing of identical concurrent calls
+
+While a call is in flight, identical calls (same operation and arguments,
+which include the user id) wait for it and share its result or exception
+instead of repeating the Firestore read or OpenAI completion. Nothing is kept
+once the call finishes; this is not a cache.
+"""
+import asyncio
+import inspect
+import logging
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import SINGLEFLIGHT_CALLS
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """In-flight calls by key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func() for key, or join the identical call already in flight
+
+        The call runs as its own task, so a caller that disconnects (and is
+        cancelled) does not cancel it for the callers sharing it.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            SINGLEFLIGHT_CALLS.labels(operation=self.name, role="shared").inc()
+            return await asyncio.shield(task)
+
+        SINGLEFLIGHT_CALLS.labels(operation=self.name, role="leader").inc()
+        task = asyncio.ensure_future(func())
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._done(key, task))
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable) -> None:
+        """Stop sharing the call in flight for key; later calls start a new one"""
+        self._calls.pop(key, None)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here so a call every caller abandoned doesn't log "never retrieved"
+            logger.debug(f"{self.name} failed: {task.exception()}")
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def single_flight(name: str = None):
+    """
+    Decorator coalescing concurrent calls of an async method with identical arguments
+
+    Arguments are bound to the signature, so f(u, p) and f(user_id=u, product_id=p)
+    share a flight. `self` is not part of the key.
+
+    A caller that joins a flight gets the result of a call that started before
+    it arrived. Writers that must read their own write call
+    `method.forget(...)` with the read's arguments first, so the next call
+    starts a new flight.
+    """
+    def decorator(func):
+        group = SingleFlight(name or func.__qualname__)
+        signature = inspect.signature(func)
+        parameters = list(signature.parameters.values())
+        is_method = bool(parameters) and parameters[0].name == "self"
+        if is_method:
+            signature = signature.replace(parameters=parameters[1:])
+
+        def make_key(args, kwargs) -> Hashable:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple((param, _freeze(value)) for param, value in bound.arguments.items())
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(args[1:] if is_method else args, kwargs)
+            return await group.do(key, lambda: func(*args, **kwargs))
+
+        def forget(*args, **kwargs) -> None:
+            group.forget(make_key(args, kwargs))
+
+        wrapper.forget = forget
+        return wrapper
+    return decorator
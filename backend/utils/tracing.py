@@ -0,0 +1,103 @@
+"""
+OpenTelemetry tracing setup and span helpers
+
+Tracing is off unless TRACING_EXPORTER is set:
+- "otlp": OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (default http://localhost:4318)
+- "file": one JSON span per line to TRACING_FILE_PATH (default traces.jsonl)
+- "console": pretty-printed spans on stdout
+
+Without a configured provider the OpenTelemetry API is a no-op, so the
+decorators below cost almost nothing in production when tracing is off.
+"""
+import os
+import asyncio
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional, Iterator
+
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("nexsy-api")
+
+_configured = False
+
+def configure_tracing(service_name: str = "nexsy-api") -> bool:
+    """
+    Install a tracer provider and exporter based on environment variables
+
+    Returns:
+        bool: True if tracing was enabled
+    """
+    global _configured
+    exporter_name = os.getenv("TRACING_EXPORTER", "none").strip().lower()
+    if _configured or exporter_name in ("", "none", "off"):
+        return _configured
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+        exporter = OTLPSpanExporter(endpoint=f"{endpoint}/v1/traces")
+    elif exporter_name == "file":
+        from utils.tracing_export import JsonFileSpanExporter
+        exporter = JsonFileSpanExporter(os.getenv("TRACING_FILE_PATH", "traces.jsonl"))
+    elif exporter_name == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        logger.warning(f"Unknown TRACING_EXPORTER '{exporter_name}', tracing disabled")
+        return False
+
+    sample_ratio = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+    provider = TracerProvider(
+        resource=Resource.create({
+            "service.name": service_name,
+            "deployment.environment": os.getenv("ENVIRONMENT", "development")
+        }),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio))
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    _configured = True
+    logger.info(f"Tracing enabled with {exporter_name} exporter (sample ratio {sample_ratio})")
+    return True
+
+@contextmanager
+def start_span(name: str, **attributes) -> Iterator[trace.Span]:
+    """Start a child span of the current context, recording exceptions as errors"""
+    with tracer.start_as_current_span(name, record_exception=True, set_status_on_exception=True) as span:
+        for key, value in attributes.items():
+            if value is not None:
+                span.set_attribute(key, value)
+        yield span
+
+def traced(name: Optional[str] = None, **attributes):
+    """Decorator wrapping a sync or async function in a span (named after the function by default)"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            with start_span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return sync_wrapper
+    return decorator
+
+def set_span_error(span: trace.Span, message: str) -> None:
+    """Mark a span as failed without an exception (e.g. HTTP 5xx)"""
+    span.set_status(Status(StatusCode.ERROR, message))
@@ -0,0 +1,34 @@
+"""
+JSON-lines span exporter for TRACING_EXPORTER=file
+
+Kept out of utils.tracing so importing the app doesn't load the
+OpenTelemetry SDK unless tracing is configured.
+"""
+import json
+import logging
+import threading
+from typing import Sequence
+
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+logger = logging.getLogger(__name__)
+
+class JsonFileSpanExporter(SpanExporter):
+    """Span exporter writing one compact JSON object per span to a file"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        try:
+            lines = [json.dumps(json.loads(span.to_json())) for span in spans]
+            with self._lock, open(self.file_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            return SpanExportResult.SUCCESS
+        except Exception as e:
+            logger.error(f"Failed to write spans to {self.file_path}: {e}")
+            return SpanExportResult.FAILURE
+
+    def shutdown(self) -> None:
+        pass
@@ -15,10 +15,11 @@ const mockFunction = async (...args) => {
 /**
  * Generate marketing strategy for a product
  * Replaces: generateMarketingStrategy()
+ * Pass force to regenerate even if the product is unchanged
  */
-export const generateMarketingStrategy = async (productId) => {
+export const generateMarketingStrategy = async (productId, force = false) => {
   try {
-    const result = await productsAPI.generateMarketingStrategy(productId);
+    const result = await productsAPI.generateMarketingStrategy(productId, force);
     return { success: true, data: result };
   } catch (error) {
     console.error('generateMarketingStrategy error:', error);
@@ -116,10 +117,11 @@ export const autofillProductDetails = async (productName, whatIsIt, price, targe
 /**
  * Enhance product with AI analysis
  * NEW FUNCTION - not in original Base44
+ * Pass force to regenerate even if the product is unchanged
  */
-export const enhanceProductAnalysis = async (productId) => {
+export const enhanceProductAnalysis = async (productId, force = false) => {
   try {
-    const result = await productsAPI.enhanceProductAnalysis(productId);
+    const result = await productsAPI.enhanceProductAnalysis(productId, force);
     return { success: true, data: result };
   } catch (error) {
     console.error('enhanceProductAnalysis error:', error);
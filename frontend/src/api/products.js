@@ -90,8 +90,9 @@ class ProductsAPI {
   /**
    * Upload a visual (image or video) for a product
    * Replaces: VisualLibrary.create() with file upload
+   * Retrying with the same idempotencyKey returns the first upload instead of a duplicate
    */
-  async uploadVisual(productId, file, title = null) {
+  async uploadVisual(productId, file, title = null, idempotencyKey = null) {
     try {
       const formData = new FormData();
       formData.append('file', file);
@@ -103,6 +104,7 @@ class ProductsAPI {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
+          ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
         },
         body: formData,
       });
@@ -263,10 +265,17 @@ class ProductsAPI {
   /**
    * Generate marketing strategy using AI
    * New feature - creates comprehensive marketing strategy
+   * Returns the existing strategy for an unchanged product unless force is true
+   * Retrying with the same idempotencyKey returns the first response instead of generating again
    */
-  async generateMarketingStrategy(productId) {
+  async generateMarketingStrategy(productId, force = false, idempotencyKey = null) {
     try {
-      const response = await apiClient.post(`/api/ai/generate-marketing-strategy/${productId}`);
+      const query = force ? '?force=true' : '';
+      const response = await apiClient.post(
+        `/api/ai/generate-marketing-strategy/${productId}${query}`,
+        {},
+        idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}
+      );
       console.log('Marketing strategy generated:', response);
       return response;
     } catch (error) {
@@ -278,14 +287,15 @@ class ProductsAPI {
   /**
    * Generate ad copies using AI
    * Replaces manual ad copy creation
+   * Retrying with the same idempotencyKey returns the first response instead of generating again
    */
-  async generateAdCopies(productId, tone = 'professional', numVariations = 3) {
+  async generateAdCopies(productId, tone = 'professional', numVariations = 3, idempotencyKey = null) {
     try {
       const response = await apiClient.post('/api/ai/generate-ad-copies', {
         product_id: productId,
         tone: tone,
         num_variations: numVariations
-      });
+      }, idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {});
       console.log('Ad copies generated:', response);
       return response;
     } catch (error) {
@@ -294,13 +304,30 @@ class ProductsAPI {
     }
   }
 
+  /**
+   * Regenerate one ad copy variation of a creative output in place
+   * Returns the updated creative output
+   */
+  async regenerateAdCopy(outputId, index) {
+    try {
+      const response = await apiClient.post(`/api/ai/creative-outputs/${outputId}/ad-copies/${index}/regenerate`);
+      console.log('Ad copy regenerated:', response);
+      return response;
+    } catch (error) {
+      console.error('Error regenerating ad copy:', error);
+      throw error;
+    }
+  }
+
   /**
    * Enhance product with AI analysis
    * New feature - adds AI insights to product
+   * Returns the existing analysis for an unchanged product unless force is true
    */
-  async enhanceProductAnalysis(productId) {
+  async enhanceProductAnalysis(productId, force = false) {
     try {
-      const response = await apiClient.post(`/api/ai/enhance-product/${productId}`);
+      const query = force ? '?force=true' : '';
+      const response = await apiClient.post(`/api/ai/enhance-product/${productId}${query}`);
       console.log('Product analysis enhanced:', response);
       return response;
     } catch (error) {
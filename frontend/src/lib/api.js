@@ -22,11 +22,12 @@ class ApiClient {
 
   async request(endpoint, options = {}) {
     const url = `${this.baseURL}${endpoint}`;
-    const headers = await this.getAuthHeaders();
+    const { headers: extraHeaders, ...rest } = options;
+    const headers = { ...(await this.getAuthHeaders()), ...extraHeaders };
 
     const config = {
       headers,
-      ...options,
+      ...rest,
     };
 
     try {
@@ -50,10 +51,11 @@ class ApiClient {
   }
 
   // POST request
-  async post(endpoint, data = {}) {
+  async post(endpoint, data = {}, headers = {}) {
     return this.request(endpoint, {
       method: 'POST',
       body: JSON.stringify(data),
+      headers,
     });
   }
 
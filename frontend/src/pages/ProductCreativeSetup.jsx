@@ -547,6 +547,9 @@ Now, generate the content for my product.`;
     
     setIsGenerating(true);
     let productIdToUse = productId;
+    // Regenerating an existing product's insights must not reuse the stored ones;
+    // a new product has none (and may join its pre-generation)
+    const regenerate = editMode;
 
     try {
       // Step 1: Save or Update the product record
@@ -597,7 +600,7 @@ Now, generate the content for my product.`;
       console.log('📊 Starting AI enhancement for product:', productIdToUse);
       setLoadingText("Generating high-level marketing summary...");
       try {
-        const enhanceResult = await enhanceProductAnalysis(productIdToUse);
+        const enhanceResult = await enhanceProductAnalysis(productIdToUse, regenerate);
         console.log('✅ Enhancement result:', enhanceResult);
         toast.success("Marketing summary generated and saved!");
       } catch (e) {
@@ -608,7 +611,7 @@ Now, generate the content for my product.`;
       // Step 3: Generate detailed Marketing Strategy
       console.log('🎯 Starting marketing strategy generation for product:', productIdToUse);
       setLoadingText("Generating detailed marketing strategy...");
-      const strategyRes = await generateMarketingStrategy(productIdToUse);
+      const strategyRes = await generateMarketingStrategy(productIdToUse, regenerate);
       console.log('📈 Strategy result:', strategyRes);
       if (!strategyRes?.success) throw new Error(`Failed to generate marketing strategy: ${strategyRes?.error || 'Unknown error'}`);
       toast.success("Detailed marketing strategy created!");
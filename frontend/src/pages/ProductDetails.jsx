@@ -292,9 +292,10 @@ export default function ProductDetails() {
       // If no strategy exists, OR if the existing strategy is old and lacks a CoT ID, regenerate it.
       if (strategies.length === 0 || (strategies.length > 0 && !strategies[0].openai_response_id)) {
         toast.info("Updating marketing strategy to the latest version...");
-        const { data: strategyResult, error: strategyError } = await generateMarketingStrategy({ product_id: product.id });
-        if (strategyError || !strategyResult.success) {
-          throw new Error(strategyError?.message || strategyResult?.error || "Failed to generate the required marketing strategy. Please try again.");
+        // force: an outdated strategy may have been generated from the same inputs
+        const strategyResult = await generateMarketingStrategy(product.id, true);
+        if (!strategyResult?.success) {
+          throw new Error(strategyResult?.error || "Failed to generate the required marketing strategy. Please try again.");
         }
         await loadMarketingStrategy(product.id); // Reload new strategy
         toast.success("Strategy updated! Now generating ad copies.");
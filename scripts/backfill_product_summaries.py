@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Backfill product summary fields (counters, latest pointers, thumbnail)
+
+Products created before the summary existed show zero counts until rebuilt.
+Run once after deploying, with the backend's environment:
+
+    python scripts/backfill_product_summaries.py            # all users
+    python scripts/backfill_product_summaries.py --user UID # one user
+    python scripts/backfill_product_summaries.py --dry-run  # list products only
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.append(BACKEND_DIR)
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=os.path.join(BACKEND_DIR, "..", ".env"))
+
+from models.product import ProductService
+
+async def backfill(user_ids, dry_run: bool) -> int:
+    service = ProductService()
+    if not user_ids:
+        # User documents may exist only as parents of subcollections
+        user_ids = [ref.id for ref in service.db.collection(service.collection_name).list_documents()]
+
+    rebuilt = 0
+    for user_id in user_ids:
+        for doc in service._get_user_products_ref(user_id).select([]).stream():
+            if dry_run:
+                print(f"{user_id}/{doc.id}")
+                continue
+            product = await service.rebuild_summary(user_id, doc.id)
+            if product:
+                rebuilt += 1
+                print(f"{user_id}/{doc.id}: {product.visual_count} visuals, "
+                      f"{product.creative_output_count} outputs, {product.strategy_count} strategies")
+    return rebuilt
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rebuild denormalized product summaries")
+    parser.add_argument("--user", action="append", dest="users", help="Only this user (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="List the products that would be rebuilt")
+    args = parser.parse_args()
+
+    rebuilt = asyncio.run(backfill(args.users, args.dry_run))
+    if not args.dry_run:
+        print(f"Rebuilt {rebuilt} product summaries")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())